@@ -0,0 +1,333 @@
+from .base_api import AsyncMusicAPI
+from .http_session import AsyncTokenBucket, backoff_delay, parse_retry_after
+from .spotify_api import SpotifyAPI, SpotifyMatcher
+import aiohttp
+import asyncio
+import logging
+from dotenv import load_dotenv
+import json
+import time
+import os
+from pathlib import Path
+from utils.cache import CoverArtCache, ArtistCache, SearchCache, DEFAULT_CACHE_DIR
+from utils.stats import stats
+from utils.matching import FileQuery
+
+logger = logging.getLogger(__name__)
+
+class AsyncSpotifyAPI(SpotifyMatcher, AsyncMusicAPI):
+    """Spotify backend on aiohttp, for many lookups in flight on one event loop.
+
+    Searches, artist lookups and cover downloads share one connection pool
+    and one rate limit. Identical requests made concurrently (the same
+    search, the same album's cover) are only sent once. Uses the same
+    caches and matching rules as SpotifyAPI; the interactive prompt is
+    handed to a SpotifyAPI created on first use.
+    """
+
+    API_BASE = 'https://api.spotify.com/v1/'
+    TOKEN_URL = 'https://accounts.spotify.com/api/token'
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # The multi-artist and multi-track endpoints accept at most 50 IDs per request
+    ARTIST_BATCH_SIZE = 50
+    TRACK_BATCH_SIZE = 50
+
+    def __init__(self, cache_dir=None, cover_cache_bytes=512 * 1024 * 1024, persist_artists=False,
+                 search_cache=True, refresh_cache=False, rate_limit=10, max_connections=100,
+                 max_retries=5, api_base=None, token_url=None, threshold=None, album_match=False):
+        # Load environment variables from .env file
+        load_dotenv()
+        self.threshold = threshold
+        self.album_match = album_match
+        self.client_id = os.getenv('SPOTIFY_CLIENT_ID')
+        self.client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
+        # Alternative endpoints, e.g. a local stand-in for benchmarks
+        self.api_base = api_base or os.getenv('SPOTIFY_API_BASE') or self.API_BASE
+        self.token_url = token_url or os.getenv('SPOTIFY_TOKEN_URL') or self.TOKEN_URL
+        self.rate_limit = rate_limit
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+
+        # Created on the event loop that uses them
+        self._session = None
+        self._bucket = None
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = None
+        self._in_flight = {}
+        self._artist_fetches = {}
+        self._albums = {}
+        self._album_images = {}
+        self._prompt_api = None
+
+        self._cache_args = (cache_dir, cover_cache_bytes)
+        self.cover_cache = CoverArtCache(cache_dir, max_disk_bytes=cover_cache_bytes)
+        artist_cache_file = Path(cache_dir or DEFAULT_CACHE_DIR) / 'artists.json' if persist_artists else None
+        self.artist_cache = ArtistCache(artist_cache_file)
+        self.search_cache = None
+        if search_cache:
+            try:
+                self.search_cache = SearchCache(Path(cache_dir or DEFAULT_CACHE_DIR) / 'searches.sqlite3', refresh=refresh_cache)
+            except Exception as e:
+                logger.warning(f"Search cache disabled: {str(e)}")
+
+    async def close(self):
+        """Close the connection pool and persist caches that outlive the run."""
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if self._prompt_api:
+            self._prompt_api.session.close()
+        self.artist_cache.save()
+        if self.search_cache:
+            self.search_cache.close()
+
+    def _ensure_session(self):
+        if self._session is None:
+            # Keep-alive connections, enough for every request in flight
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+            self._bucket = AsyncTokenBucket(self.rate_limit)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def _access_token(self):
+        """Client credentials token, fetched once and refreshed shortly before it expires."""
+        async with self._token_lock:
+            loop = asyncio.get_running_loop()
+            if self._token and loop.time() < self._token_expires:
+                return self._token
+            auth = aiohttp.BasicAuth(self.client_id or '', self.client_secret or '')
+            async with self._session.post(self.token_url, data={'grant_type': 'client_credentials'}, auth=auth) as response:
+                response.raise_for_status()
+                data = await response.json()
+            self._token = data['access_token']
+            self._token_expires = loop.time() + data.get('expires_in', 3600) - 60
+            return self._token
+
+    async def _get(self, url, params=None, raw=False):
+        """GET an API path (or an absolute URL), returns parsed JSON or, with raw, the body.
+
+        Requests take a token from the shared bucket first. 429 responses
+        pause every request for the server's Retry-After, 429/5xx responses
+        and connection errors are retried with jittered exponential backoff.
+        """
+        session = self._ensure_session()
+        if not url.startswith(('http://', 'https://')):
+            url = self.api_base + url
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            headers = None if raw else {'Authorization': f"Bearer {await self._access_token()}"}
+            started = time.perf_counter()
+            try:
+                async with session.get(url, params=params, headers=headers) as response:
+                    body = await response.read()
+                    stats.api_call(url, len(body), time.perf_counter() - started)
+                    if response.status == 401 and not raw and attempt < self.max_retries:
+                        # Token expired early, fetch a new one
+                        self._token = None
+                        continue
+                    if response.status not in self.RETRY_STATUSES or attempt == self.max_retries:
+                        response.raise_for_status()
+                        return body if raw else json.loads(body)
+                    status = response.status
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.debug(f"GET {url} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            wait = retry_after if retry_after is not None else backoff_delay(attempt)
+            if status == 429:
+                # Rate limited: hold back every request, not just this one
+                logger.warning(f"Rate limited, pausing requests for {wait:.1f}s")
+                self._bucket.pause(wait)
+            else:
+                await asyncio.sleep(wait)
+
+    async def _single_flight(self, key, fetch):
+        """Await fetch() once for concurrent callers asking for the same key."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _search_tracks(self, query, limit):
+        """Search for tracks, going through the search cache when enabled."""
+        cache_key = f"track:{limit}:{query}"
+        if self.search_cache:
+            items = self.search_cache.get(cache_key)
+            if items is not None:
+                return items
+
+        async def fetch():
+            data = await self._get('search', {'q': query, 'type': 'track', 'limit': limit})
+            items = data['tracks']['items']
+            if self.search_cache:
+                self.search_cache.put(cache_key, items)
+            return items
+
+        return await self._single_flight(('search', cache_key), fetch)
+
+    async def album_tracks(self, artist, album):
+        """Track objects of the album matching an artist and album tag, see SpotifyAPI.album_tracks."""
+        key = self._album_key(artist, album)
+        if key in self._albums:
+            return self._albums[key]
+
+        async def fetch():
+            query = f"album:{album} artist:{artist}"
+            cache_key = f"album:5:{query}"
+            items = self.search_cache.get(cache_key) if self.search_cache else None
+            if items is None:
+                items = (await self._get('search', {'q': query, 'type': 'album', 'limit': 5}))['albums']['items']
+                if self.search_cache:
+                    self.search_cache.put(cache_key, items)
+            found = self._pick_album(artist, album, items)
+            tracks = []
+            if found:
+                full_album = await self._get(f"albums/{found['id']}")
+                # Saves fetching the album again for its cover
+                self._album_images[full_album['id']] = full_album['images']
+                tracks = self._album_tracks(full_album)
+            self._albums[key] = tracks
+            return tracks
+
+        return await self._single_flight(('album', key), fetch)
+
+    async def match_album_track(self, artist, album, filename, original_metadata=None, track_number=None, duration_seconds=None):
+        """Match a file against its album's tracklist, see SpotifyAPI.match_album_track."""
+        if not self.album_match:
+            return None
+        try:
+            tracks = await self.album_tracks(artist, album)
+        except Exception as e:
+            logger.error(f"Error looking up album {album} by {artist}: {str(e)}")
+            return None
+        track = self._match_album_track(FileQuery.build(filename, original_metadata, duration_seconds), track_number, tracks)
+        if not track:
+            return None
+        logger.info(f"Matched '{track['name']}' on album {track['album']['name']}")
+        return await self._create_track_info(track)
+
+    async def match_isrc(self, isrc):
+        """Look a track up by its ISRC, returns track_info or None."""
+        isrc = isrc.strip().upper().replace('-', '')
+        track = self._pick_isrc(isrc, await self._search_tracks(f"isrc:{isrc}", 5))
+        if not track:
+            return None
+        logger.info(f"Matched ISRC {isrc}: '{track['name']}' by {track['artists'][0]['name']}")
+        return await self._create_track_info(track)
+
+    async def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        """Search for a track without prompting the user, see SpotifyAPI.match_track."""
+        if isrc:
+            track_info = await self.match_isrc(isrc)
+            if track_info:
+                return track_info, []
+
+        query = FileQuery.build(filename, original_metadata, duration_seconds)
+        items = await self._search_tracks(query.search_terms, 5)
+
+        # One batched request covers the genres of every candidate, whichever gets picked
+        await self.prefetch_artist_genres([track['artists'][0]['id'] for track in items])
+
+        perfect_match, choices = self._evaluate_candidates(query, filename, original_metadata, items)
+        if perfect_match:
+            logger.info(f"Auto-selecting perfect match: '{perfect_match['name']}' by {perfect_match['artists'][0]['name']}")
+            return await self._create_track_info(perfect_match), []
+
+        return None, choices
+
+    def select_track(self, filename, choices, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+        """Prompt the user to pick one of the candidates returned by match_track.
+
+        Blocking: call it off the event loop. Custom searches made from the
+        prompt go through a SpotifyAPI sharing this backend's caches.
+        """
+        if self._prompt_api is None:
+            self._prompt_api = SpotifyAPI(*self._cache_args, search_cache=False, rate_limit=self.rate_limit,
+                                          api_base=self.api_base, token_url=self.token_url)
+            self._prompt_api.cover_cache = self.cover_cache
+            self._prompt_api.artist_cache = self.artist_cache
+            self._prompt_api.search_cache = self.search_cache
+        return self._prompt_api.select_track(filename, choices, original_metadata, original_filename,
+                                             duration, current_file, total_files)
+
+    async def get_cover_art(self, album_id):
+        try:
+            with stats.timed('cover'):
+                data = self.cover_cache.get(album_id)
+                if data is not None:
+                    return data
+                return await self._single_flight(('cover', album_id), lambda: self._download_cover_art(album_id))
+        except Exception as e:
+            logger.error(f"Error fetching cover art: {str(e)}")
+            return None
+
+    async def _download_cover_art(self, album_id):
+        images = self._album_images.get(album_id)
+        if images is None:
+            images = (await self._get(f"albums/{album_id}"))['images']
+        if not images:
+            return None
+        # Get the largest image (first in the list)
+        data = await self._get(images[0]['url'], raw=True)
+        if data:
+            self.cover_cache.put(album_id, data)
+        return data
+
+    async def prefetch_artist_genres(self, artist_ids):
+        """Resolve uncached artists in batches, joining batches already in flight."""
+        missing = [a for a in self.artist_cache.missing(artist_ids) if a not in self._artist_fetches]
+        for i in range(0, len(missing), self.ARTIST_BATCH_SIZE):
+            batch = missing[i:i + self.ARTIST_BATCH_SIZE]
+            task = asyncio.ensure_future(self._fetch_artists(batch))
+            for artist_id in batch:
+                self._artist_fetches[artist_id] = task
+        pending = {self._artist_fetches[a] for a in artist_ids if a in self._artist_fetches}
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _fetch_artists(self, batch):
+        try:
+            artists = (await self._get('artists', {'ids': ','.join(batch)}))['artists']
+            for artist_id, artist in zip(batch, artists):
+                self.artist_cache.put(artist_id, artist['genres'] if artist else [])
+        except Exception as e:
+            logger.error(f"Error fetching artists: {str(e)}")
+        finally:
+            for artist_id in batch:
+                self._artist_fetches.pop(artist_id, None)
+
+    async def _create_track_info(self, track):
+        """Helper method to create track info dictionary."""
+        artist_id = track['artists'][0]['id']
+        await self.prefetch_artist_genres([artist_id])
+        return self._build_track_info(track, self._first_genre(self.artist_cache.get(artist_id)))
+
+    async def get_tracks_by_ids(self, track_ids):
+        """Get track info for many Spotify track IDs, all batches requested at once."""
+        track_ids = list(dict.fromkeys(t for t in track_ids if t))
+        batches = [track_ids[i:i + self.TRACK_BATCH_SIZE] for i in range(0, len(track_ids), self.TRACK_BATCH_SIZE)]
+        responses = await asyncio.gather(*(self._get('tracks', {'ids': ','.join(batch)}) for batch in batches),
+                                         return_exceptions=True)
+        tracks = {}
+        for batch, response in zip(batches, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error getting tracks by ID: {str(response)}")
+                continue
+            # Results come back in request order, None for unknown IDs
+            for track_id, track in zip(batch, response['tracks']):
+                if track:
+                    tracks[track_id] = track
+
+        # Genres for all of them in as few requests as possible
+        await self.prefetch_artist_genres([track['artists'][0]['id'] for track in tracks.values()])
+        return {track_id: self._build_track_info(track, self._first_genre(self.artist_cache.get(track['artists'][0]['id'])))
+                for track_id, track in tracks.items()}
@@ -4,11 +4,75 @@ class MusicAPI(ABC):
     """Base class for music APIs"""
     
     @abstractmethod
-    def search_track(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+    def search_track(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None, isrc=None):
         """Search for track information"""
         pass
     
+    @abstractmethod
+    def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        """Search for track information without prompting, returns (track_info, choices)"""
+        pass
+    
+    @abstractmethod
+    def select_track(self, filename, choices, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+        """Prompt the user to pick one of the choices returned by match_track"""
+        pass
+    
     @abstractmethod
     def get_cover_art(self, track_id):
         """Get cover art for track"""
-        pass 
\ No newline at end of file
+        pass
+    
+    def get_tracks_by_ids(self, track_ids):
+        """Get track info for many track IDs at once, returns {track_id: track_info}"""
+        return {}
+    
+    def match_isrc(self, isrc):
+        """Look a track up by its ISRC, returns track_info or None"""
+        return None
+    
+    def match_album_track(self, artist, album, filename, original_metadata=None, track_number=None, duration_seconds=None):
+        """Match a file against the tracklist of its tagged album, returns track_info or None"""
+        return None
+    
+    def close(self):
+        """Release resources and persist caches"""
+        pass
+
+class AsyncMusicAPI(ABC):
+    """Base class for asyncio music APIs
+    
+    Lookups are coroutines so many of them can be in flight on one event
+    loop. Prompting stays synchronous, it is run off the loop.
+    """
+    
+    @abstractmethod
+    async def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        """Search for track information without prompting, returns (track_info, choices)"""
+        pass
+    
+    @abstractmethod
+    def select_track(self, filename, choices, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+        """Prompt the user to pick one of the choices returned by match_track"""
+        pass
+    
+    @abstractmethod
+    async def get_cover_art(self, track_id):
+        """Get cover art for track"""
+        pass
+    
+    async def get_tracks_by_ids(self, track_ids):
+        """Get track info for many track IDs at once, returns {track_id: track_info}"""
+        return {}
+    
+    async def match_isrc(self, isrc):
+        """Look a track up by its ISRC, returns track_info or None"""
+        return None
+    
+    async def match_album_track(self, artist, album, filename, original_metadata=None, track_number=None, duration_seconds=None):
+        """Match a file against the tracklist of its tagged album, returns track_info or None"""
+        return None
+    
+    async def close(self):
+        """Release resources and persist caches"""
+        pass
@@ -0,0 +1,154 @@
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import asyncio
+import logging
+import random
+import time
+from utils.stats import stats
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, bursts of up to capacity."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next seconds (used for Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._updated = self._paused_until
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+class AsyncTokenBucket:
+    """asyncio version of TokenBucket, shared by every coroutine on one event loop."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next seconds (used for Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            # No lock needed, nothing awaits between reading and updating the bucket
+            now = time.monotonic()
+            if now >= self._paused_until:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            else:
+                self._updated = self._paused_until
+                wait = self._paused_until - now
+            await asyncio.sleep(wait)
+
+def backoff_delay(attempt, backoff=0.5, max_backoff=30):
+    """Full jitter: spread retries out so clients don't retry in lockstep."""
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header value, or None."""
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimitedSession(requests.Session):
+    """requests.Session with a shared connection pool, rate limiting and retries.
+
+    Every request takes a token from the bucket first, so all threads using
+    the session together stay under rate requests per second. 429 responses
+    pause the whole bucket for the server's Retry-After, and 429/5xx
+    responses and connection errors are retried with jittered exponential
+    backoff.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate=10, burst=None, max_retries=5, pool_size=10, backoff=0.5, max_backoff=30):
+        super().__init__()
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Keep-alive connections, enough for every worker thread
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def _backoff_delay(self, attempt):
+        return backoff_delay(attempt, self.backoff, self.max_backoff)
+
+    @staticmethod
+    def _retry_after(response):
+        """Seconds to wait according to a Retry-After header, or None."""
+        return parse_retry_after(response.headers.get('Retry-After'))
+
+    def request(self, method, url, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+                stats.api_call(url, len(response.content) if not kwargs.get('stream') else 0, time.perf_counter() - started)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.debug(f"{method} {url} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            retry_after = self._retry_after(response)
+            if response.status_code == 429:
+                # Rate limited: hold back every thread, not just this one
+                wait = retry_after if retry_after is not None else self._backoff_delay(attempt)
+                logger.warning(f"Rate limited, pausing requests for {wait:.1f}s")
+                self.bucket.pause(wait)
+            else:
+                time.sleep(retry_after if retry_after is not None else self._backoff_delay(attempt))
+            response.close()
+        return response
@@ -0,0 +1,244 @@
+from .base_api import MusicAPI
+from collections import Counter, defaultdict
+from pathlib import Path
+import inquirer
+import logging
+import math
+import json
+import csv
+from utils.matching import FileQuery, Candidate, rank_candidates
+from rapidfuzz.utils import default_process
+
+logger = logging.getLogger(__name__)
+
+# Accepted column names for each track info field, first match wins
+CATALOG_COLUMNS = {
+    'title': ('title', 'track', 'name'),
+    'artist': ('artist',),
+    'album': ('album',),
+    'year': ('year', 'release_date'),
+    'isrc': ('isrc',),
+    'cover': ('cover', 'cover_path'),
+    'genre': ('genre',),
+    'track_number': ('track_number', 'track_no'),
+    'album_artist': ('album_artist',),
+    'track_id': ('track_id', 'spotify_id', 'id'),
+    'release_id': ('release_id', 'album_id'),
+    'duration': ('duration', 'duration_seconds'),
+}
+
+def _ngrams(token, n=3):
+    token = f" {token} "
+    return {token[i:i + n] for i in range(len(token) - n + 1)}
+
+class LocalCatalogAPI(MusicAPI):
+    """Matches files against a local catalog dump instead of a web service.
+
+    The catalog is a CSV file (with a header) or JSONL file with one track
+    per row: title, artist, album, year, isrc and cover (an image path,
+    relative to the catalog), and optionally genre, track_number,
+    album_artist, track_id, release_id and duration in seconds.
+
+    Rows are held in memory behind an inverted index of word tokens, with
+    a character trigram index as fallback for misspelled words, so
+    candidates are found without scanning the catalog. Candidates are
+    ranked with utils.matching like the Spotify backends.
+    """
+
+    # Candidates taken from the index for scoring
+    CANDIDATES = 20
+    # Tokens found in more rows than this are too common to narrow the search on their own
+    MAX_POSTINGS = 5000
+
+    def __init__(self, catalog_path, threshold=None):
+        self.catalog_path = Path(catalog_path)
+        self.threshold = threshold
+        self.tracks = []
+        self._tokens = defaultdict(list)
+        self._trigrams = defaultdict(set)
+        self._by_isrc = {}
+        self._by_track_id = {}
+        self._covers = {}
+        self._load()
+
+    def _rows(self):
+        if self.catalog_path.suffix.lower() in ('.jsonl', '.json'):
+            with open(self.catalog_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(self.catalog_path, newline='', encoding='utf-8') as f:
+                yield from csv.DictReader(f)
+
+    def _load(self):
+        for row in self._rows():
+            row = {str(k).strip().lower(): v for k, v in row.items() if k}
+            values = {}
+            for field, names in CATALOG_COLUMNS.items():
+                value = next((row[name] for name in names if row.get(name) not in (None, '')), None)
+                values[field] = str(value).strip() if value is not None else None
+            if not values['title'] or not values['artist']:
+                continue
+            self._add(values)
+        logger.info(f"Loaded {len(self.tracks)} tracks from {self.catalog_path} ({len(self._tokens)} tokens indexed)")
+
+    def _add(self, values):
+        album = values['album'] or "Unknown Album"
+        album_artist = values['album_artist'] or values['artist']
+        release_id = values['release_id'] or f"{album_artist} - {album}"
+        track_info = {
+            'title': values['title'],
+            'artist': values['artist'],
+            'album': album,
+            'year': (values['year'] or '')[:4],
+            'genre': values['genre'] or "Unknown Genre",
+            'release_id': release_id,
+            'album_artist': album_artist,
+            'track_id': values['track_id'],
+            'isrc': values['isrc']
+        }
+        if values['track_number']:
+            track_info['track_number'] = values['track_number'].split('/')[0]
+        try:
+            duration = float(values['duration']) if values['duration'] else None
+        except ValueError:
+            duration = None
+
+        index = len(self.tracks)
+        self.tracks.append((track_info, Candidate(values['artist'], values['title'], duration)))
+        for token in set(default_process(f"{values['artist']} {values['title']}").split()):
+            self._tokens[token].append(index)
+        if values['isrc']:
+            self._by_isrc[values['isrc'].upper().replace('-', '')] = index
+        if values['track_id']:
+            self._by_track_id[values['track_id']] = index
+        if values['cover'] and release_id not in self._covers:
+            cover = Path(values['cover'])
+            self._covers[release_id] = cover if cover.is_absolute() else self.catalog_path.parent / cover
+
+    def _trigram_index(self):
+        # Built on first use, most runs never need it
+        if not self._trigrams:
+            for token in self._tokens:
+                for gram in _ngrams(token):
+                    self._trigrams[gram].add(token)
+        return self._trigrams
+
+    def _similar_tokens(self, token):
+        """Indexed tokens sharing most of their trigrams with a token that isn't indexed."""
+        grams = _ngrams(token)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._trigram_index().get(gram, ()))
+        return [t for t, shared in overlap.items() if shared * 2 >= max(len(grams), len(_ngrams(t)))]
+
+    def candidates(self, text, limit=None):
+        """Indices of the catalog rows sharing the most (rare) words with text."""
+        scores = Counter()
+        for token in set(default_process(text).split()):
+            tokens = [token] if token in self._tokens else self._similar_tokens(token)
+            for match in tokens:
+                postings = self._tokens[match]
+                if len(postings) > self.MAX_POSTINGS:
+                    continue
+                # Rare words say more about a row than common ones
+                weight = math.log(1 + len(self.tracks) / len(postings))
+                for index in postings:
+                    scores[index] += weight
+        return [index for index, _ in scores.most_common(limit or self.CANDIDATES)]
+
+    def _choices(self, query, indices):
+        """(label, track_info, score) tuples for catalog rows, best score first."""
+        ranked = rank_candidates(query, [self.tracks[i][1] for i in indices])
+        choices = []
+        for r in ranked:
+            track_info = self.tracks[indices[r.index]][0]
+            label = f"{track_info['artist']} - {track_info['title']} ({track_info['album']})"
+            choices.append((label, track_info, r.score))
+        return choices
+
+    def search_track(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None, isrc=None):
+        track_info, choices = self.match_track(filename, original_metadata, original_filename, isrc)
+        if track_info:
+            return track_info
+        if choices:
+            return self.select_track(filename, choices, original_metadata, original_filename, duration, current_file, total_files)
+        logger.info(f"No matches found for {filename}")
+        return None
+
+    def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        """Look a file up in the catalog without prompting, returns (track_info, choices).
+
+        An ISRC found in the catalog is an immediate match. Otherwise a
+        candidate is accepted when its title and artist both appear in the
+        filename, its "Artist - Title (Album)" equals the file's tags, or
+        it scores at least the threshold.
+        """
+        if isrc:
+            track_info = self.match_isrc(isrc)
+            if track_info:
+                return track_info, []
+
+        query = FileQuery.build(filename, original_metadata, duration_seconds)
+        choices = self._choices(query, self.candidates(f"{query.search_terms} {original_metadata or ''}"))
+        for label, track_info, score in choices:
+            filename_matches_track = (
+                track_info['title'].lower() in filename.lower() and
+                track_info['artist'].lower() in filename.lower()
+            )
+            metadata_matches_track = bool(original_metadata) and original_metadata.lower() == label.lower()
+            if filename_matches_track or metadata_matches_track:
+                logger.info(f"Found perfect match: '{track_info['title']}' by {track_info['artist']}")
+                return dict(track_info), []
+        if choices and self.threshold is not None and choices[0][2] >= self.threshold:
+            logger.info(f"Accepting '{choices[0][1]['title']}' by {choices[0][1]['artist']} with score {choices[0][2]}")
+            return dict(choices[0][1]), []
+        return None, choices[:5]
+
+    def match_isrc(self, isrc):
+        """Look a track up by its ISRC, returns track_info or None."""
+        index = self._by_isrc.get(isrc.strip().upper().replace('-', ''))
+        return dict(self.tracks[index][0]) if index is not None else None
+
+    def select_track(self, filename, choices, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+        """Prompt the user to pick one of the candidates returned by match_track."""
+        while True:
+            options = [c[0] for c in choices] + ["Custom search...", "Transfer song, no ID change", "Skip song"]
+            if current_file is not None and total_files is not None:
+                print(f"[Track {current_file}/{total_files}]")
+            print(f"[{original_metadata}]")
+            print(f'"{original_filename or Path(filename).name}"')
+            if duration and duration != "Unknown":
+                print(f"Length: {duration}")
+            print("─" * 40 + "\n")
+            try:
+                answers = inquirer.prompt([inquirer.List('selection', message="Select the correct match:", choices=options)])
+            except Exception as e:
+                logger.error(f"Error displaying selection menu: {str(e)}")
+                return None
+            if not answers or answers['selection'] == "Skip song":
+                return None
+            if answers['selection'] == "Transfer song, no ID change":
+                return "TRANSFER_ONLY"
+            if answers['selection'] == "Custom search...":
+                text = input("Search the catalog: ").strip()
+                if text:
+                    choices = self._choices(FileQuery.build(text), self.candidates(text))[:10]
+                continue
+            return dict(next(c[1] for c in choices if c[0] == answers['selection']))
+
+    def get_cover_art(self, release_id):
+        cover = self._covers.get(release_id)
+        if not cover:
+            return None
+        try:
+            return cover.read_bytes()
+        except OSError as e:
+            logger.error(f"Error reading cover art {cover}: {str(e)}")
+            return None
+
+    def get_tracks_by_ids(self, track_ids):
+        """Catalog rows for track IDs listed in the catalog."""
+        return {track_id: dict(self.tracks[self._by_track_id[track_id]][0])
+                for track_id in track_ids if track_id in self._by_track_id}
@@ -1,228 +1,500 @@
 from .base_api import MusicAPI
+from .http_session import RateLimitedSession
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import MemoryCacheHandler
 import logging
 from dotenv import load_dotenv
 import os
-import requests
-import re
-from thefuzz import fuzz
 import inquirer
+import threading
+import time
 from pathlib import Path
+from utils.cache import CoverArtCache, ArtistCache, SearchCache, DEFAULT_CACHE_DIR
+from utils.stats import stats
+from utils.matching import FileQuery, Candidate, rank_candidates, strip_title_noise
+from rapidfuzz import fuzz
+from rapidfuzz.utils import default_process
 
 logger = logging.getLogger(__name__)
 
-class SpotifyAPI(MusicAPI):
-    def __init__(self):
+class _SharedClientCredentials(SpotifyClientCredentials):
+    """Client credentials whose token is requested by one thread at a time.
+
+    Workers that find no valid token wait for the one being fetched and
+    reuse it, instead of each requesting their own.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token_lock = threading.Lock()
+
+    def get_access_token(self, *args, **kwargs):
+        with self._token_lock:
+            return super().get_access_token(*args, **kwargs)
+
+class SpotifyMatcher:
+    """Filename parsing, candidate matching and track info shared by the Spotify backends."""
+
+    # Candidates scoring at least this (0-100) are accepted without a prompt, None disables scoring
+    threshold = None
+    # Match files with album tags against their album's tracklist before searching for them one by one
+    album_match = False
+    # A title scoring this much against an album track picks it if the track number or the length agrees...
+    ALBUM_TITLE_SCORE = 90
+    # ...a lower one still does if both agree
+    ALBUM_NUMBERED_TITLE_SCORE = 60
+    # Lengths agree from this duration score on (within about 7 seconds)
+    ALBUM_DURATION_SCORE = 80
+    # Album search results must be this close to the tagged album and artist
+    ALBUM_NAME_SCORE = 90
+
+    def _evaluate_candidates(self, query, filename, original_metadata, items):
+        """Check search results against the file, returns (perfect_match, choices).
+        
+        choices are (label, track, score) tuples, best score first.
+        """
+        ranked = rank_candidates(query, [self._candidate(track) for track in items])
+        perfect_match = None
+        labels = []
+        
+        for i, track in enumerate(items):
+            track_artist = track['artists'][0]['name']
+            track_title = track['name']
+            album = track['album']
+            
+            # Create display string
+            choice_str = f"{track_artist} - {track_title} ({album['name']})"
+            labels.append(choice_str)
+            
+            # Check for exact matches more effectively
+            # Case 1: The song title and artist both appear in the filename
+            filename_matches_track = (
+                filename.lower().find(track_title.lower()) != -1 and 
+                filename.lower().find(track_artist.lower()) != -1
+            )
+            
+            # Case 2: The original metadata matches exactly
+            metadata_matches_track = False
+            if original_metadata:
+                metadata_matches_track = original_metadata.lower() == choice_str.lower()
+            
+            # Case 3: First result is exact match for the search query (useful for well-formatted filenames)
+            formatted_filename = query.compact_name
+            search_string = f"{track_artist} {track_title}".lower()
+            search_match = (
+                i == 0 and
+                (formatted_filename == search_string or
+                 formatted_filename.startswith(search_string) or
+                 search_string.startswith(formatted_filename))
+            )
+            
+            # Case 4: The example "Fleetwood Mac - Peacekeeper" case
+            exact_match_in_list = choice_str == f"{original_metadata}"
+            
+            # Determine perfect match
+            if filename_matches_track or metadata_matches_track or search_match or exact_match_in_list:
+                perfect_match = track
+                logger.info(f"Found perfect match: '{track_title}' by {track_artist}")
+        
+        # None of the rules matched, fall back to the similarity scores
+        if not perfect_match and self.threshold is not None and ranked and ranked[0].score >= self.threshold:
+            perfect_match = items[ranked[0].index]
+            logger.info(f"Accepting '{perfect_match['name']}' by {perfect_match['artists'][0]['name']} "
+                        f"with score {ranked[0].score}")
+        
+        choices = [(labels[r.index], items[r.index], r.score) for r in ranked]
+        return perfect_match, choices
+
+    def _pick_album(self, artist, album, items):
+        """The album search result carrying the tagged album and artist name, or None."""
+        album, artist = default_process(album), default_process(artist)
+        for item in items:
+            if (fuzz.token_set_ratio(album, default_process(item['name'])) >= self.ALBUM_NAME_SCORE and
+                    any(fuzz.token_set_ratio(artist, default_process(a['name'])) >= self.ALBUM_NAME_SCORE
+                        for a in item['artists'])):
+                return item
+        return None
+
+    @staticmethod
+    def _album_tracks(album):
+        """Track objects of a full album object, with the album attached as in search results."""
+        summary = {key: album.get(key) for key in ('id', 'name', 'release_date', 'artists', 'images')}
+        return [dict(track, album=summary) for track in album['tracks']['items']]
+
+    def _match_album_track(self, query, track_number, tracks):
+        """Pick the album track a file is, by title and track number or length, or None.
+
+        Titles on one album often differ by a suffix alone ("Intro" and
+        "Intro (Reprise)"), and the file's name has lost its suffix to
+        strip_noise, so a title never picks a track on its own.
+        """
+        # Suffixes are stripped from the tracks' titles too, and token_sort_ratio (unlike
+        # token_set_ratio) doesn't score a title as a perfect match for every title containing it
+        candidates = [self._candidate(track) for track in tracks]
+        candidates = [c._replace(title=strip_title_noise(c.title) or c.title) for c in candidates]
+        number = str(track_number).lstrip('0') if track_number else None
+
+        best = None
+        for r in rank_candidates(query, candidates, fuzz.token_sort_ratio):
+            track = tracks[r.index]
+            number_agrees = number is not None and str(track['track_number']) == number
+            length_agrees = r.duration_score is not None and r.duration_score >= self.ALBUM_DURATION_SCORE
+            if ((r.title_score >= self.ALBUM_TITLE_SCORE and (number_agrees or length_agrees)) or
+                    (r.title_score >= self.ALBUM_NUMBERED_TITLE_SCORE and number_agrees and length_agrees)):
+                # The same stripped title may be on the album twice, prefer the track whose number agrees
+                key = (r.title_score, number_agrees, r.duration_score or 0)
+                if best is None or key > best[0]:
+                    best = (key, track)
+        return best[1] if best else None
+
+    @staticmethod
+    def _album_key(artist, album):
+        return default_process(artist), default_process(album)
+
+    @staticmethod
+    def _candidate(track):
+        duration_ms = track.get('duration_ms')
+        return Candidate(track['artists'][0]['name'], track['name'], duration_ms / 1000 if duration_ms else None)
+
+    @staticmethod
+    def _pick_isrc(isrc, items):
+        """Pick the result of an ISRC search that really carries it, or the first one."""
+        # Prefer a result that really carries the ISRC, the same recording may be on several releases
+        for track in items:
+            if track.get('external_ids', {}).get('isrc', '').upper() == isrc:
+                return track
+        return items[0] if items else None
+
+    @staticmethod
+    def _build_track_info(track, genre):
+        """Turn a Spotify track object into our track info dictionary."""
+        album = track['album']
+        return {
+            'title': track['name'],
+            'artist': track['artists'][0]['name'],
+            'album': album['name'],
+            'year': album['release_date'][:4],
+            'genre': genre,
+            'release_id': album['id'],
+            'track_number': str(track['track_number']),
+            'album_artist': album['artists'][0]['name'],
+            'track_id': track['id'],
+            'isrc': track.get('external_ids', {}).get('isrc')
+        }
+
+    @staticmethod
+    def _first_genre(genres):
+        if genres:
+            return genres[0]  # Return first genre
+        return "Unknown Genre"
+
+class SpotifyAPI(SpotifyMatcher, MusicAPI):
+    # The multi-artist and multi-track endpoints accept at most 50 IDs per request
+    ARTIST_BATCH_SIZE = 50
+    TRACK_BATCH_SIZE = 50
+    # Artists missing from the cache are collected from all workers for up to this many seconds
+    ARTIST_BATCH_WAIT = 0.05
+    # A worker waits this long for the batcher before fetching its artists itself
+    ARTIST_FETCH_TIMEOUT = 60
+
+    def __init__(self, cache_dir=None, cover_cache_bytes=512 * 1024 * 1024, persist_artists=False,
+                 search_cache=True, refresh_cache=False, rate_limit=10, pool_size=10, threshold=None,
+                 api_base=None, token_url=None, album_match=False):
         # Load environment variables from .env file
         load_dotenv()
+        self.threshold = threshold
+        self.album_match = album_match
+        
+        # Tracklists of the albums files were matched against, fetched once per album
+        self._albums = {}
+        self._album_images = {}
+        self._album_locks = {}
+        self._albums_lock = threading.Lock()
+        
+        # One pooled, rate limited session for every API call and cover download
+        self.session = RateLimitedSession(rate=rate_limit, pool_size=pool_size)
+        
+        # Alternative endpoints, e.g. a local stand-in for benchmarks
+        token_url = token_url or os.getenv('SPOTIFY_TOKEN_URL')
+        api_base = api_base or os.getenv('SPOTIFY_API_BASE')
         
-        # Initialize Spotify client
+        # Initialize Spotify client, retries are left to the session
+        credentials = _SharedClientCredentials(
+            client_id=os.getenv('SPOTIFY_CLIENT_ID'),
+            client_secret=os.getenv('SPOTIFY_CLIENT_SECRET'),
+            requests_session=self.session,
+            # Keep a stand-in's token out of the token cache file used for the real service
+            cache_handler=MemoryCacheHandler() if token_url else None
+        )
+        if token_url:
+            credentials.OAUTH_TOKEN_URL = token_url
         self.sp = spotipy.Spotify(
-            client_credentials_manager=SpotifyClientCredentials(
-                client_id=os.getenv('SPOTIFY_CLIENT_ID'),
-                client_secret=os.getenv('SPOTIFY_CLIENT_SECRET')
-            )
+            client_credentials_manager=credentials,
+            requests_session=self.session,
+            retries=0,
+            status_retries=0
         )
-    
-    def _clean_filename(self, filename):
-        """Clean up filename to extract artist and title."""
-        # Remove file extension
-        filename = Path(filename).stem
+        if api_base:
+            self.sp.prefix = api_base
+        
+        # Covers are shared by every track of an album, only download each once
+        self.cover_cache = CoverArtCache(cache_dir, max_disk_bytes=cover_cache_bytes)
         
-        # Remove leading track numbers (e.g., "01 ", "01_", "01-")
-        filename = re.sub(r'^(\d{1,3}[\s_-]+)', '', filename)
+        # Artist genres are looked up once per artist for the whole run
+        artist_cache_file = Path(cache_dir or DEFAULT_CACHE_DIR) / 'artists.json' if persist_artists else None
+        self.artist_cache = ArtistCache(artist_cache_file)
         
-        # Remove common patterns
-        patterns = [
-            r'\(feat\..*?\)',  # Featuring
-            r'\(ft\..*?\)',    # Ft.
-            r'\(featuring.*?\)', # Featuring
-            r'\(with.*?\)',    # With
-            r'\[.*?\]',        # Anything in square brackets
-            r'\|.*$',          # Everything after pipe symbol
-        ]
+        # Artists queued for the batcher thread, and an event per artist queued or in flight
+        self._artist_batch = []
+        self._artist_batch_started = None
+        self._artist_fetches = {}
+        self._artist_batch_ready = threading.Condition()
+        self._artist_batcher = None
+        self._closed = threading.Event()
         
-        for pattern in patterns:
-            filename = re.sub(pattern, '', filename, flags=re.IGNORECASE)
+        # Search results are kept between runs so reruns don't repeat every search
+        self.search_cache = None
+        if search_cache:
+            try:
+                self.search_cache = SearchCache(Path(cache_dir or DEFAULT_CACHE_DIR) / 'searches.sqlite3', refresh=refresh_cache)
+            except Exception as e:
+                logger.warning(f"Search cache disabled: {str(e)}")
+    
+    def close(self):
+        """Persist caches that outlive the run."""
+        with self._artist_batch_ready:
+            self._closed.set()
+            # Nothing will fetch these anymore, let their waiters fetch them themselves
+            self._artist_batch.clear()
+            for fetch in self._artist_fetches.values():
+                fetch.set()
+            self._artist_fetches.clear()
+        self.artist_cache.save()
+        if self.search_cache:
+            self.search_cache.close()
+        self.session.close()
+    
+    def _search_tracks(self, query, limit):
+        """Search for tracks, going through the search cache when enabled."""
+        cache_key = f"track:{limit}:{query}"
+        if self.search_cache:
+            items = self.search_cache.get(cache_key)
+            if items is not None:
+                return items
+        items = self.sp.search(q=query, type='track', limit=limit)['tracks']['items']
+        if self.search_cache:
+            self.search_cache.put(cache_key, items)
+        return items
+    
+    def _search_albums(self, query, limit):
+        """Search for albums, going through the search cache when enabled."""
+        cache_key = f"album:{limit}:{query}"
+        if self.search_cache:
+            items = self.search_cache.get(cache_key)
+            if items is not None:
+                return items
+        items = self.sp.search(q=query, type='album', limit=limit)['albums']['items']
+        if self.search_cache:
+            self.search_cache.put(cache_key, items)
+        return items
+    
+    def album_tracks(self, artist, album):
+        """Track objects of the album matching an artist and album tag, [] if there is none.
         
-        return filename.strip()
+        Fetched once per album: one album search and one album request,
+        however many files carry the tags.
+        """
+        key = self._album_key(artist, album)
+        with self._albums_lock:
+            if key in self._albums:
+                return self._albums[key]
+            key_lock = self._album_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._albums_lock:
+                tracks = self._albums.get(key)
+            if tracks is None:
+                tracks = []
+                found = self._pick_album(artist, album, self._search_albums(f"album:{album} artist:{artist}", 5))
+                if found:
+                    full_album = self.sp.album(found['id'])
+                    # Saves fetching the album again for its cover
+                    self._album_images[full_album['id']] = full_album['images']
+                    tracks = self._album_tracks(full_album)
+                with self._albums_lock:
+                    self._albums[key] = tracks
+                    self._album_locks.pop(key, None)
+        return tracks
+    
+    def match_album_track(self, artist, album, filename, original_metadata=None, track_number=None, duration_seconds=None):
+        """Match a file against its album's tracklist instead of searching for it, returns track_info or None."""
+        if not self.album_match:
+            return None
+        try:
+            tracks = self.album_tracks(artist, album)
+        except Exception as e:
+            logger.error(f"Error looking up album {album} by {artist}: {str(e)}")
+            return None
+        track = self._match_album_track(FileQuery.build(filename, original_metadata, duration_seconds), track_number, tracks)
+        if not track:
+            return None
+        logger.info(f"Matched '{track['name']}' on album {track['album']['name']}")
+        return self._create_track_info(track)
+    
+    def search_track(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None, isrc=None):
+        try:
+            track_info, choices = self.match_track(filename, original_metadata, original_filename, isrc)
+            if track_info:
+                return track_info
+            
+            # Otherwise, show selection menu
+            if choices:
+                return self.select_track(filename, choices, original_metadata, original_filename, duration, current_file, total_files)
+            
+            logger.info(f"No matches found for {filename}")
+            return None
+                
+        except Exception as e:
+            logger.error(f"Error searching Spotify: {str(e)}")
+            return None
 
-    def _extract_search_terms(self, filename):
-        """Extract artist and title from filename or metadata."""
-        clean_filename = self._clean_filename(filename)
-        parts = re.split(r' - ', clean_filename, maxsplit=1)
+    def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        """Search for a track without prompting the user.
+        
+        Returns a (track_info, choices) tuple: track_info is set when a perfect
+        match was found, otherwise choices holds the candidates to prompt with,
+        ranked by score. Files with an ISRC are matched on it first, free text
+        search is the fallback.
+        """
+        if isrc:
+            track_info = self.match_isrc(isrc)
+            if track_info:
+                return track_info, []
+        
+        # Normalize the filename once, for the search and for scoring every candidate
+        query = FileQuery.build(filename, original_metadata, duration_seconds)
+        items = self._search_tracks(query.search_terms, 5)  # Reduced from 20 to 5
         
-        if len(parts) == 2:
-            return f"{parts[0]} {parts[1]}"  # Simple space-separated artist and title
+        # One batched request covers the genres of every candidate, whichever gets picked
+        self.prefetch_artist_genres([track['artists'][0]['id'] for track in items])
         
-        # If no separator found, clean up the filename and return it
-        return re.sub(r'^(\d{1,3}[\s_-]+)', '', clean_filename)
+        perfect_match, choices = self._evaluate_candidates(query, filename, original_metadata, items)
+        
+        # Only auto-select if we have an exact match
+        if perfect_match:
+            logger.info(f"Auto-selecting perfect match: '{perfect_match['name']}' by {perfect_match['artists'][0]['name']}")
+            return self._create_track_info(perfect_match), []
+        
+        return None, choices
 
-    def search_track(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+    def match_isrc(self, isrc):
+        """Look a track up by its ISRC, returns track_info or None."""
+        isrc = isrc.strip().upper().replace('-', '')
+        track = self._pick_isrc(isrc, self._search_tracks(f"isrc:{isrc}", 5))
+        if not track:
+            return None
+        logger.info(f"Matched ISRC {isrc}: '{track['name']}' by {track['artists'][0]['name']}")
+        return self._create_track_info(track)
+
+    def select_track(self, filename, choices, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
+        """Prompt the user to pick one of the candidates returned by match_track."""
+        # Add custom search and skip options
+        choices = list(choices)
+        choices.append(("Custom search...", "CUSTOM_SEARCH"))
+        choices.append(("Enter Spotify track URL/ID...", "SPOTIFY_ID"))
+        choices.append(("Transfer song, no ID change", "TRANSFER_ONLY"))
+        choices.append(("Skip song", None))
+        
+        # Print file information first, before launching inquirer
+        display_filename = original_filename if original_filename else Path(filename).name
+        metadata_display = original_metadata if original_metadata and original_metadata != f"Unknown - {Path(filename).stem} (Unknown Album)" else f"Unknown - {Path(filename).stem} (Unknown Album)"
+        
+        # Show track progress if available
+        if current_file is not None and total_files is not None:
+            print(f"[Track {current_file}/{total_files}]")
+        
+        print(f"[{metadata_display}]")
+        print(f'"{display_filename}"')
+        if duration and duration != "Unknown":
+            print(f"Length: {duration}")
+        print("─" * 40 + "\n")
+        
+        # Use standardized inquirer format to prevent duplication
         try:
-            # Get search terms from filename
-            search_query = self._extract_search_terms(filename)
-            results = self.sp.search(q=search_query, type='track', limit=5)  # Reduced from 20 to 5
+            # Only display the list choice prompt without file info
+            questions = [
+                inquirer.List('selection',
+                            message="Select the correct match:",
+                            choices=[c[0] for c in choices])
+            ]
             
-            if results['tracks']['items']:
-                choices = []
-                perfect_match = None
-                
-                for track in results['tracks']['items']:
-                    track_artist = track['artists'][0]['name']
-                    track_title = track['name']
-                    album = track['album']
-                    
-                    # Create display string
-                    choice_str = f"{track_artist} - {track_title} ({album['name']})"
-                    
-                    # Check for exact matches more effectively
-                    # Case 1: The song title and artist both appear in the filename
-                    filename_matches_track = (
-                        filename.lower().find(track_title.lower()) != -1 and 
-                        filename.lower().find(track_artist.lower()) != -1
-                    )
-                    
-                    # Case 2: The original metadata matches exactly
-                    metadata_matches_track = False
-                    if original_metadata:
-                        expected_metadata = f"{track_artist} - {track_title} ({album['name']})"
-                        metadata_matches_track = original_metadata.lower() == expected_metadata.lower()
-                    
-                    # Case 3: First result is exact match for the search query (useful for well-formatted filenames)
-                    is_first_result = track == results['tracks']['items'][0]
-                    clean_filename = self._clean_filename(filename)
-                    formatted_filename = clean_filename.lower().replace(' - ', ' ')
-                    search_string = f"{track_artist} {track_title}".lower()
-                    search_match = (
-                        is_first_result and
-                        (formatted_filename == search_string or
-                         formatted_filename.startswith(search_string) or
-                         search_string.startswith(formatted_filename))
-                    )
-                    
-                    # Case 4: The example "Fleetwood Mac - Peacekeeper" case
-                    display_filename = original_filename if original_filename else Path(filename).name
-                    exact_match_in_list = choice_str == f"{original_metadata}"
-                    
-                    # Determine perfect match
-                    if filename_matches_track or metadata_matches_track or search_match or exact_match_in_list:
-                        perfect_match = track
-                        logger.info(f"Found perfect match: '{track_title}' by {track_artist}")
-                    
-                    choices.append((choice_str, track))
-                
-                # Only auto-select if we have an exact match
-                if perfect_match:
-                    logger.info(f"Auto-selecting perfect match: '{perfect_match['name']}' by {perfect_match['artists'][0]['name']}")
-                    return self._create_track_info(perfect_match)
-                
-                # Otherwise, show selection menu
-                if choices:
-                    # Add custom search and skip options
-                    choices.append(("Custom search...", "CUSTOM_SEARCH"))
-                    choices.append(("Enter Spotify track URL/ID...", "SPOTIFY_ID"))
-                    choices.append(("Transfer song, no ID change", "TRANSFER_ONLY"))
-                    choices.append(("Skip song", None))
-                    
-                    # Print file information first, before launching inquirer
-                    display_filename = original_filename if original_filename else Path(filename).name
-                    metadata_display = original_metadata if original_metadata and original_metadata != f"Unknown - {Path(filename).stem} (Unknown Album)" else f"Unknown - {Path(filename).stem} (Unknown Album)"
-                    
-                    # Show track progress if available
+            # For terminal compatibility, don't use carousel option
+            answers = inquirer.prompt(questions)
+            
+            if answers:
+                if answers['selection'] == "Custom search...":
+                    # Clear any possible duplicate lines
+                    os.system('clear' if os.name != 'nt' else 'cls')
+                    custom_result = self._custom_search(filename, original_metadata, original_filename, duration, current_file, total_files)
+                    if custom_result:
+                        return custom_result
+                elif answers['selection'] == "Enter Spotify track URL/ID...":
+                    # Clear any possible duplicate lines
+                    os.system('clear' if os.name != 'nt' else 'cls')
+                    # Print file information again
+                    print("\n" + "─" * 40)
+                    print("File Information:")
                     if current_file is not None and total_files is not None:
                         print(f"[Track {current_file}/{total_files}]")
-                    
                     print(f"[{metadata_display}]")
                     print(f'"{display_filename}"')
                     if duration and duration != "Unknown":
                         print(f"Length: {duration}")
                     print("─" * 40 + "\n")
-                    
-                    # Use standardized inquirer format to prevent duplication
-                    try:
-                        # Only display the list choice prompt without file info
-                        questions = [
-                            inquirer.List('selection',
-                                        message="Select the correct match:",
-                                        choices=[c[0] for c in choices])
-                        ]
-                        
-                        # For terminal compatibility, don't use carousel option
-                        answers = inquirer.prompt(questions)
-                        
-                        if answers:
-                            if answers['selection'] == "Custom search...":
-                                # Clear any possible duplicate lines
-                                os.system('clear' if os.name != 'nt' else 'cls')
-                                custom_result = self._custom_search(filename, original_metadata, original_filename, duration, current_file, total_files)
-                                if custom_result:
-                                    return custom_result
-                            elif answers['selection'] == "Enter Spotify track URL/ID...":
-                                # Clear any possible duplicate lines
-                                os.system('clear' if os.name != 'nt' else 'cls')
-                                # Print file information again
-                                print("\n" + "─" * 40)
-                                print("File Information:")
-                                if current_file is not None and total_files is not None:
-                                    print(f"[Track {current_file}/{total_files}]")
-                                print(f"[{metadata_display}]")
-                                print(f'"{display_filename}"')
-                                if duration and duration != "Unknown":
-                                    print(f"Length: {duration}")
-                                print("─" * 40 + "\n")
-                                # Prompt for Spotify track URL or ID
-                                print("Enter Spotify track URL or ID (e.g., https://open.spotify.com/track/1fRHO3Bi9Pze9cCbk0qzTf or 1fRHO3Bi9Pze9cCbk0qzTf):")
-                                track_id_or_url = input("> ")
-                                if track_id_or_url.strip():
-                                    track_result = self.get_track_by_id(track_id_or_url)
-                                    if track_result:
-                                        return track_result
-                                    else:
-                                        print("Invalid Spotify track URL or ID. Returning to search...")
-                                        return self.search_track(filename, original_metadata, original_filename, duration, current_file, total_files)
-                            elif answers['selection'] == "Transfer song, no ID change":
-                                return "TRANSFER_ONLY"
-                            elif answers['selection'] != "Skip song":
-                                selected_track = next(c[1] for c in choices if c[0] == answers['selection'])
-                                return self._create_track_info(selected_track)
-                    except Exception as e:
-                        logger.error(f"Error displaying selection menu: {str(e)}")
-                        # Fallback to numbered list if inquirer fails
-                        print("Available matches:")
-                        for i, choice in enumerate(choices):
-                            print(f"  {i+1}. {choice[0]}")
-                        
-                        try:
-                            selection = input("\nEnter number of your selection: ")
-                            idx = int(selection) - 1
-                            if 0 <= idx < len(choices):
-                                if choices[idx][1] == "CUSTOM_SEARCH":
-                                    return self._custom_search(filename, original_metadata, original_filename, duration, current_file, total_files)
-                                elif choices[idx][1] == "SPOTIFY_ID":
-                                    # Prompt for Spotify track URL or ID
-                                    print("Enter Spotify track URL or ID:")
-                                    track_id_or_url = input("> ")
-                                    if track_id_or_url.strip():
-                                        track_result = self.get_track_by_id(track_id_or_url)
-                                        if track_result:
-                                            return track_result
-                                elif choices[idx][1] == "TRANSFER_ONLY":
-                                    return "TRANSFER_ONLY"
-                                elif choices[idx][1] is not None:
-                                    return self._create_track_info(choices[idx][1])
-                        except:
-                            pass
-                    
-                    return None
-                
-                logger.info(f"No matches found for {filename}")
-                return None
-                
+                    # Prompt for Spotify track URL or ID
+                    print("Enter Spotify track URL or ID (e.g., https://open.spotify.com/track/1fRHO3Bi9Pze9cCbk0qzTf or 1fRHO3Bi9Pze9cCbk0qzTf):")
+                    track_id_or_url = input("> ")
+                    if track_id_or_url.strip():
+                        track_result = self.get_track_by_id(track_id_or_url)
+                        if track_result:
+                            return track_result
+                        else:
+                            print("Invalid Spotify track URL or ID. Returning to search...")
+                            return self.search_track(filename, original_metadata, original_filename, duration, current_file, total_files)
+                elif answers['selection'] == "Transfer song, no ID change":
+                    return "TRANSFER_ONLY"
+                elif answers['selection'] != "Skip song":
+                    selected_track = next(c[1] for c in choices if c[0] == answers['selection'])
+                    return self._create_track_info(selected_track)
         except Exception as e:
-            logger.error(f"Error searching Spotify: {str(e)}")
-            return None
+            logger.error(f"Error displaying selection menu: {str(e)}")
+            # Fallback to numbered list if inquirer fails
+            print("Available matches:")
+            for i, choice in enumerate(choices):
+                print(f"  {i+1}. {choice[0]}")
+            
+            try:
+                selection = input("\nEnter number of your selection: ")
+                idx = int(selection) - 1
+                if 0 <= idx < len(choices):
+                    if choices[idx][1] == "CUSTOM_SEARCH":
+                        return self._custom_search(filename, original_metadata, original_filename, duration, current_file, total_files)
+                    elif choices[idx][1] == "SPOTIFY_ID":
+                        # Prompt for Spotify track URL or ID
+                        print("Enter Spotify track URL or ID:")
+                        track_id_or_url = input("> ")
+                        if track_id_or_url.strip():
+                            track_result = self.get_track_by_id(track_id_or_url)
+                            if track_result:
+                                return track_result
+                    elif choices[idx][1] == "TRANSFER_ONLY":
+                        return "TRANSFER_ONLY"
+                    elif choices[idx][1] is not None:
+                        return self._create_track_info(choices[idx][1])
+            except:
+                pass
+        
+        return None
 
     def _custom_search(self, filename, original_metadata=None, original_filename=None, duration=None, current_file=None, total_files=None):
         """Helper method to perform a custom search."""
@@ -249,11 +521,11 @@ class SpotifyAPI(MusicAPI):
         query = input("> ")
         
         if query.strip():
-            results = self.sp.search(q=query.strip(), type='track', limit=20)
+            items = self._search_tracks(query.strip(), 20)
             
-            if results['tracks']['items']:
+            if items:
                 choices = []
-                for track in results['tracks']['items']:
+                for track in items:
                     album = track['album']
                     choice_str = f"{track['artists'][0]['name']} - {track['name']} ({album['name']})"
                     choices.append((choice_str, track))
@@ -323,41 +595,116 @@ class SpotifyAPI(MusicAPI):
 
     def get_cover_art(self, album_id):
         try:
-            # Get album details
-            album = self.sp.album(album_id)
-            if album['images']:
-                # Get the largest image (first in the list)
-                image_url = album['images'][0]['url']
-                response = requests.get(image_url)
-                if response.status_code == 200:
-                    return response.content
-            return None
+            with stats.timed('cover'):
+                return self.cover_cache.get_or_fetch(album_id, lambda: self._download_cover_art(album_id))
         except Exception as e:
             logger.error(f"Error fetching cover art: {str(e)}")
             return None
     
+    def _download_cover_art(self, album_id):
+        # Get album details, unless its tracklist was fetched already
+        images = self._album_images.get(album_id)
+        if images is None:
+            images = self.sp.album(album_id)['images']
+        if images:
+            # Get the largest image (first in the list)
+            image_url = images[0]['url']
+            response = self.session.get(image_url, timeout=30)
+            if response.status_code == 200:
+                return response.content
+        return None
+    
+    def prefetch_artist_genres(self, artist_ids):
+        """Resolve uncached artists through the multi-artist endpoint, returns once they are cached.
+
+        Misses from all workers go into one queue, which a batcher thread
+        sends in requests of up to ARTIST_BATCH_SIZE IDs, so the workers
+        together fill batches that a single file's candidates never would.
+        Artists already queued or in flight are waited for, not queued again.
+        Artists the batcher didn't deliver within ARTIST_FETCH_TIMEOUT, or
+        after close(), are fetched on the calling thread.
+        """
+        missing = self.artist_cache.missing(artist_ids)
+        if not missing:
+            return
+        fetches = {}
+        with self._artist_batch_ready:
+            closed = self._closed.is_set()
+            for artist_id in [] if closed else missing:
+                fetch = self._artist_fetches.get(artist_id)
+                if fetch is None:
+                    if self.artist_cache.get(artist_id) is not None:
+                        # Cached by a batch that finished in the meantime
+                        continue
+                    fetch = self._artist_fetches[artist_id] = threading.Event()
+                    if not self._artist_batch:
+                        self._artist_batch_started = time.monotonic()
+                    self._artist_batch.append(artist_id)
+                fetches[artist_id] = fetch
+            if self._artist_batcher is None and not closed:
+                self._artist_batcher = threading.Thread(target=self._fetch_artist_batches, daemon=True)
+                self._artist_batcher.start()
+            if len(self._artist_batch) >= self.ARTIST_BATCH_SIZE:
+                self._artist_batch_ready.notify()
+        if closed:
+            # No batcher anymore
+            self._fetch_artists(missing)
+            return
+        deadline = time.monotonic() + self.ARTIST_FETCH_TIMEOUT
+        for fetch in fetches.values():
+            if not fetch.wait(max(0, deadline - time.monotonic())):
+                break
+        # Not fetched in time, or dropped by close()
+        late = [artist_id for artist_id, fetch in fetches.items()
+                if not fetch.is_set() or self._closed.is_set() and self.artist_cache.get(artist_id) is None]
+        if late:
+            logger.warning(f"Artist lookups did not finish in time, fetching {len(late)} directly")
+            self._fetch_artists(late)
+
+    def _fetch_artist_batches(self):
+        """Batcher thread: fetch queued artists with multi-artist requests."""
+        while not self._closed.is_set():
+            with self._artist_batch_ready:
+                self._artist_batch_ready.wait(self.ARTIST_BATCH_WAIT)
+                if not self._artist_batch:
+                    continue
+                if (len(self._artist_batch) < self.ARTIST_BATCH_SIZE and
+                        time.monotonic() - self._artist_batch_started < self.ARTIST_BATCH_WAIT):
+                    continue
+                batch = self._artist_batch[:self.ARTIST_BATCH_SIZE]
+                del self._artist_batch[:self.ARTIST_BATCH_SIZE]
+                self._artist_batch_started = time.monotonic()
+            
+            try:
+                self._fetch_artists(batch)
+            finally:
+                with self._artist_batch_ready:
+                    for artist_id in batch:
+                        fetch = self._artist_fetches.pop(artist_id, None)
+                        if fetch:
+                            fetch.set()
+
+    def _fetch_artists(self, artist_ids):
+        """Fetch artists with multi-artist requests and cache their genres."""
+        for i in range(0, len(artist_ids), self.ARTIST_BATCH_SIZE):
+            batch = artist_ids[i:i + self.ARTIST_BATCH_SIZE]
+            try:
+                artists = self.sp.artists(batch)['artists']
+            except Exception as e:
+                # The waiting workers go on without a genre
+                logger.error(f"Error fetching artists: {str(e)}")
+                continue
+            for artist_id, artist in zip(batch, artists):
+                self.artist_cache.put(artist_id, artist['genres'] if artist else [])
+
     def _get_artist_genres(self, artist_id):
-        try:
-            artist = self.sp.artist(artist_id)
-            if artist['genres']:
-                return artist['genres'][0]  # Return first genre
-        except:
-            pass
-        return "Unknown Genre"
+        # Fetches the artist only if it isn't cached yet
+        self.prefetch_artist_genres([artist_id])
+        return self._first_genre(self.artist_cache.get(artist_id))
 
     def _create_track_info(self, track):
         """Helper method to create track info dictionary."""
-        album = track['album']
-        return {
-            'title': track['name'],
-            'artist': track['artists'][0]['name'],
-            'album': album['name'],
-            'year': album['release_date'][:4],
-            'genre': self._get_artist_genres(track['artists'][0]['id']),
-            'release_id': album['id'],
-            'track_number': str(track['track_number']),
-            'album_artist': album['artists'][0]['name']
-        }
+        return self._build_track_info(track, self._get_artist_genres(track['artists'][0]['id']))
 
     def get_track_by_id(self, track_id_or_url):
         """Get track info directly from a Spotify track ID or URL."""
@@ -377,4 +724,22 @@ class SpotifyAPI(MusicAPI):
             return None
         except Exception as e:
             logger.error(f"Error getting track by ID: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    def get_tracks_by_ids(self, track_ids):
+        """Get track info for many Spotify track IDs through the multi-track endpoint."""
+        track_ids = list(dict.fromkeys(t for t in track_ids if t))
+        tracks = {}
+        for i in range(0, len(track_ids), self.TRACK_BATCH_SIZE):
+            batch = track_ids[i:i + self.TRACK_BATCH_SIZE]
+            try:
+                # Results come back in request order, None for unknown IDs
+                for track_id, track in zip(batch, self.sp.tracks(batch)['tracks']):
+                    if track:
+                        tracks[track_id] = track
+            except Exception as e:
+                logger.error(f"Error getting tracks by ID: {str(e)}")
+        
+        # Genres for all of them in as few requests as possible
+        self.prefetch_artist_genres([track['artists'][0]['id'] for track in tracks.values()])
+        return {track_id: self._create_track_info(track) for track_id, track in tracks.items()}
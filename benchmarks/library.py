@@ -0,0 +1,87 @@
+from mutagen.easyid3 import EasyID3
+from mutagen.mp4 import MP4
+from pathlib import Path
+import random
+import struct
+import wave
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz): 417 bytes, 26 ms
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+MP3_FRAMES_PER_SECOND = 38
+
+# Consecutive tracks make up an album, as in a real rip
+TRACKS_PER_ALBUM = 12
+
+def track_fields(i, artists=200):
+    """Artist, title and album of synthetic track i, as the mock Spotify server knows it."""
+    album = i // TRACKS_PER_ALBUM
+    return f"Artist {album % artists}", f"Title {i}", f"Album {album}"
+
+def track_number(i):
+    return i % TRACKS_PER_ALBUM + 1
+
+def _write_mp3(path, seconds):
+    path.write_bytes(MP3_FRAME * (MP3_FRAMES_PER_SECOND * seconds))
+
+def _write_wav(path, seconds, rate=8000):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\0\0' * rate * seconds)
+
+def _atom(name, data):
+    return struct.pack('>I', 8 + len(data)) + name + data
+
+def _write_m4a(path, seconds, rate=44100):
+    """Minimal AAC-in-MP4 file: just enough structure for mutagen to read and tag."""
+    mvhd = _atom(b'mvhd', b'\0' * 12 + struct.pack('>II', 1000, seconds * 1000) + b'\0' * 80)
+    mdhd = _atom(b'mdhd', b'\0' * 12 + struct.pack('>II', rate, seconds * rate) + b'\0' * 4)
+    hdlr = _atom(b'hdlr', b'\0' * 8 + b'soun' + b'\0' * 13)
+    mp4a = _atom(b'mp4a', b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 8 + struct.pack('>HH', 2, 16) +
+                 b'\0' * 4 + struct.pack('>I', rate << 16) + _atom(b'free', b''))
+    stsd = _atom(b'stsd', b'\0' * 4 + struct.pack('>I', 1) + mp4a)
+    stco = _atom(b'stco', b'\0' * 4 + struct.pack('>II', 1, 0))
+    moov = _atom(b'moov', mvhd + _atom(b'trak', _atom(b'mdia', mdhd + hdlr + _atom(b'minf', _atom(b'stbl', stsd + stco)))))
+    ftyp = _atom(b'ftyp', b'M4A \0\0\0\0M4A mp42isom')
+    mdat = _atom(b'mdat', b'\x21' * (16000 * seconds))
+    data = bytearray(ftyp + moov + mdat)
+    # Point the chunk offset at the mdat payload
+    offset = data.find(b'stco') + 12
+    data[offset:offset + 4] = struct.pack('>I', len(ftyp) + len(moov) + 8)
+    path.write_bytes(bytes(data))
+
+WRITERS = {'.mp3': _write_mp3, '.wav': _write_wav, '.m4a': _write_m4a}
+
+def generate_library(root, count, formats=('.mp3', '.m4a', '.wav'), seconds=30, tagged=0.7, seed=0):
+    """Write count synthetic audio files under root, returns their paths.
+
+    Files cycle through formats and are spread over one directory per
+    artist. A tagged fraction of the MP3 and M4A files get artist, title,
+    album and track number tags; the rest only have an "Artist - Title"
+    filename.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    paths = []
+    for i in range(count):
+        ext = formats[i % len(formats)]
+        artist, title, album = track_fields(i)
+        directory = root / artist
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{artist} - {title}{ext}"
+        WRITERS[ext](path, seconds)
+
+        if ext != '.wav' and rng.random() < tagged:
+            if ext == '.mp3':
+                tags = EasyID3()
+                tags['artist'], tags['title'], tags['album'] = artist, title, album
+                tags['tracknumber'] = str(track_number(i))
+                tags.save(path)
+            else:
+                tags = MP4(path)
+                tags['\xa9ART'], tags['\xa9nam'], tags['\xa9alb'] = artist, title, album
+                tags['trkn'] = [(track_number(i), 0)]
+                tags.save()
+        paths.append(path)
+    return paths
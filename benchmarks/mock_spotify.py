@@ -0,0 +1,169 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from .library import track_fields, track_number, TRACKS_PER_ALBUM
+import threading
+import json
+import time
+import re
+
+TITLE_PATTERN = re.compile(r'Title (\d+)')
+ALBUM_PATTERN = re.compile(r'album:Album (\d+)')
+
+class MockSpotify(ThreadingHTTPServer):
+    """Local stand-in for the Spotify endpoints the organizer uses.
+
+    Knows one track per synthetic library file (see library.track_fields)
+    and answers the token, search (tracks and albums), tracks, artists
+    and albums endpoints plus cover downloads, each after latency seconds. Counts requests per
+    endpoint and bytes served. throttle() makes it answer the next few
+    requests with a 429, as Spotify does when a client goes too fast.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, seconds=30, cover_bytes=64 * 1024, port=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.seconds = seconds
+        self.cover = b'\xff\xd8\xff\xe0' + b'\0' * (cover_bytes - 4)
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._throttled = 0
+        self._retry_after = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def throttle(self, count, retry_after=1):
+        """Answer the next count GET requests with a 429 and the given Retry-After."""
+        with self._lock:
+            self._throttled = count
+            self._retry_after = retry_after
+
+    def take_throttled(self):
+        """Retry-After for a request that should be rate limited, else None."""
+        with self._lock:
+            if not self._throttled:
+                return None
+            self._throttled -= 1
+            self.requests['rate_limited'] += 1
+            return self._retry_after
+
+    def count(self, endpoint, size):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes_sent += size
+
+    def album(self, a):
+        artist, _, album = track_fields(a * TRACKS_PER_ALBUM)
+        return {
+            'id': f"album{a:0>17}",
+            'name': album,
+            'release_date': '2001-01-01',
+            'artists': [{'id': f"artist{artist.split()[-1]:0>16}", 'name': artist}],
+            'images': [{'url': f"{self.url}/images/album{a:0>17}.jpg"}]
+        }
+
+    def track(self, i):
+        artist, title, album = track_fields(i)
+        return {
+            'id': f"{i:022d}",
+            'name': title,
+            'track_number': track_number(i),
+            'duration_ms': self.seconds * 1000,
+            'artists': [{'id': f"artist{artist.split()[-1]:0>16}", 'name': artist}],
+            'album': self.album(i // TRACKS_PER_ALBUM),
+            'external_ids': {'isrc': f"XX{i:010d}"}
+        }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, endpoint, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.server.count(endpoint, len(body))
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        self._send('token', {'access_token': 'benchmark', 'token_type': 'Bearer', 'expires_in': 3600})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        # spotipy asks for e.g. artists/?ids=...
+        path = url.path.rstrip('/')
+        query = parse_qs(url.query)
+        server = self.server
+        time.sleep(server.latency)
+
+        retry_after = server.take_throttled()
+        if retry_after is not None:
+            self.send_response(429)
+            self.send_header('Retry-After', str(retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if path.startswith('/images/'):
+            return self._send('cover', server.cover, 'image/jpeg')
+        if path == '/v1/search':
+            text = query.get('q', [''])[0]
+            if query.get('type', [''])[0] == 'album':
+                match = ALBUM_PATTERN.search(text)
+                return self._send('search', {'albums': {'items': [server.album(int(match.group(1)))] if match else []}})
+            if text.startswith('isrc:'):
+                match = re.search(r'(\d+)$', text)
+            else:
+                match = TITLE_PATTERN.search(text)
+            items = [server.track(int(match.group(1)))] if match else []
+            return self._send('search', {'tracks': {'items': items}})
+        if path == '/v1/tracks':
+            ids = query.get('ids', [''])[0].split(',')
+            return self._send('tracks', {'tracks': [server.track(int(i)) if i.isdigit() else None for i in ids]})
+        if path.startswith('/v1/tracks/'):
+            return self._send('track', server.track(int(path.rsplit('/', 1)[1])))
+        if path == '/v1/artists':
+            ids = query.get('ids', [''])[0].split(',')
+            return self._send('artists', {'artists': [{'id': a, 'genres': ['benchmark']} for a in ids]})
+        if path.startswith('/v1/albums/'):
+            a = int(path.rsplit('/', 1)[1][len('album'):])
+            tracks = []
+            for i in range(a * TRACKS_PER_ALBUM, (a + 1) * TRACKS_PER_ALBUM):
+                track = server.track(i)
+                # Album tracklists hold simplified track objects
+                del track['album'], track['external_ids']
+                tracks.append(track)
+            return self._send('album', dict(server.album(a), tracks={'items': tracks, 'next': None}))
+
+        body = b'{"error": "not found"}'
+        self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
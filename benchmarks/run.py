@@ -0,0 +1,152 @@
+"""End-to-end throughput benchmark.
+
+Generates a synthetic library, serves the Spotify endpoints from a local
+mock with configurable latency and organizes the library with
+music_organizer (or process_file, one file after the other), then
+reports files/sec, API calls per file and bytes written per file.
+
+    python -m benchmarks.run --files 500 --latency 50
+"""
+from contextlib import redirect_stdout
+from pathlib import Path
+import tempfile
+import logging
+import shutil
+import click
+import json
+import time
+import csv
+import io
+import os
+from .library import generate_library, track_fields
+from .mock_spotify import MockSpotify
+from utils.stats import stats
+
+def _bytes_written(destination):
+    """Total size of the organized files, not counting our sidecar files."""
+    return sum(p.stat().st_size for p in Path(destination).rglob('*') if p.is_file() and not p.name.startswith('.'))
+
+def _write_catalog(path, count, seconds):
+    """Catalog for --api local holding the same tracks as the mock server."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'artist', 'album', 'year', 'isrc', 'duration'])
+        for i in range(count):
+            artist, title, album = track_fields(i)
+            writer.writerow([title, artist, album, '2001', f"XX{i:010d}", seconds])
+
+def _organize(source, destination, cache_dir, api, workers, concurrency, rate_limit, catalog, tag_procs, no_album_match):
+    # Imported late so the endpoint environment variables are set first
+    import music_organizer
+    args = ['organize', str(source), str(destination), '--cache-dir', str(cache_dir), '--unattended',
+            '--api', api, '--workers', str(workers), '--concurrency', str(concurrency),
+            '--rate-limit', str(rate_limit), '--tag-procs', str(tag_procs)]
+    if catalog:
+        args += ['--catalog', str(catalog)]
+    if no_album_match:
+        args.append('--no-album-match')
+    music_organizer.main.main(args, standalone_mode=False)
+
+def _process_serially(paths, destination, cache_dir, rate_limit):
+    from apis.spotify_api import SpotifyAPI
+    from utils.file_handling import process_file
+    api = SpotifyAPI(cache_dir, rate_limit=rate_limit)
+    try:
+        for current_file, path in enumerate(paths, 1):
+            process_file(path, destination, False, False, api, current_file=current_file, total_files=len(paths))
+    finally:
+        api.close()
+
+@click.command()
+@click.option('--files', default=300, show_default=True, help="Number of synthetic files")
+@click.option('--formats', default='mp3,m4a,wav', show_default=True, help="Comma separated formats to cycle through")
+@click.option('--seconds', default=30, show_default=True, help="Length of each synthetic file")
+@click.option('--latency', default=50.0, show_default=True, help="Mock API latency in milliseconds")
+@click.option('--api', type=click.Choice(['spotify', 'spotify-async', 'local']), default='spotify', show_default=True)
+@click.option('--workers', default=4, show_default=True)
+@click.option('--concurrency', default=100, show_default=True, help="Files in flight with --api spotify-async")
+@click.option('--tag-procs', default=0, show_default=True, help="Tag worker processes for the organizer")
+@click.option('--no-album-match', is_flag=True, help="Search for every file on its own")
+@click.option('--rate-limit', default=1000.0, show_default=True, help="Requests per second allowed by the client")
+@click.option('--serial', is_flag=True, help="Call process_file for one file after the other instead of running the organizer")
+@click.option('--runs', default=1, show_default=True, help="Runs over the same library; later runs find the caches warm")
+@click.option('--work-dir', type=click.Path(file_okay=False), default=None,
+              help="Keep the library and output here instead of in a temporary directory")
+@click.option('--json', 'json_output', type=click.Path(dir_okay=False), default=None, help="Also write the results to this file")
+def main(files, formats, seconds, latency, api, workers, concurrency, tag_procs, no_album_match, rate_limit, serial, runs, work_dir, json_output):
+    """Benchmark organizing a synthetic library against a mock Spotify."""
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    logging.getLogger().setLevel(logging.WARNING)
+    work = Path(work_dir) if work_dir else Path(tempfile.mkdtemp(prefix='music_organizer_bench_'))
+    source = work / 'library'
+    cache_dir = work / 'cache'
+
+    started = time.perf_counter()
+    extensions = tuple(f".{ext.strip().lstrip('.')}" for ext in formats.split(','))
+    paths = generate_library(source, files, extensions, seconds)
+    source_bytes = sum(p.stat().st_size for p in paths)
+    click.echo(f"Generated {files} files ({source_bytes / files / 1024:.0f} KiB each) in {time.perf_counter() - started:.1f}s")
+
+    catalog = None
+    if api == 'local':
+        catalog = work / 'catalog.csv'
+        _write_catalog(catalog, files, seconds)
+
+    server = MockSpotify(latency=latency / 1000, seconds=seconds).start()
+    os.environ['SPOTIFY_API_BASE'] = f"{server.url}/v1/"
+    os.environ['SPOTIFY_TOKEN_URL'] = f"{server.url}/api/token"
+    os.environ.setdefault('SPOTIFY_CLIENT_ID', 'benchmark')
+    os.environ.setdefault('SPOTIFY_CLIENT_SECRET', 'benchmark')
+
+    results = []
+    try:
+        for run in range(1, runs + 1):
+            destination = work / f"organized_{run}"
+            shutil.rmtree(destination, ignore_errors=True)
+            server.reset()
+            stats.reset()
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                if serial:
+                    _process_serially(paths, destination, cache_dir, rate_limit)
+                else:
+                    _organize(source, destination, cache_dir, api, workers, concurrency, rate_limit, catalog, tag_procs,
+                              no_album_match)
+            elapsed = time.perf_counter() - started
+
+            calls = sum(server.requests.values())
+            written = _bytes_written(destination)
+            result = {
+                'run': run,
+                'files': files,
+                'seconds': round(elapsed, 3),
+                'files_per_second': round(files / elapsed, 1),
+                'api_calls_per_file': round(calls / files, 3),
+                'api_calls': dict(server.requests),
+                'bytes_written_per_file': round(written / files),
+                'bytes_downloaded_per_file': round(server.bytes_sent / files),
+                # The organizer's own view of the run, see utils.stats
+                'client_stats': stats.to_dict()
+            }
+            results.append(result)
+            click.echo(f"Run {run}: {result['files_per_second']} files/s, "
+                       f"{result['api_calls_per_file']} API calls/file, "
+                       f"{result['bytes_written_per_file'] / 1024:.0f} KiB written/file, "
+                       f"{result['bytes_downloaded_per_file'] / 1024:.1f} KiB downloaded/file "
+                       f"({elapsed:.2f}s)")
+            click.echo("  " + ", ".join(f"{k}={v}" for k, v in sorted(server.requests.items())))
+    finally:
+        server.stop()
+        if not work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if json_output:
+        Path(json_output).write_text(json.dumps({
+            'api': 'serial' if serial else api,
+            'latency_ms': latency,
+            'workers': workers,
+            'runs': results
+        }, indent=2))
+
+if __name__ == '__main__':
+    main()
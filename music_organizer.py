@@ -1,10 +1,29 @@
 import click
 from pathlib import Path
+import itertools
+from functools import partial
 import logging
+import signal
 from tqdm import tqdm
 from colorama import init, Fore, Style
 from apis.spotify_api import SpotifyAPI
-from utils.file_handling import process_file
+from apis.async_spotify_api import AsyncSpotifyAPI
+from apis.base_api import AsyncMusicAPI
+from apis.local_catalog_api import LocalCatalogAPI
+from utils.file_handling import select_match, transfer_file
+from utils.pipeline import run_pipeline
+from utils.async_pipeline import run_async_pipeline
+from utils.journal import RunJournal, JOURNAL_NAME
+from utils.library_index import DestinationIndex
+from utils.manifest import load_manifest
+from utils.review import ReviewQueue, REVIEW_NAME
+from utils.scanner import AudioFileScanner, DEFAULT_EXTENSIONS, parse_extensions
+from utils.stats import stats
+from utils.tag_pool import TagPool
+from utils.plan import PlanWriter, apply_plan
+from utils.transfer import HARDLINK, REFLINK
+from utils.report import RunReport
+from utils.watcher import FolderWatcher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -13,7 +32,95 @@ logger = logging.getLogger(__name__)
 # Initialize colorama
 init()
 
-@click.command()
+REPORT_HELP = "Stream every file's outcome to this CSV (.csv) or JSONL file as the run goes"
+
+class DefaultCommandGroup(click.Group):
+    """Command group that runs default_command when no subcommand is named.
+
+    Keeps `music_organizer.py SOURCE_DIR DESTINATION_DIR` working next to the subcommands.
+    """
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+def _print_change(status, original, new):
+    """Print one file's change, colored by its RunReport status."""
+    if status == 'success':
+        print(f"{Fore.YELLOW}{original}{Style.RESET_ALL} → {Fore.CYAN}{new}{Style.RESET_ALL}")
+    elif status == 'failed':
+        print(f"{Fore.YELLOW}{original}{Style.RESET_ALL} → {Fore.RED}{new}{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.YELLOW}{original}{Style.RESET_ALL} → {Fore.RED}No match found{Style.RESET_ALL}")
+
+def _print_summary(report, changes=True):
+    """Print the last changes of a RunReport, unless changes is False, and its success/failure counts."""
+    if changes:
+        print("\nMetadata Changes Summary:")
+        print("------------------------")
+        if report.hidden:
+            where = f"see {report.report_path}" if report.report_path else "use --report to keep them all"
+            print(f"... {report.hidden} earlier changes not shown, {where}")
+        
+        for status, original, new in report.recent:
+            _print_change(status, original, new)
+    
+    print(f"\nSummary:")
+    print(f"Successfully processed: {Fore.GREEN}{report.successful}{Style.RESET_ALL}")
+    print(f"Failed to process: {Fore.RED}{report.failed}{Style.RESET_ALL}")
+    print(f"Total files: {report.total}")
+    if report.report_path:
+        print(f"Report: {report.report_path}")
+
+def _open_api(api, catalog, threshold, cache_dir, cover_cache_size, keep_artist_cache, no_cache, refresh_cache,
+              rate_limit, workers, concurrency, no_album_match):
+    """Create the music API chosen on the command line, returns it with the pipeline that drives it."""
+    if api == 'spotify-async':
+        # Lookups run as coroutines, only disk work needs the worker threads
+        music_api = AsyncSpotifyAPI(
+            cache_dir, 
+            cover_cache_size * 1024 * 1024, 
+            keep_artist_cache, 
+            search_cache=not no_cache, 
+            refresh_cache=refresh_cache, 
+            rate_limit=rate_limit, 
+            max_connections=max(10, concurrency),
+            threshold=threshold,
+            album_match=not no_album_match
+        )
+        pipeline = partial(run_async_pipeline, concurrency=concurrency)
+    elif api == 'local':
+        # Offline: the catalog is searched in memory, no network involved
+        music_api = LocalCatalogAPI(catalog, threshold=threshold)
+        pipeline = run_pipeline
+    else:
+        music_api = SpotifyAPI(
+            cache_dir, 
+            cover_cache_size * 1024 * 1024, 
+            keep_artist_cache, 
+            search_cache=not no_cache, 
+            refresh_cache=refresh_cache, 
+            rate_limit=rate_limit, 
+            pool_size=max(10, workers * 2),
+            threshold=threshold,
+            album_match=not no_album_match
+        )
+        pipeline = run_pipeline
+    return music_api, pipeline
+
+@click.group(cls=DefaultCommandGroup, default_command='organize')
+def main():
+    """Organize music files by analyzing their metadata.
+
+    Runs the organize command unless another command is named first.
+    """
+
+@main.command()
 @click.argument('source_dir', 
                 type=click.Path(exists=True),
                 metavar='SOURCE_DIR')
@@ -21,14 +128,53 @@ init()
                 type=click.Path(),
                 metavar='DESTINATION_DIR')
 @click.option('--dry-run', is_flag=True, help="Show what would be done without making changes")
-@click.option('--workers', default=4, help="Number of parallel workers")
+@click.option('--plan', 'plan_file', type=click.Path(dir_okay=False), default=None,
+              help="Dry run that writes every decision to this plan file, for the apply command")
+@click.option('--workers', default=4, help="Number of files looked up and transferred in parallel")
 @click.option('--threshold', default=98, help="Confidence threshold for automatic matching (0-100)")
+@click.option('--unattended', is_flag=True,
+              help="Never prompt: matches scoring below --threshold are queued in the review file for the review command")
+@click.option('--review-file', type=click.Path(dir_okay=False), default=None,
+              help=f"Review file for --unattended (default: {REVIEW_NAME} in DESTINATION_DIR)")
 @click.option('--move', is_flag=True, help="Move files instead of copying them")
+@click.option('--hardlink', is_flag=True,
+              help="Hardlink files that are placed unchanged instead of copying them (tagged files are reflinked where possible)")
+@click.option('--reflink', is_flag=True,
+              help="Clone files sharing their data blocks (btrfs, XFS) instead of copying them, then tag the clones")
 @click.option('--gather', is_flag=True, help="Place all files directly in the destination directory without organizing into subdirectories")
-@click.option('--api', type=click.Choice(['spotify']), default='spotify', 
-              help="API to use for music information")
-@click.option('--start', default=0, help="Skip the first N files (useful for resuming an interrupted process)")
-def main(source_dir, destination_dir, dry_run, workers, threshold, move, gather, api, start):
+@click.option('--api', type=click.Choice(['spotify', 'spotify-async', 'local']), default='spotify', 
+              help="API to use for music information (spotify-async runs lookups on an asyncio event loop, local matches against --catalog)")
+@click.option('--catalog', type=click.Path(exists=True, dir_okay=False), default=None,
+              help="CSV or JSONL catalog of tracks to match against with --api local")
+@click.option('--concurrency', default=100, show_default=True,
+              help="Number of files looked up at once with --api spotify-async")
+@click.option('--tag-procs', default=0, show_default=True,
+              help="Parse and write tags in this many worker processes instead of the worker threads (0: in the threads)")
+@click.option('--no-album-match', is_flag=True,
+              help="Search for every file on its own instead of matching files with album tags against their album's tracklist")
+@click.option('--start', default=0, help="Skip the first N files (prefer --resume, which doesn't depend on file order)")
+@click.option('--resume', is_flag=True, help="Skip files that were already processed successfully according to the run journal")
+@click.option('--sync', is_flag=True,
+              help="Incremental sync: skip unchanged source files and tracks already in DESTINATION_DIR, and never overwrite a different track")
+@click.option('--manifest', type=click.Path(exists=True, dir_okay=False), default=None,
+              help="CSV (path,track_id) or JSON manifest of Spotify track IDs; listed files skip the search")
+@click.option('--journal', type=click.Path(dir_okay=False), default=None,
+              help=f"Run journal file (default: {JOURNAL_NAME} in DESTINATION_DIR)")
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help="Directory for cached API data (default: ~/.cache/music_organizer)")
+@click.option('--cover-cache-size', default=512, help="Maximum size of the on-disk cover art cache in MB")
+@click.option('--keep-artist-cache', is_flag=True, help="Save looked up artist genres in the cache directory for later runs")
+@click.option('--no-cache', is_flag=True, help="Don't read or write the search result cache")
+@click.option('--refresh-cache', is_flag=True, help="Ignore cached search results and store fresh ones")
+@click.option('--rate-limit', default=10.0, show_default=True,
+              help="Maximum Spotify requests per second, shared by all workers")
+@click.option('--extensions', default=','.join(ext.lstrip('.') for ext in DEFAULT_EXTENSIONS), show_default=True,
+              help="Comma separated list of file extensions to process")
+@click.option('--stats', 'stats_file', type=click.Path(dir_okay=False), default=None,
+              help="Write timings, API calls and cache hit rates of the run to this JSON file and print them at the end")
+@click.option('--report', 'report_file', type=click.Path(dir_okay=False), default=None,
+              help=REPORT_HELP)
+def organize(source_dir, destination_dir, dry_run, workers, threshold, move, gather, api, start, cache_dir, cover_cache_size, keep_artist_cache, no_cache, refresh_cache, rate_limit, extensions, resume, sync, manifest, journal, concurrency, unattended, review_file, catalog, stats_file, tag_procs, plan_file, no_album_match, hardlink, reflink, report_file):
     """Organize music files by analyzing their metadata.
 
     Arguments:
@@ -36,93 +182,395 @@ def main(source_dir, destination_dir, dry_run, workers, threshold, move, gather,
         SOURCE_DIR: Directory containing the music files to organize
         DESTINATION_DIR: Directory where organized music files will be placed
     """
+    if api == 'local' and not catalog:
+        raise click.UsageError("--api local needs a --catalog")
+    if sum((move, hardlink, reflink)) > 1:
+        raise click.UsageError("--move, --hardlink and --reflink can't be combined")
+    link = HARDLINK if hardlink else REFLINK if reflink else None
+    stats.reset()
+    # A plan is a dry run that remembers its decisions
+    plan = None
+    if plan_file:
+        dry_run = True
+        plan = PlanWriter(plan_file)
     source_path = Path(source_dir)
     
-    # Supported audio formats
-    audio_extensions = {'.mp3', '.wav', '.m4a'}
-    
-    # Get list of all audio files
-    audio_files = [
-        f for f in source_path.rglob('*') 
-        if f.suffix.lower() in audio_extensions
-    ]
-    
-    if not audio_files:
-        logger.warning(f"No supported audio files found in {source_dir}")
-        return
+    # Walk the source tree lazily, files are processed while it is still being scanned
+    audio_extensions = parse_extensions(extensions)
+    scanner = AudioFileScanner(source_path, audio_extensions)
+    audio_files = iter(scanner)
     
     # Skip files if start parameter is provided
     if start > 0:
-        if start >= len(audio_files):
-            logger.warning(f"Start value ({start}) exceeds the number of files ({len(audio_files)})")
-            return
         logger.info(f"Skipping the first {start} files")
-        audio_files = audio_files[start:]
+        audio_files = itertools.islice(audio_files, start, None)
+    
+    # Record every outcome so a later --resume can pick up where this run stopped
+    run_journal = None
+    if not dry_run:
+        run_journal = RunJournal(journal or Path(destination_dir) / JOURNAL_NAME)
+        if resume or sync:
+            audio_files = run_journal.pending(audio_files)
+    elif resume:
+        logger.warning("--resume has no effect with --dry-run")
+    
+    # Index what's already organized so sync can skip it and catch collisions
+    library_index = None
+    if sync:
+        library_index = DestinationIndex(destination_dir, audio_extensions).build()
+    
+    # Files with a known track ID are looked up in batches instead of searched for
+    track_ids = load_manifest(manifest, source_path) if manifest else None
     
     # Initialize the appropriate API
-    music_api = SpotifyAPI()
+    music_api, pipeline = _open_api(api, catalog, threshold, cache_dir, cover_cache_size, keep_artist_cache,
+                                    no_cache, refresh_cache, rate_limit, workers, concurrency, no_album_match)
+    
+    # Tag work is CPU-bound, spread it over processes; enough threads are needed to keep them busy
+    tag_pool = None
+    if tag_procs > 0:
+        tag_pool = TagPool(tag_procs)
+        workers = max(workers, tag_procs)
     
-    # Store metadata changes
-    metadata_changes = []
+    # Unattended runs queue doubtful matches instead of prompting for them
+    review = None
+    if unattended:
+        if dry_run:
+            # Nothing is queued, the files are reported as ones that would be
+            review = lambda lookup: None
+        else:
+            review_queue = ReviewQueue(review_file or Path(destination_dir) / REVIEW_NAME)
+            review = partial(review_queue.add, destination_dir=destination_dir, move=move, gather=gather)
     
-    # Process files with progress bar
-    with tqdm(total=len(audio_files), desc="Processing files", unit="file", 
+    # Outcomes are counted and streamed to the report as they come in
+    report = RunReport(report_file)
+    
+    # Process files with progress bar, its total grows as the scan finds more files
+    with tqdm(total=None, desc="Processing files", unit="file", 
              position=1, leave=False) as pbar:
         # Clear the current line before starting
         print("\033[K", end="")
         
-        # Calculate the total number of files for progress display
-        total_files = len(audio_files) + start
+        # Prompts show the number of files found so far, marked with a "+" while the scan goes on
+        total_files = lambda: scanner.count if scanner.done else f"{scanner.count}+"
         
-        for idx, file_path in enumerate(audio_files):
-            # Calculate current file number (accounting for the --start parameter)
-            current_file = idx + 1 + start
-            
-            # Move cursor up one line and clear it
-            print("\033[F\033[K", end="")
-            
-            success, (original, new) = process_file(
-                file_path, 
+        try:
+            # Files are looked up and transferred concurrently, prompts are asked one at a time
+            for file_path, success, (original, new) in pipeline(
+                audio_files, 
                 destination_dir, 
                 dry_run, 
                 move, 
                 music_api, 
                 gather, 
-                current_file, 
-                total_files
-            )
-            metadata_changes.append((success, original, new))
-            
-            pbar.update(1)
-            if success:
-                pbar.set_postfix(status="Success")
-            else:
-                pbar.set_postfix(status="Failed")
-            
-            # Ensure cursor is at the bottom
-            print()
+                workers, 
+                start, 
+                total_files, 
+                library_index, 
+                track_ids, 
+                review,
+                tag_pool=tag_pool,
+                plan=plan,
+                link=link
+            ):
+                report.add(file_path, success, original, new)
+                if run_journal:
+                    run_journal.record(file_path, success)
+                
+                if pbar.total != scanner.count - start:
+                    pbar.total = scanner.count - start
+                pbar.update(1)
+                if success:
+                    pbar.set_postfix(status="Success")
+                else:
+                    pbar.set_postfix(status="Failed")
+        finally:
+            # The async pipeline closes its API on the event loop
+            if not isinstance(music_api, AsyncMusicAPI):
+                music_api.close()
+            report.close()
+            if run_journal:
+                run_journal.close()
+            if library_index and not dry_run:
+                library_index.save()
+            if tag_pool:
+                tag_pool.close()
+            if plan:
+                plan.close()
+    
+    if scanner.count == 0:
+        logger.warning(f"No supported audio files found in {source_dir}")
+        return
+    if start >= scanner.count:
+        logger.warning(f"Start value ({start}) exceeds the number of files ({scanner.count})")
+        return
     
     # Clear the progress bar
     print("\033[K", end="")
     
-    # Show summary
-    print("\nMetadata Changes Summary:")
-    print("------------------------")
-    successful_changes = 0
-    failed_changes = 0
+    _print_summary(report)
+    if unattended and not dry_run and len(review_queue):
+        print(f"{len(review_queue)} files are waiting for review, run: {Path(__file__).name} review {review_queue.review_path}")
+    if plan:
+        print(f"{plan.count} operations planned, run: {Path(__file__).name} apply {plan.plan_path}")
+    if stats_file:
+        stats.save(stats_file)
+        print("\n" + "\n".join(stats.table()))
+
+@main.command()
+@click.argument('review_file', type=click.Path(exists=True, dir_okay=False), metavar='REVIEW_FILE')
+@click.option('--dry-run', is_flag=True, help="Show what would be done without making changes")
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help="Directory for cached API data (default: ~/.cache/music_organizer)")
+@click.option('--rate-limit', default=10.0, show_default=True, help="Maximum Spotify requests per second")
+@click.option('--catalog', type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Catalog the unattended run used, if it ran with --api local")
+@click.option('--journal', type=click.Path(dir_okay=False), default=None,
+              help=f"Run journal to record reviewed files in (default: {JOURNAL_NAME} in each file's DESTINATION_DIR)")
+@click.option('--report', 'report_file', type=click.Path(dir_okay=False), default=None,
+              help=REPORT_HELP)
+def review(review_file, dry_run, cache_dir, rate_limit, catalog, journal, report_file):
+    """Pick matches for the files an unattended run queued for review.
+
+    Files placed here are recorded in the run journal, so a later
+    --resume doesn't look them up again.
+
+    Arguments:
     
-    for success, original, new in metadata_changes:
-        if success and original and new:
-            print(f"{Fore.YELLOW}{original}{Style.RESET_ALL} → {Fore.CYAN}{new}{Style.RESET_ALL}")
-            successful_changes += 1
-        elif original:
-            print(f"{Fore.YELLOW}{original}{Style.RESET_ALL} → {Fore.RED}No match found{Style.RESET_ALL}")
-            failed_changes += 1
+        REVIEW_FILE: Review file written by an --unattended run
+    """
+    review_queue = ReviewQueue(review_file)
+    entries = review_queue.entries()
+    if not entries:
+        logger.info(f"Nothing to review in {review_file}")
+        return
     
-    print(f"\nSummary:")
-    print(f"Successfully processed: {Fore.GREEN}{successful_changes}{Style.RESET_ALL}")
-    print(f"Failed to process: {Fore.RED}{failed_changes}{Style.RESET_ALL}")
-    print(f"Total files: {len(audio_files)}")
+    music_api = LocalCatalogAPI(catalog) if catalog else SpotifyAPI(cache_dir, rate_limit=rate_limit)
+    report = RunReport(report_file)
+    # The journal of the run that queued each file, by path
+    run_journals = {}
+    try:
+        for current_file, entry in enumerate(entries, 1):
+            file_path = Path(entry['path'])
+            if not file_path.exists():
+                logger.warning(f"{file_path} no longer exists, dropping it from the review")
+                review_queue.remove(entry['path'])
+                continue
+            
+            # The candidates were saved with the entry, no need to search again
+            lookup = {
+                'file_path': file_path,
+                'clean_name': entry['clean_name'],
+                'original_metadata': entry['original_metadata'],
+                'duration': entry['duration'],
+                'track_info': None,
+                'choices': [tuple(choice) for choice in entry['choices']]
+            }
+            track_info = select_match(lookup, music_api, current_file, len(entries))
+            run_journal = None
+            if not dry_run:
+                journal_path = Path(journal or Path(entry['destination']) / JOURNAL_NAME)
+                if journal_path not in run_journals:
+                    run_journals[journal_path] = RunJournal(journal_path)
+                run_journal = run_journals[journal_path]
+                run_journal.remember(file_path)
+            success, (original, new) = transfer_file(
+                file_path, 
+                track_info, 
+                entry['original_metadata'], 
+                entry['destination'], 
+                dry_run, 
+                entry['move'], 
+                music_api, 
+                entry['gather']
+            )
+            report.add(file_path, success, original, new)
+            if run_journal:
+                run_journal.record(file_path, success)
+            if not dry_run:
+                review_queue.remove(entry['path'])
+    finally:
+        music_api.close()
+        report.close()
+        for run_journal in run_journals.values():
+            run_journal.close()
+    
+    _print_summary(report)
+
+@main.command()
+@click.argument('plan_file', type=click.Path(exists=True, dir_okay=False), metavar='PLAN_FILE')
+@click.option('--workers', default=8, show_default=True, help="Number of files copied and tagged in parallel")
+@click.option('--tag-procs', default=0, show_default=True,
+              help="Parse and write tags in this many worker processes instead of the worker threads (0: in the threads)")
+@click.option('--stats', 'stats_file', type=click.Path(dir_okay=False), default=None,
+              help="Write timings of the run to this JSON file and print them at the end")
+@click.option('--report', 'report_file', type=click.Path(dir_okay=False), default=None,
+              help=REPORT_HELP)
+def apply(plan_file, workers, tag_procs, stats_file, report_file):
+    """Carry out a plan written by organize --plan, without any API calls.
+
+    Arguments:
+    
+        PLAN_FILE: Plan file written by organize --plan
+    """
+    stats.reset()
+    tag_pool = None
+    if tag_procs > 0:
+        tag_pool = TagPool(tag_procs)
+        workers = max(workers, tag_procs)
+    
+    report = RunReport(report_file)
+    try:
+        with tqdm(total=None, desc="Applying plan", unit="file", position=1, leave=False) as pbar:
+            for file_path, success, (original, new) in apply_plan(plan_file, workers, tag_pool):
+                report.add(file_path, success, original, new)
+                pbar.update(1)
+                pbar.set_postfix(status="Success" if success else "Failed")
+    finally:
+        report.close()
+        if tag_pool:
+            tag_pool.close()
+    
+    print("\033[K", end="")
+    _print_summary(report)
+    if stats_file:
+        stats.save(stats_file)
+        print("\n" + "\n".join(stats.table()))
+
+@main.command()
+@click.argument('source_dir', type=click.Path(exists=True, file_okay=False), metavar='SOURCE_DIR')
+@click.argument('destination_dir', type=click.Path(), metavar='DESTINATION_DIR')
+@click.option('--dry-run', is_flag=True, help="Show what would be done without making changes")
+@click.option('--workers', default=4, help="Number of files looked up and transferred in parallel")
+@click.option('--threshold', default=98, help="Confidence threshold for automatic matching (0-100)")
+@click.option('--review-file', type=click.Path(dir_okay=False), default=None,
+              help=f"Review file for matches below --threshold (default: {REVIEW_NAME} in DESTINATION_DIR)")
+@click.option('--move', is_flag=True, help="Move files instead of copying them")
+@click.option('--hardlink', is_flag=True,
+              help="Hardlink files that are placed unchanged instead of copying them (tagged files are reflinked where possible)")
+@click.option('--reflink', is_flag=True,
+              help="Clone files sharing their data blocks (btrfs, XFS) instead of copying them, then tag the clones")
+@click.option('--gather', is_flag=True, help="Place all files directly in the destination directory without organizing into subdirectories")
+@click.option('--api', type=click.Choice(['spotify', 'spotify-async', 'local']), default='spotify',
+              help="API to use for music information (spotify-async runs lookups on an asyncio event loop, local matches against --catalog)")
+@click.option('--catalog', type=click.Path(exists=True, dir_okay=False), default=None,
+              help="CSV or JSONL catalog of tracks to match against with --api local")
+@click.option('--concurrency', default=100, show_default=True,
+              help="Number of files looked up at once with --api spotify-async")
+@click.option('--tag-procs', default=0, show_default=True,
+              help="Parse and write tags in this many worker processes instead of the worker threads (0: in the threads)")
+@click.option('--no-album-match', is_flag=True,
+              help="Search for every file on its own instead of matching files with album tags against their album's tracklist")
+@click.option('--journal', type=click.Path(dir_okay=False), default=None,
+              help=f"Run journal file (default: {JOURNAL_NAME} in DESTINATION_DIR)")
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help="Directory for cached API data (default: ~/.cache/music_organizer)")
+@click.option('--cover-cache-size', default=512, help="Maximum size of the on-disk cover art cache in MB")
+@click.option('--keep-artist-cache', is_flag=True, help="Save looked up artist genres in the cache directory for later runs")
+@click.option('--rate-limit', default=10.0, show_default=True,
+              help="Maximum Spotify requests per second, shared by all workers")
+@click.option('--extensions', default=','.join(ext.lstrip('.') for ext in DEFAULT_EXTENSIONS), show_default=True,
+              help="Comma separated list of file extensions to process")
+@click.option('--settle', default=2.0, show_default=True,
+              help="Seconds a new file must stay unchanged before it is processed, so files still being written are left alone")
+@click.option('--poll', default=0.0, show_default=True,
+              help="Look for new files every POLL seconds instead of using inotify (0: inotify where available, else every 2 seconds)")
+@click.option('--report', 'report_file', type=click.Path(dir_okay=False), default=None,
+              help=REPORT_HELP)
+def watch(source_dir, destination_dir, dry_run, workers, threshold, review_file, move, hardlink, reflink, gather, api, catalog, concurrency, tag_procs, no_album_match, journal, cache_dir, cover_cache_size, keep_artist_cache, rate_limit, extensions, settle, poll, report_file):
+    """Organize files as they arrive in SOURCE_DIR, until interrupted.
+
+    Files already in SOURCE_DIR are left alone, only new ones are
+    processed, as soon as they are completely written. Nobody is around
+    to answer prompts, so matches below --threshold are queued for the
+    review command. The API client and its caches live for the whole watch.
+
+    Arguments:
+    
+        SOURCE_DIR: Directory new music files are dropped into
+        DESTINATION_DIR: Directory where organized music files will be placed
+    """
+    if api == 'local' and not catalog:
+        raise click.UsageError("--api local needs a --catalog")
+    if sum((move, hardlink, reflink)) > 1:
+        raise click.UsageError("--move, --hardlink and --reflink can't be combined")
+    link = HARDLINK if hardlink else REFLINK if reflink else None
+    stats.reset()
+    
+    # The destination may live inside the source, don't pick up our own output
+    watcher = FolderWatcher(source_dir, parse_extensions(extensions), settle, poll or None, exclude=[destination_dir])
+    audio_files = iter(watcher)
+    run_journal = None
+    if not dry_run:
+        run_journal = RunJournal(journal or Path(destination_dir) / JOURNAL_NAME)
+        # A file dropped in again unchanged was already organized
+        audio_files = run_journal.pending(audio_files)
+    
+    music_api, pipeline = _open_api(api, catalog, threshold, cache_dir, cover_cache_size, keep_artist_cache,
+                                    False, False, rate_limit, workers, concurrency, no_album_match)
+    tag_pool = None
+    if tag_procs > 0:
+        tag_pool = TagPool(tag_procs)
+        workers = max(workers, tag_procs)
+    
+    review_queue = None
+    if dry_run:
+        # Nothing is queued, the files are reported as ones that would be
+        review = lambda lookup: None
+    else:
+        review_queue = ReviewQueue(review_file or Path(destination_dir) / REVIEW_NAME)
+        review = partial(review_queue.add, destination_dir=destination_dir, move=move, gather=gather)
+    
+    # Arrivals are sparse, write each one to the report right away
+    report = RunReport(report_file, flush_every=1)
+    
+    # The first Ctrl-C stops watching and lets the files already picked up finish
+    def stop_watching(signum, frame):
+        logger.info("Stopping, finishing the files already picked up (press Ctrl-C again to abort)")
+        watcher.close()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGINT, stop_watching)
+    signal.signal(signal.SIGTERM, stop_watching)
+    
+    try:
+        for file_path, success, (original, new) in pipeline(
+            audio_files, 
+            destination_dir, 
+            dry_run, 
+            move, 
+            music_api, 
+            gather, 
+            workers, 
+            0, 
+            lambda: watcher.count, 
+            None, 
+            None, 
+            review,
+            tag_pool=tag_pool,
+            link=link
+        ):
+            status = report.add(file_path, success, original, new)
+            if run_journal:
+                run_journal.record(file_path, success)
+            if original:
+                _print_change(status, original, new)
+    finally:
+        watcher.close()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # The async pipeline closes its API on the event loop
+        if not isinstance(music_api, AsyncMusicAPI):
+            music_api.close()
+        report.close()
+        if run_journal:
+            run_journal.close()
+        if tag_pool:
+            tag_pool.close()
+    
+    # Changes were printed as they happened
+    _print_summary(report, changes=False)
+    if review_queue and len(review_queue):
+        print(f"{len(review_queue)} files are waiting for review, run: {Path(__file__).name} review {review_queue.review_path}")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
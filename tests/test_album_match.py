@@ -0,0 +1,37 @@
+"""Matching a file against its album's tracklist must not mistake one track for another with a similar title."""
+from apis.spotify_api import SpotifyMatcher
+from utils.file_handling import clean_filename
+from utils.matching import FileQuery
+
+def track(number, title, seconds):
+    return {'track_number': number, 'name': title, 'duration_ms': seconds * 1000,
+            'artists': [{'name': 'Artist'}], 'album': {'name': 'Album'}}
+
+TRACKS = [track(1, 'Intro', 60), track(2, 'Song', 200), track(9, 'Song (Live)', 230), track(10, 'Intro (Reprise)', 97)]
+
+def match(filename, track_number=None, duration=None):
+    # As match_lookup passes it: the filename cleaned, the tags as original_metadata
+    title = filename.rsplit('.', 1)[0]
+    query = FileQuery.build(clean_filename(filename), f"Artist - {title} (Album)", duration)
+    found = SpotifyMatcher()._match_album_track(query, track_number, TRACKS)
+    return found and found['name']
+
+def test_reprise_is_not_the_track_it_reprises():
+    assert match('Intro (Reprise).mp3', '10', 97) == 'Intro (Reprise)'
+    assert match('Intro (Reprise).mp3', None, 97) == 'Intro (Reprise)'
+    assert match('Intro (Reprise).mp3', '10', None) == 'Intro (Reprise)'
+
+def test_title_alone_picks_nothing():
+    assert match('Song (Live).m4a') is None
+    assert match('Song.m4a') is None
+
+def test_title_with_number_or_length():
+    assert match('Song (Live).m4a', '09') == 'Song (Live)'
+    assert match('Song.m4a', '2') == 'Song'
+    assert match('Song.wav', None, 201) == 'Song'
+    assert match('Intro.wav', '1', 60) == 'Intro'
+
+def test_misspelled_title_with_number_and_length():
+    assert match('Sonng.wav', '2', 200) == 'Song'
+    assert match('Sonng.wav', '2', None) is None
+    assert match('Sonng.wav', None, 200) is None
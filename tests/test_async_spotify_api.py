@@ -0,0 +1,94 @@
+"""AsyncSpotifyAPI end to end against the benchmarks' local Spotify stand-in, no network needed."""
+import asyncio
+import time
+import pytest
+from apis.async_spotify_api import AsyncSpotifyAPI
+from benchmarks.mock_spotify import MockSpotify
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockSpotify(latency=0.01).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def api(server, tmp_path):
+    server.reset()
+    return AsyncSpotifyAPI(cache_dir=tmp_path, rate_limit=1000, api_base=f"{server.url}/v1/",
+                           token_url=f"{server.url}/api/token")
+
+def run(api, coro):
+    """Run a coroutine on a fresh loop, closing the api's connection pool on it."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await api.close()
+    return asyncio.run(main())
+
+def test_match_track(api, server):
+    track_info, choices = run(api, api.match_track("Artist 0 - Title 5", duration_seconds=30))
+    assert choices == []
+    assert track_info['title'] == "Title 5"
+    assert track_info['artist'] == "Artist 0"
+    assert track_info['album'] == "Album 0"
+    assert track_info['track_number'] == "6"
+    assert track_info['genre'] == "benchmark"
+    assert server.requests['search'] == 1
+    assert server.requests['artists'] == 1
+
+def test_match_track_by_isrc(api, server):
+    track_info, _ = run(api, api.match_track("unrelated name", isrc="XX-0000000007"))
+    assert track_info['title'] == "Title 7"
+    assert track_info['isrc'] == "XX0000000007"
+
+def test_get_tracks_by_ids_batches(api, server):
+    track_ids = [f"{i:022d}" for i in range(120)]
+    # Duplicates and unknown IDs don't cost extra requests
+    tracks = run(api, api.get_tracks_by_ids(track_ids + track_ids[:10] + ['unknown']))
+    assert set(tracks) == set(track_ids)
+    assert tracks[track_ids[42]]['title'] == "Title 42"
+    assert server.requests['tracks'] == 3
+    # 120 tracks by 10 artists, their genres in one request
+    assert server.requests['artists'] == 1
+
+def test_cover_art_single_flight(api, server):
+    async def fetch_covers():
+        covers = await asyncio.gather(*(api.get_cover_art(f"album{0:0>17}") for _ in range(20)))
+        # Cached by now
+        covers.append(await api.get_cover_art(f"album{0:0>17}"))
+        return covers
+
+    covers = run(api, fetch_covers())
+    assert all(cover == server.cover for cover in covers)
+    assert server.requests['album'] == 1
+    assert server.requests['cover'] == 1
+
+def test_rate_limited_request_waits_for_retry_after(api, server):
+    server.throttle(1, retry_after=0.5)
+    started = time.monotonic()
+    tracks = run(api, api.get_tracks_by_ids([f"{3:022d}"]))
+    assert time.monotonic() - started >= 0.5
+    assert tracks[f"{3:022d}"]['title'] == "Title 3"
+    assert server.requests['rate_limited'] == 1
+    assert server.requests['tracks'] == 1
+
+def test_rate_limit_pauses_concurrent_requests(api, server):
+    server.throttle(1, retry_after=0.5)
+    started = time.monotonic()
+
+    async def search_after(delay, name):
+        await asyncio.sleep(delay)
+        track_info, _ = await api.match_track(name)
+        return track_info['title'], time.monotonic() - started
+
+    async def both():
+        # The second search starts while the first is being held back
+        return await asyncio.gather(search_after(0, "Artist 0 - Title 1"), search_after(0.2, "Artist 0 - Title 2"))
+
+    (first, first_done), (second, second_done) = run(api, both())
+    assert (first, second) == ("Title 1", "Title 2")
+    # Only the first search was answered with a 429, yet both waited it out
+    assert server.requests['rate_limited'] == 1
+    assert first_done >= 0.5
+    assert second_done >= 0.5
@@ -0,0 +1,90 @@
+"""Files that resolve to the same destination must never be written over each other."""
+import threading
+import time
+import wave
+from apis.base_api import MusicAPI
+import utils.file_handling as file_handling
+from utils.file_handling import place_file
+from utils.pipeline import run_pipeline
+
+TRACK_INFO = {'title': 'Song', 'artist': 'Artist', 'album': 'Album', 'year': '2001', 'genre': 'rock',
+              'track_number': '1'}
+
+class SameTrackAPI(MusicAPI):
+    """Matches every file to the same track, as happens with duplicate rips."""
+
+    def search_track(self, *args, **kwargs):
+        return TRACK_INFO
+
+    def match_track(self, filename, original_metadata=None, original_filename=None, isrc=None, duration_seconds=None):
+        return dict(TRACK_INFO), []
+
+    def select_track(self, *args, **kwargs):
+        raise AssertionError("nothing should be prompted")
+
+    def get_cover_art(self, album_id):
+        return None
+
+def make_wav(path, seconds, sample):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(sample * 44100 * seconds)
+    return path.read_bytes()
+
+def rips(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    return {
+        source / 'a.wav': make_wav(source / 'a.wav', 30, b'\x01\x02\x03\x04'),
+        source / 'b.wav': make_wav(source / 'b.wav', 20, b'\x05\x06\x07\x08'),
+    }
+
+def assert_one_whole_rip(dest_dir, contents):
+    written = [path for path in dest_dir.rglob('*') if path.is_file()]
+    assert [path.name for path in written] == ['Song.wav']
+    assert written[0].read_bytes() in contents.values()
+
+def test_pipeline_writes_duplicates_one_at_a_time(tmp_path, monkeypatch):
+    contents = rips(tmp_path)
+    dest_dir = tmp_path / 'library'
+    writing = []
+    overlapped = []
+
+    def slow_place_file(*args, **kwargs):
+        overlapped.append(bool(writing))
+        writing.append(args[1])
+        try:
+            # Long enough for the other worker to get here too
+            time.sleep(0.2)
+            place_file(*args, **kwargs)
+        finally:
+            writing.remove(args[1])
+
+    monkeypatch.setattr(file_handling, 'place_file', slow_place_file)
+    results = list(run_pipeline(iter(sorted(contents)), dest_dir, False, False, SameTrackAPI(), workers=2))
+    assert [success for _, success, _ in results] == [True, True]
+    assert overlapped == [False, False]
+    assert_one_whole_rip(dest_dir, contents)
+
+def test_concurrent_writers_never_mix_data(tmp_path):
+    contents = rips(tmp_path)
+    dest_dir = tmp_path / 'library'
+    dest_file = dest_dir / 'Song.wav'
+    errors = []
+
+    def place(source):
+        try:
+            place_file(source, dest_file, TRACK_INFO, False, SameTrackAPI())
+        except Exception as e:
+            errors.append(e)
+
+    for _ in range(3):
+        threads = [threading.Thread(target=place, args=(source,)) for source in contents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert_one_whole_rip(dest_dir, contents)
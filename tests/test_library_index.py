@@ -0,0 +1,62 @@
+"""--sync into a library whose files carry no Spotify track ID."""
+import wave
+from mutagen.easyid3 import EasyID3
+from utils.file_handling import transfer_file
+from utils.library_index import DestinationIndex
+from tests.test_file_handling import SameTrackAPI
+
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+def track_info(title, track_id):
+    return {'title': title, 'artist': 'Artist', 'album': 'Album', 'year': '2001', 'genre': 'rock',
+            'track_number': '1', 'track_id': track_id}
+
+def make_wav(path):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b'\0\0' * 8000)
+
+def make_mp3(path, frames, artist=None, title=None):
+    path.write_bytes(MP3_FRAME * frames)
+    if artist:
+        tags = EasyID3()
+        tags['artist'] = artist
+        tags['title'] = title
+        tags.save(path)
+
+def sync(file_path, info, dest_dir):
+    index = DestinationIndex(dest_dir).build()
+    return transfer_file(file_path, info, 'Unknown - x (Unknown Album)', dest_dir, False, False, SameTrackAPI(), index=index)
+
+def test_untagged_wavs_organized_earlier_are_up_to_date(tmp_path):
+    dest_dir = tmp_path / 'library'
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"{i}.wav"
+        make_wav(source)
+        sources.append(source)
+        # Organized by a run without --sync
+        transfer_file(source, track_info(f"Song {i}", f"{i:022d}"), None, dest_dir, False, False, SameTrackAPI())
+
+    for i, source in enumerate(sources):
+        assert sync(source, track_info(f"Song {i}", f"{i:022d}"), dest_dir) == \
+            (True, ('Unknown - x (Unknown Album)', "Already in library"))
+
+def test_tagged_files_without_track_ids(tmp_path):
+    dest_dir = tmp_path / 'library'
+    (dest_dir / 'Artist' / 'Album').mkdir(parents=True)
+    # Organized by an older version: tagged, but without a track ID, and not the size of the source
+    make_mp3(dest_dir / 'Artist' / 'Album' / 'Song.mp3', 100, 'Artist', 'Song')
+    make_mp3(dest_dir / 'Artist' / 'Album' / 'Other.mp3', 100, 'Someone Else', 'Other')
+    source = tmp_path / 'song.mp3'
+    make_mp3(source, 120)
+
+    success, (_, outcome) = sync(source, track_info('Song', '1' * 22), dest_dir)
+    assert (success, outcome) == (True, "Already in library")
+
+    # Same path, but the file there is tagged as a different track
+    success, (_, outcome) = sync(source, track_info('Other', '2' * 22), dest_dir)
+    assert not success
+    assert outcome.startswith("Collision")
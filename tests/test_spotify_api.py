@@ -0,0 +1,64 @@
+"""SpotifyAPI against the benchmarks' local Spotify stand-in, no network needed."""
+import threading
+import time
+import pytest
+from apis.spotify_api import SpotifyAPI
+from benchmarks.mock_spotify import MockSpotify
+
+ARTISTS = [f"artist{i:0>16}" for i in range(8)]
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockSpotify(latency=0.01).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def api(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('SPOTIFY_CLIENT_ID', 'test')
+    monkeypatch.setenv('SPOTIFY_CLIENT_SECRET', 'test')
+    server.reset()
+    api = SpotifyAPI(tmp_path, rate_limit=1000, api_base=f"{server.url}/v1/", token_url=f"{server.url}/api/token")
+    yield api
+    api.close()
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+
+def test_artist_lookups_are_batched_across_threads(api, server):
+    run_threads(lambda i: api.prefetch_artist_genres(ARTISTS[i::4]), 4)
+    assert api.artist_cache.missing(ARTISTS) == []
+    assert server.requests['artists'] == 1
+
+def test_artists_are_fetched_directly_when_the_batcher_stalls(api, server, monkeypatch):
+    monkeypatch.setattr(api, '_fetch_artist_batches', lambda: None)
+    monkeypatch.setattr(api, 'ARTIST_FETCH_TIMEOUT', 0.2)
+    run_threads(lambda i: api.prefetch_artist_genres(ARTISTS), 1)
+    assert api.artist_cache.missing(ARTISTS) == []
+    assert server.requests['artists'] == 1
+
+def test_close_releases_waiting_lookups(api, server, monkeypatch):
+    monkeypatch.setattr(api, '_fetch_artist_batches', lambda: None)
+    waiter = threading.Thread(target=api.prefetch_artist_genres, args=(ARTISTS,), daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    api.close()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert api.artist_cache.missing(ARTISTS) == []
+
+def test_lookups_after_close_are_fetched_directly(api, server):
+    api.close()
+    run_threads(lambda i: api.prefetch_artist_genres(ARTISTS), 1)
+    assert api.artist_cache.missing(ARTISTS) == []
+    assert server.requests['artists'] == 1
+
+def test_workers_share_one_token(api, server):
+    run_threads(lambda i: api.match_track(f"Artist 0 - Title {i}"), 8)
+    assert server.requests['search'] == 8
+    assert server.requests['token'] == 1
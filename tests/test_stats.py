@@ -0,0 +1,22 @@
+"""Writing a file is timed per stage, so a slow copy can be told from a slow tag write."""
+from utils.file_handling import place_file
+from utils.stats import stats
+from tests.test_file_handling import TRACK_INFO, SameTrackAPI, make_wav
+
+def make_mp3(path):
+    path.write_bytes((b'\xff\xfb\x90\x00' + b'\x00' * 413) * 200)
+
+def stages():
+    return {stage: timing['count'] for stage, timing in stats.to_dict()['stages'].items()}
+
+def test_copy_times_copy_and_tag_separately(tmp_path):
+    make_wav(tmp_path / 'a.wav', 1, b'\x01\x02\x03\x04')
+    stats.reset()
+    place_file(tmp_path / 'a.wav', tmp_path / 'out' / 'a.wav', dict(TRACK_INFO), False, SameTrackAPI())
+    assert stages() == {'copy': 1, 'tag': 1}
+
+def test_mp3_copy_is_timed_as_one_pass(tmp_path):
+    make_mp3(tmp_path / 'a.mp3')
+    stats.reset()
+    place_file(tmp_path / 'a.mp3', tmp_path / 'out' / 'a.mp3', dict(TRACK_INFO), False, SameTrackAPI())
+    assert stages() == {'tagged_copy': 1}
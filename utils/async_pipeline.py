@@ -0,0 +1,252 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import asyncio
+import queue
+import logging
+import time
+from .file_handling import read_lookup, transfer_file, album_tags
+from .manifest import manifest_key
+from .stats import stats
+from .transfer import DestinationLocks
+from .tag_pool import FetchedCover
+from .pipeline import _RESULT, _PROMPT, _SCAN_DONE, _orchestrate
+
+logger = logging.getLogger(__name__)
+
+class _LoopCovers:
+    """Stands in for the async api in the metadata functions, which run on worker threads.
+
+    A cover is fetched on the event loop only once a file actually gets
+    tagged or planned, so files the library index skips cost nothing.
+    """
+
+    def __init__(self, api, loop):
+        self.api = api
+        self.loop = loop
+
+    def get_cover_art(self, album_id):
+        return asyncio.run_coroutine_threadsafe(self.api.get_cover_art(album_id), self.loop).result()
+
+class _AsyncPipeline:
+    """Coroutines looking files up on an event loop, with disk work on a thread pool."""
+
+    # Track IDs are resolved in batches of up to this many files...
+    ID_BATCH_SIZE = 50
+    # ...or after this many seconds, whichever comes first
+    ID_BATCH_WAIT = 0.2
+
+    def __init__(self, api, transfer, workers, concurrency, manifest, tag_pool=None, prefetch_covers=True):
+        self.api = api
+        self.tag_pool = tag_pool
+        self.prefetch_covers = prefetch_covers
+        self.transfer = transfer
+        self.manifest = manifest
+        self.concurrency = concurrency
+        self.events = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.started = threading.Event()
+        self.tasks = set()
+        self.id_batch = {}
+        self.id_batch_timer = None
+        # Set up on the event loop in run()
+        self.loop = None
+        self.stop = None
+        self.slots = None
+
+    def run(self, audio_files, start):
+        """Event loop thread: run until the orchestrating thread says stop."""
+        try:
+            asyncio.run(self.main(audio_files, start))
+        except Exception as e:
+            logger.error(f"Error in lookup event loop: {str(e)}")
+            self.events.put((_SCAN_DONE, 0, None))
+            self.started.set()
+
+    async def main(self, audio_files, start):
+        self.loop = asyncio.get_running_loop()
+        self.stop = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.covers = _LoopCovers(self.api, self.loop)
+        self.started.set()
+        try:
+            self.spawn(self.feed(audio_files, start))
+            await self.stop.wait()
+            for task in list(self.tasks):
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            # Transfers still running may fetch covers on this loop, wait for them without blocking it
+            await self.loop.run_in_executor(None, partial(self.executor.shutdown, wait=True, cancel_futures=True))
+            # The connection pool belongs to this loop, close it before the loop goes away
+            await self.api.close()
+
+    def spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def in_thread(self, func, *args, **kwargs):
+        """Run blocking disk work on the worker pool."""
+        return self.loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def feed(self, audio_files, start):
+        """Start a coroutine per file, keeping a bounded number in flight."""
+        files = iter(audio_files)
+        submitted = 0
+        current_file = start
+        try:
+            while True:
+                await self.slots.acquire()
+                # The scanner walks the disk, keep it off the event loop
+                file_path = await self.loop.run_in_executor(None, next, files, None)
+                if file_path is None:
+                    self.slots.release()
+                    break
+                current_file += 1
+                track_id = self.manifest.get(manifest_key(file_path)) if self.manifest else None
+                self.spawn(self.lookup_and_transfer(file_path, current_file, track_id))
+                submitted += 1
+        except Exception as e:
+            logger.error(f"Error listing files: {str(e)}")
+        finally:
+            self.events.put((_SCAN_DONE, submitted, None))
+
+    async def lookup_and_transfer(self, file_path, current_file, track_id):
+        """Look a file up and, if it was auto-matched, transfer it right away."""
+        try:
+            lookup = await self.in_thread(read_lookup, file_path, track_id, self.tag_pool)
+            if lookup['track_id']:
+                # Known track ID, resolve it together with others
+                lookup['track_info'] = await self.resolve_track_id(lookup['track_id'])
+                if not lookup['track_info']:
+                    logger.warning(f"Unknown track ID {lookup['track_id']} for {file_path}, searching instead")
+            # ISRC first, then the album's tracklist, then free text, as in match_lookup
+            if not lookup['track_info'] and lookup['probe'].isrc:
+                with stats.timed('match'):
+                    lookup['track_info'] = await self.api.match_isrc(lookup['probe'].isrc)
+            tags = album_tags(lookup)
+            if not lookup['track_info'] and tags:
+                with stats.timed('album_match'):
+                    lookup['track_info'] = await self.api.match_album_track(
+                        *tags,
+                        lookup['clean_name'],
+                        lookup['original_metadata'],
+                        lookup['probe'].track_number,
+                        lookup['probe'].duration
+                    )
+            if not lookup['track_info']:
+                with stats.timed('match'):
+                    lookup['track_info'], lookup['choices'] = await self.api.match_track(
+                        lookup['clean_name'],
+                        lookup['original_metadata'],
+                        file_path.name,
+                        None,
+                        lookup['probe'].duration
+                    )
+            if not lookup['track_info'] and lookup['choices']:
+                self.events.put((_PROMPT, current_file, lookup))
+                return
+            await self.transfer_lookup(current_file, lookup, lookup['track_info'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.post_failure(current_file, file_path, e)
+        finally:
+            self.slots.release()
+
+    async def transfer_lookup(self, current_file, lookup, track_info):
+        """Copy/move and tag the file on the worker pool.
+
+        A file that is sure to be tagged gets its cover fetched here, on the
+        loop, before it takes up a worker; otherwise the worker asks for the
+        cover only if it needs one.
+        """
+        file_path = lookup['file_path']
+        try:
+            covers = self.covers
+            if (self.prefetch_covers and isinstance(track_info, dict) and 'release_id' in track_info and
+                    file_path.suffix.lower() != '.wav'):
+                covers = FetchedCover(await self.api.get_cover_art(track_info['release_id']))
+            result = await self.in_thread(self.transfer, file_path, track_info, lookup['original_metadata'],
+                                          api=covers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.post_failure(current_file, file_path, e)
+            return
+        stats.file_done(file_path, time.perf_counter() - lookup['started'])
+        self.events.put((_RESULT, current_file, (file_path,) + result))
+
+    def post_failure(self, current_file, file_path, error):
+        logger.error(f"Error processing {file_path}: {str(error)}")
+        self.events.put((_RESULT, current_file, (file_path, False, (None, None))))
+
+    async def resolve_track_id(self, track_id):
+        """Resolve a track ID through get_tracks_by_ids, batched with the others queued."""
+        future = self.loop.create_future()
+        self.id_batch.setdefault(track_id, []).append(future)
+        if len(self.id_batch) >= self.ID_BATCH_SIZE:
+            self.flush_track_ids()
+        elif self.id_batch_timer is None:
+            self.id_batch_timer = self.loop.call_later(self.ID_BATCH_WAIT, self.flush_track_ids)
+        return await future
+
+    def flush_track_ids(self):
+        if self.id_batch_timer:
+            self.id_batch_timer.cancel()
+            self.id_batch_timer = None
+        batch, self.id_batch = self.id_batch, {}
+        self.spawn(self.resolve_batch(batch))
+
+    async def resolve_batch(self, batch):
+        try:
+            with stats.timed('track_ids'):
+                found = await self.api.get_tracks_by_ids(list(batch))
+        except Exception as e:
+            logger.error(f"Error resolving track IDs: {str(e)}")
+            found = {}
+        for track_id, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(found.get(track_id))
+
+def run_async_pipeline(audio_files, destination_dir, dry_run, move, api, gather=False, workers=4, start=0,
+                       total_files=None, index=None, manifest=None, review=None, concurrency=100, tag_pool=None,
+                       plan=None, link=None):
+    """Drive an AsyncMusicAPI, yielding (file_path, success, (original, new)) as files finish.
+
+    The counterpart of run_pipeline for asyncio backends: up to concurrency
+    files are looked up at once on an event loop in a background thread,
+    while reading tags and writing files run on a pool of worker threads.
+    Prompts are asked one at a time, in file order, on the calling thread,
+    or handed to review as in run_pipeline. tag_pool, plan and link are
+    used as in run_pipeline.
+    The api is closed on the event loop when the pipeline finishes.
+    """
+    workers = max(1, workers)
+    transfer = partial(transfer_file, destination_dir=destination_dir, dry_run=dry_run, move=move,
+                       api=None, gather=gather, index=index, tag_pool=tag_pool, plan=plan, link=link,
+                       locks=DestinationLocks())
+    # Without a library index that could skip them, files of real runs and plans are certain to need their cover
+    prefetch_covers = index is None and (not dry_run or plan is not None)
+    pipeline = _AsyncPipeline(api, transfer, workers, max(1, concurrency), manifest, tag_pool, prefetch_covers)
+    loop_thread = threading.Thread(target=pipeline.run, args=(audio_files, start), daemon=True)
+    loop_thread.start()
+    pipeline.started.wait()
+    try:
+        yield from _orchestrate(
+            pipeline.events, api, total_files,
+            lambda current_file, lookup, track_info: asyncio.run_coroutine_threadsafe(
+                pipeline.transfer_lookup(current_file, lookup, track_info), pipeline.loop),
+            review, dry_run
+        )
+    finally:
+        if pipeline.loop and not pipeline.loop.is_closed():
+            try:
+                pipeline.loop.call_soon_threadsafe(pipeline.stop.set)
+            except RuntimeError:
+                # The loop already finished
+                pass
+        loop_thread.join()
@@ -0,0 +1,251 @@
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import threading
+import logging
+import os
+import sqlite3
+import time
+from .stats import stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'music_organizer'
+
+class CoverArtCache:
+    """Cover art cache keyed by album ID.
+
+    Recently used covers are kept in an in-memory LRU. Every cover is also
+    written to a content-addressed store on disk (objects/<sha256>) with a
+    small ref file per album pointing at it, so albums sharing artwork share
+    one blob. The disk store is capped at max_disk_bytes, evicting the least
+    recently used blobs first.
+    """
+
+    def __init__(self, cache_dir=None, memory_items=64, max_disk_bytes=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR) / 'covers'
+        self.objects_dir = self.cache_dir / 'objects'
+        self.refs_dir = self.cache_dir / 'refs'
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._disk_bytes = 0
+        try:
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            self.refs_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.objects_dir.iterdir())
+        except OSError as e:
+            logger.warning(f"Cover cache disabled on disk: {str(e)}")
+            self.max_disk_bytes = 0
+
+    def _ref_path(self, album_id):
+        return self.refs_dir / hashlib.sha1(album_id.encode('utf-8')).hexdigest()
+
+    def path_for(self, album_id):
+        """Return the on-disk path of an album's cover, or None if it is not cached."""
+        try:
+            digest = self._ref_path(album_id).read_text().strip()
+        except OSError:
+            return None
+        path = self.objects_dir / digest
+        return path if path.exists() else None
+
+    def get(self, album_id):
+        """Return the cached cover for an album, or None."""
+        data = self._lookup(album_id)
+        stats.cache('covers', data is not None)
+        return data
+
+    def _lookup(self, album_id):
+        with self._lock:
+            if album_id in self._memory:
+                self._memory.move_to_end(album_id)
+                return self._memory[album_id]
+
+        path = self.path_for(album_id)
+        if path is None:
+            return None
+        try:
+            data = path.read_bytes()
+            # Touch the blob so eviction sees it as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        self._remember(album_id, data)
+        return data
+
+    def put(self, album_id, data):
+        """Store an album's cover in memory and on disk."""
+        self._remember(album_id, data)
+        if not self.max_disk_bytes:
+            return
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.objects_dir / digest
+        try:
+            if not path.exists():
+                tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self._disk_bytes += len(data)
+            self._ref_path(album_id).write_text(digest)
+        except OSError as e:
+            logger.warning(f"Could not write cover to cache: {str(e)}")
+            return
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def get_or_fetch(self, album_id, fetch):
+        """Return the cached cover, calling fetch() once per album on a miss.
+
+        Concurrent callers asking for the same album wait for a single fetch
+        instead of each downloading the same image.
+        """
+        data = self.get(album_id)
+        if data is not None:
+            return data
+        with self._lock:
+            key_lock = self._key_locks.setdefault(album_id, threading.Lock())
+        with key_lock:
+            data = self._lookup(album_id)
+            if data is None:
+                data = fetch()
+                if data:
+                    self.put(album_id, data)
+        with self._lock:
+            self._key_locks.pop(album_id, None)
+        return data
+
+    def _remember(self, album_id, data):
+        with self._lock:
+            self._memory[album_id] = data
+            self._memory.move_to_end(album_id)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Delete least recently used blobs until the store is back under its cap."""
+        with self._lock:
+            try:
+                blobs = sorted(
+                    (p for p in self.objects_dir.iterdir() if not p.name.endswith('.tmp')),
+                    key=lambda p: p.stat().st_mtime
+                )
+            except OSError:
+                return
+            for path in blobs:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+
+class ArtistCache:
+    """Artist genres memoized for the whole run, optionally saved between runs."""
+
+    def __init__(self, cache_file=None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self._genres = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if self.cache_file and self.cache_file.exists():
+            try:
+                self._genres = json.loads(self.cache_file.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable artist cache {self.cache_file}: {str(e)}")
+
+    def get(self, artist_id):
+        """Return the cached genre list for an artist, or None if unknown."""
+        with self._lock:
+            return self._genres.get(artist_id)
+
+    def missing(self, artist_ids):
+        """Return the artist IDs not cached yet, without duplicates."""
+        with self._lock:
+            artist_ids = list(dict.fromkeys(a for a in artist_ids if a))
+            missing = [a for a in artist_ids if a not in self._genres]
+        stats.cache('artists', True, len(artist_ids) - len(missing))
+        stats.cache('artists', False, len(missing))
+        return missing
+
+    def put(self, artist_id, genres):
+        with self._lock:
+            self._genres[artist_id] = list(genres or [])
+            self._dirty = True
+
+    def save(self):
+        """Write the cache to its file, if it has one and anything changed."""
+        if not self.cache_file or not self._dirty:
+            return
+        with self._lock:
+            data = json.dumps(self._genres)
+            self._dirty = False
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix('.tmp')
+            tmp_path.write_text(data)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logger.warning(f"Could not save artist cache: {str(e)}")
+
+class SearchCache:
+    """Persistent SQLite store of search results keyed by normalized query.
+
+    Results expire after ttl seconds. Queries that returned nothing are
+    cached too, for the shorter negative_ttl, so hopeless searches are not
+    repeated on every run. With refresh=True cached entries are ignored but
+    fresh results are still written back.
+    """
+
+    def __init__(self, cache_file, ttl=30 * 24 * 3600, negative_ttl=24 * 3600, refresh=False):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        cache_file = Path(cache_file)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(cache_file), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS searches ('
+                'query TEXT PRIMARY KEY, results TEXT NOT NULL, created REAL NOT NULL)'
+            )
+
+    @staticmethod
+    def normalize(query):
+        """Normalize a query so trivially different spellings share an entry."""
+        return ' '.join(query.lower().split())
+
+    def get(self, query):
+        """Return the cached result list for a query, or None on a miss."""
+        if self.refresh:
+            stats.cache('searches', False)
+            return None
+        with self._lock:
+            row = self._db.execute(
+                'SELECT results, created FROM searches WHERE query = ?',
+                (self.normalize(query),)
+            ).fetchone()
+        results = json.loads(row[0]) if row is not None else None
+        if results is not None and time.time() - row[1] > (self.ttl if results else self.negative_ttl):
+            results = None
+        stats.cache('searches', results is not None)
+        return results
+
+    def put(self, query, results):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO searches (query, results, created) VALUES (?, ?, ?)',
+                (self.normalize(query), json.dumps(results), time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,8 +1,15 @@
+from contextlib import nullcontext
 from pathlib import Path
 import re
-import shutil
 import logging
-from .metadata import update_metadata, get_original_metadata, get_audio_duration
+import time
+import os
+from .metadata import update_metadata, probe_file, write_tagged_copy, id3_tag_fits
+from .library_index import UP_TO_DATE, ELSEWHERE, COLLISION
+from .matching import strip_noise
+from .stats import stats
+from .tag_pool import FetchedCover
+from .transfer import copy_file, link_file, move_file, replacing, temp_path
 
 logger = logging.getLogger(__name__)
 
@@ -10,43 +17,282 @@ def sanitize_path(path_string):
     """Remove invalid characters from path."""
     return re.sub(r'[<>:"/\\|?*]', '', path_string)
 
+def _same_filesystem(path, directory):
+    """Whether a file can be renamed into directory without copying its data."""
+    try:
+        return os.stat(path).st_dev == os.stat(directory).st_dev
+    except OSError:
+        return False
+
 def clean_filename(filename):
     """Remove common patterns from filename to help with matching."""
-    # Remove file extension
-    filename = Path(filename).stem
-    
     # Remove common patterns like (Official Video), [HD], etc.
-    patterns = [
-        r'\(.*?\)',  # Anything in parentheses
-        r'\[.*?\]',  # Anything in square brackets
-        r'Official.*?Video',
-        r'HD',
-        r'HQ',
-        r'\d{3,4}p',  # Resolution patterns like 720p, 1080p
-    ]
+    return strip_noise(filename)
+
+def lookup_file(file_path, api, track_id=None, tag_pool=None):
+    """Read a file's metadata and look it up without prompting the user.
+    
+    Files with a known Spotify track ID (embedded in their tags, or passed in
+    from a manifest) skip the search; their 'track_id' is left for
+    resolve_track_ids to look up in a batch.
+    """
+    lookup = read_lookup(file_path, track_id, tag_pool)
+    if not lookup['track_id']:
+        match_lookup(lookup, api)
+    return lookup
+
+def read_lookup(file_path, track_id=None, tag_pool=None):
+    """Read a file's metadata into a lookup, without searching for it yet.
+    
+    With a TagPool the tags are parsed in one of its worker processes.
+    """
+    logger.info(f"Processing {file_path}")
+    started = time.perf_counter()
     
-    for pattern in patterns:
-        filename = re.sub(pattern, '', filename, flags=re.IGNORECASE)
+    # Read tags and duration in a single parse
+    with stats.timed('probe'):
+        probe = tag_pool.probe_file(file_path) if tag_pool else probe_file(file_path)
     
-    return filename.strip()
+    lookup = {
+        'file_path': file_path,
+        'probe': probe,
+        'original_metadata': probe.original_metadata,
+        'duration': probe.duration_display,
+        # Clean filename for search
+        'clean_name': clean_filename(file_path.name),
+        'track_id': track_id or probe.spotify_id,
+        'track_info': None,
+        'choices': [],
+        # For the time spent on the file, see RunStats.file_done
+        'started': started
+    }
+    return lookup
+
+def album_tags(lookup):
+    """(artist, album) tags a lookup can be matched by album with, or None if either is missing."""
+    probe = lookup['probe']
+    if probe.artist == 'Unknown' or probe.album == 'Unknown Album':
+        return None
+    return probe.artist, probe.album
+
+def match_lookup(lookup, api):
+    """Search the API for a lookup's track.
+
+    An ISRC tag identifies the track exactly and is tried first, then the
+    album's tracklist, then a free text search.
+    """
+    isrc = lookup['probe'].isrc
+    if isrc:
+        with stats.timed('match'):
+            lookup['track_info'] = api.match_isrc(isrc)
+        if lookup['track_info']:
+            lookup['choices'] = []
+            return
+    
+    tags = album_tags(lookup)
+    if tags:
+        with stats.timed('album_match'):
+            lookup['track_info'] = api.match_album_track(
+                *tags,
+                lookup['clean_name'],
+                lookup['original_metadata'],
+                lookup['probe'].track_number,
+                lookup['probe'].duration
+            )
+        if lookup['track_info']:
+            lookup['choices'] = []
+            return
+    
+    # Get track information from API - pass both clean name and original metadata;
+    # the ISRC was tried already
+    with stats.timed('match'):
+        lookup['track_info'], lookup['choices'] = api.match_track(
+            lookup['clean_name'],
+            lookup['original_metadata'],
+            lookup['file_path'].name,
+            None,
+            lookup['probe'].duration
+        )
+
+def resolve_track_ids(lookups, api):
+    """Resolve lookups carrying a track ID with batched requests.
+    
+    Returns the lookups whose ID could not be resolved; they still need match_lookup.
+    """
+    with stats.timed('track_ids'):
+        found = api.get_tracks_by_ids([lookup['track_id'] for lookup in lookups])
+    unresolved = []
+    for lookup in lookups:
+        lookup['track_info'] = found.get(lookup['track_id'])
+        if not lookup['track_info']:
+            logger.warning(f"Unknown track ID {lookup['track_id']} for {lookup['file_path']}, searching instead")
+            unresolved.append(lookup)
+    return unresolved
+
+def select_match(lookup, api, current_file=None, total_files=None):
+    """Prompt the user to pick a match for a lookup that was not auto-matched."""
+    if lookup['track_info'] or not lookup['choices']:
+        return lookup['track_info']
+    return api.select_track(
+        lookup['clean_name'],
+        lookup['choices'],
+        lookup['original_metadata'],
+        lookup['file_path'].name,
+        lookup['duration'],
+        current_file,
+        total_files
+    )
 
 def process_file(file_path, destination_dir, dry_run, move, api, gather=False, current_file=None, total_files=None):
     """Process a single file."""
     try:
-        logger.info(f"Processing {file_path}")
-        
-        # Get original metadata
-        original_metadata = get_original_metadata(file_path)
-        
-        # Get audio duration
-        duration = get_audio_duration(file_path)
-        
-        # Clean filename for search
-        clean_name = clean_filename(file_path.name)
-        
-        # Get track information from API - pass both clean name and original metadata
-        track_info = api.search_track(clean_name, original_metadata, file_path.name, duration, current_file, total_files)
-        
+        lookup = lookup_file(file_path, api)
+        if lookup['track_id']:
+            for unresolved in resolve_track_ids([lookup], api):
+                match_lookup(unresolved, api)
+        track_info = select_match(lookup, api, current_file, total_files)
+        return transfer_file(file_path, track_info, lookup['original_metadata'], destination_dir, dry_run, move, api, gather)
+    except Exception as e:
+        logger.error(f"Error processing {file_path}: {str(e)}")
+        return False, (None, None)
+
+def _check_library(index, file_path, dest_file, track_info, original_metadata):
+    """Claim dest_file in the library index, returning a result if the file should not be written."""
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = None
+    if isinstance(track_info, dict):
+        outcome, existing = index.claim(dest_file, track_info.get('track_id'), size, track_info['artist'], track_info['title'])
+    else:
+        outcome, existing = index.claim(dest_file, None, size)
+    if outcome == UP_TO_DATE:
+        logger.info(f"Skipping {file_path}: {dest_file} is up to date")
+        return True, (original_metadata, "Already in library")
+    if outcome == ELSEWHERE:
+        logger.info(f"Skipping {file_path}: track is already organized as {existing}")
+        return True, (original_metadata, "Already in library")
+    if outcome == COLLISION:
+        logger.warning(f"Collision: {dest_file} already exists with a different track, not overwriting it with {file_path}")
+        return False, (original_metadata, f"Collision with {existing}")
+    return None
+
+def place_file(file_path, dest_file, track_info, move, api, tag_pool=None, link=None):
+    """Copy or move a file to dest_file, tagging it with track_info unless that is "TRANSFER_ONLY".
+    
+    With a TagPool, tags are written in its worker processes. link
+    (HARDLINK or REFLINK) places copies as links to the source's data
+    where the filesystem allows, see link_file. An MP3 whose new tag
+    doesn't fit in its current one is copied instead.
+    """
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    if track_info == "TRANSFER_ONLY":
+        # Just copy/move the file without updating metadata
+        if move:
+            with stats.timed('move'):
+                move_file(file_path, dest_file)
+            logger.info(f"Moved {file_path} to {dest_file} (no metadata changes)")
+        elif link and _timed_link(file_path, dest_file, link):
+            logger.info(f"Linked {file_path} to {dest_file} (no metadata changes)")
+        else:
+            with replacing(dest_file) as part_path, stats.timed('copy'):
+                copy_file(file_path, part_path)
+            stats.wrote(dest_file.stat().st_size)
+            logger.info(f"Copied {file_path} to {dest_file} (no metadata changes)")
+        return
+    
+    tag_copy = tag_pool.write_tagged_copy if tag_pool else write_tagged_copy
+    tag_in_place = tag_pool.update_metadata if tag_pool else update_metadata
+    if file_path.suffix.lower() != '.wav' and not isinstance(api, FetchedCover):
+        # Fetch the cover (timed by the api) up front, so the copy and tag timings leave it out
+        api = FetchedCover(api.get_cover_art(track_info['release_id']) if 'release_id' in track_info else None)
+    if link and not move and file_path.suffix.lower() == '.mp3':
+        try:
+            fits = id3_tag_fits(file_path, track_info, api)
+        except Exception as e:
+            logger.debug(f"Could not check the tag of {file_path} ({str(e)})")
+            fits = False
+        if not fits:
+            # Growing the clone's tag would move all its audio, a tagged copy is written in one pass instead
+            logger.debug(f"New tag of {file_path} doesn't fit in its current one, copying instead of linking")
+            link = None
+    if link and not move and _link_tagged(file_path, dest_file, link, track_info, api, tag_in_place):
+        logger.info(f"Linked {file_path} to {dest_file}")
+    elif move and _same_filesystem(file_path, dest_file.parent):
+        # A rename costs no I/O: rename next to the destination, tag it there, then put it in place
+        part_path = temp_path(dest_file)
+        os.rename(file_path, part_path)
+        try:
+            with stats.timed('tag'):
+                tag_in_place(part_path, track_info, api, file_path.suffix)
+            os.replace(part_path, dest_file)
+        except BaseException:
+            os.rename(part_path, file_path)
+            raise
+        logger.info(f"Moved {file_path} to {dest_file}")
+    elif move:
+        _write_copy(file_path, dest_file, track_info, api, tag_copy, tag_in_place)
+        stats.wrote(dest_file.stat().st_size)
+        file_path.unlink()
+        logger.info(f"Moved {file_path} to {dest_file}")
+    else:
+        _write_copy(file_path, dest_file, track_info, api, tag_copy, tag_in_place)
+        stats.wrote(dest_file.stat().st_size)
+        logger.info(f"Copied {file_path} to {dest_file}")
+
+def _write_copy(file_path, dest_file, track_info, api, tag_copy, tag_in_place):
+    """Write a tagged copy of file_path to dest_file.
+
+    Timed here rather than in write_tagged_copy, whose body may run in a
+    TagPool worker process, out of reach of this process's stats.
+    """
+    if file_path.suffix.lower() == '.mp3':
+        # Tag and audio are written in a single pass, there is no separate copy and tag to time
+        with stats.timed('tagged_copy'):
+            tag_copy(file_path, dest_file, track_info, api)
+        return
+    with replacing(dest_file) as part_path:
+        with stats.timed('copy'):
+            copy_file(file_path, part_path)
+        with stats.timed('tag'):
+            tag_in_place(part_path, track_info, api, file_path.suffix)
+
+def _timed_link(file_path, dest_file, link, changes=False):
+    with stats.timed('link'):
+        return link_file(file_path, dest_file, link, changes)
+
+def _link_tagged(file_path, dest_file, link, track_info, api, tag_in_place):
+    """Link dest_file to the source's data and tag it, returns False if the filesystem can't link."""
+    if file_path.suffix.lower() == '.wav':
+        # Never tagged, so it may even be hardlinked
+        return _timed_link(file_path, dest_file, link)
+    part_path = temp_path(dest_file)
+    if not _timed_link(file_path, part_path, link, changes=True):
+        return False
+    try:
+        # Tag the clone. An MP3 tag fits in place, so only its blocks stop being shared with the
+        # source; an M4A tag that grows moves the data behind it, as it would in a copy.
+        with stats.timed('tag'):
+            tag_in_place(part_path, track_info, api, file_path.suffix)
+        os.replace(part_path, dest_file)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return True
+
+def transfer_file(file_path, track_info, original_metadata, destination_dir, dry_run, move, api, gather=False, index=None,
+                  tag_pool=None, plan=None, link=None, locks=None):
+    """Copy or move a looked-up file into the destination and update its metadata.
+    
+    With a DestinationIndex, files already in the library are skipped and
+    destinations holding a different track are reported instead of overwritten.
+    tag_pool and link are passed on to place_file. Dry runs add what they
+    would do to plan, a PlanWriter, if one is given. Concurrent callers pass
+    the same DestinationLocks, so files resolving to one destination (e.g.
+    duplicate rips) are written one after the other.
+    """
+    dest_file = None
+    try:
         if track_info == "TRANSFER_ONLY":
             # Special case: Transfer file without changing metadata
             if gather:
@@ -66,16 +312,19 @@ def process_file(file_path, destination_dir, dry_run, move, api, gather=False, c
                     dest_dir = Path(destination_dir) / "Unknown"
                     dest_file = dest_dir / file_path.name
             
+            if index:
+                skipped = _check_library(index, file_path, dest_file, track_info, original_metadata)
+                if skipped:
+                    return skipped
+            
             if not dry_run:
-                # Just copy/move the file without updating metadata
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                if move:
-                    shutil.move(str(file_path), str(dest_file))
-                    logger.info(f"Moved {file_path} to {dest_file} (no metadata changes)")
-                else:
-                    shutil.copy2(str(file_path), str(dest_file))
-                    logger.info(f"Copied {file_path} to {dest_file} (no metadata changes)")
+                with locks.hold(dest_file) if locks else nullcontext():
+                    place_file(file_path, dest_file, track_info, move, api, link=link)
+                    if index:
+                        index.add(dest_file)
             else:
+                if plan:
+                    plan.add(file_path, dest_file, track_info, original_metadata, link or ('move' if move else 'copy'), api)
                 action = "move" if move else "copy"
                 logger.info(f"Would {action} {file_path} to {dest_file} (no metadata changes)")
             
@@ -89,19 +338,19 @@ def process_file(file_path, destination_dir, dry_run, move, api, gather=False, c
                 dest_dir = Path(destination_dir) / sanitize_path(track_info['artist']) / sanitize_path(track_info['album'])
                 dest_file = dest_dir / f"{sanitize_path(track_info['title'])}{file_path.suffix}"
             
+            if index:
+                skipped = _check_library(index, file_path, dest_file, track_info, original_metadata)
+                if skipped:
+                    return skipped
+            
             if not dry_run:
-                # First copy/move the file
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                if move:
-                    shutil.move(str(file_path), str(dest_file))
-                    logger.info(f"Moved {file_path} to {dest_file}")
-                else:
-                    shutil.copy2(str(file_path), str(dest_file))
-                    logger.info(f"Copied {file_path} to {dest_file}")
-                
-                # Then update metadata on the destination file
-                update_metadata(dest_file, track_info, api)
+                with locks.hold(dest_file) if locks else nullcontext():
+                    place_file(file_path, dest_file, track_info, move, api, tag_pool, link)
+                    if index:
+                        index.add(dest_file, track_info.get('track_id'))
             else:
+                if plan:
+                    plan.add(file_path, dest_file, track_info, original_metadata, link or ('move' if move else 'copy'), api)
                 action = "move" if move else "copy"
                 logger.info(f"Would {action} {file_path} to {dest_file}")
             
@@ -114,4 +363,6 @@ def process_file(file_path, destination_dir, dry_run, move, api, gather=False, c
             return False, (original_metadata, None)
     except Exception as e:
         logger.error(f"Error processing {file_path}: {str(e)}")
+        if index and dest_file:
+            index.release(dest_file)
         return False, (None, None) 
\ No newline at end of file
@@ -0,0 +1,101 @@
+from pathlib import Path
+import threading
+import logging
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_NAME = '.music_organizer_journal.jsonl'
+
+class RunJournal:
+    """Append-only JSONL log of per-file outcomes, keyed by path, size and mtime.
+
+    Each processed file gets one line, flushed as soon as it is written, so
+    an interrupted run leaves an accurate record behind. On the next run the
+    journal is read back and files that already succeeded, and haven't
+    changed since, can be skipped; failed ones are tried again.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = Path(journal_path)
+        self._outcomes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._load()
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = (entry['path'], entry['size'], entry['mtime'])
+                except (ValueError, KeyError, TypeError):
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+                self._outcomes[key] = entry['status']
+
+    @staticmethod
+    def _key(file_path):
+        stat = os.stat(file_path)
+        return (str(Path(file_path).absolute()), stat.st_size, stat.st_mtime_ns)
+
+    def pending(self, audio_files):
+        """Filter out files that already succeeded, remembering the identity of the rest."""
+        skipped = 0
+        for file_path in audio_files:
+            try:
+                key = self._key(file_path)
+            except OSError:
+                yield file_path
+                continue
+            if self._outcomes.get(key) == 'success':
+                skipped += 1
+                if skipped % 1000 == 0:
+                    logger.info(f"Skipped {skipped} files already processed")
+                continue
+            with self._lock:
+                # Remember the key now: a moved file can't be stat'ed once processed
+                self._pending[str(file_path)] = key
+            yield file_path
+        if skipped:
+            logger.info(f"Skipped {skipped} files already processed in a previous run")
+
+    def remember(self, file_path):
+        """Note a file's identity before processing it, a moved file can't be stat'ed afterwards."""
+        try:
+            key = self._key(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._pending[str(file_path)] = key
+
+    def record(self, file_path, success):
+        """Append the outcome for a file and flush it to disk."""
+        with self._lock:
+            key = self._pending.pop(str(file_path), None)
+            if key is None:
+                try:
+                    key = self._key(file_path)
+                except OSError:
+                    return
+            status = 'success' if success else 'failed'
+            self._outcomes[key] = status
+            entry = {
+                'path': key[0],
+                'size': key[1],
+                'mtime': key[2],
+                'status': status,
+                'time': time.time()
+            }
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,149 @@
+from pathlib import Path
+import threading
+import logging
+import json
+import os
+from .metadata import probe_file
+from .scanner import AudioFileScanner, DEFAULT_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = '.music_organizer_index.json'
+
+# Outcomes of DestinationIndex.claim
+NEW = 'new'
+UP_TO_DATE = 'up_to_date'
+ELSEWHERE = 'elsewhere'
+COLLISION = 'collision'
+
+def _same_text(a, b):
+    return a.strip().casefold() == b.strip().casefold()
+
+class DestinationIndex:
+    """Index of an organized library, keyed by path and by Spotify track ID.
+
+    Built once per run by walking the destination. Track IDs come from the
+    tags we write; they are read only for files that are new or changed
+    since the index was last saved (a sidecar file in the destination), so
+    rebuilding the index of an unchanged library only costs a directory walk.
+    """
+
+    def __init__(self, destination_dir, extensions=DEFAULT_EXTENSIONS):
+        self.destination_dir = Path(destination_dir)
+        self.index_path = self.destination_dir / INDEX_NAME
+        self.extensions = extensions
+        self._by_path = {}
+        self._by_track_id = {}
+        self._lock = threading.Lock()
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.destination_dir)
+
+    def build(self):
+        """Walk the destination and index every audio file in it."""
+        previous = {}
+        if self.index_path.exists():
+            try:
+                previous = json.loads(self.index_path.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rebuilding unreadable library index: {str(e)}")
+
+        probed = 0
+        if self.destination_dir.exists():
+            for path in AudioFileScanner(self.destination_dir, self.extensions):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                rel_path = self._relative(path)
+                entry = previous.get(rel_path)
+                if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                    track_id = entry[2]
+                else:
+                    track_id = probe_file(path).spotify_id
+                    probed += 1
+                self._add(rel_path, stat.st_size, stat.st_mtime_ns, track_id)
+
+        logger.info(f"Indexed {len(self._by_path)} files in {self.destination_dir} ({probed} read)")
+        return self
+
+    def _add(self, rel_path, size, mtime, track_id):
+        self._by_path[rel_path] = [size, mtime, track_id]
+        if track_id:
+            self._by_track_id[track_id] = rel_path
+
+    def claim(self, dest_file, track_id=None, size=None, artist=None, title=None):
+        """Compare a planned destination against the library and reserve it if free.
+
+        Returns (outcome, existing_path): NEW if nothing is in the way (the
+        path is then reserved for the caller), UP_TO_DATE if dest_file
+        already holds this track, ELSEWHERE if the track is already organized
+        under another path, and COLLISION if dest_file holds a different track.
+
+        A file in the library without a track ID (a WAV, or one organized
+        by an older version or without --sync) holds this track if it has
+        the incoming file's size, or is tagged with its artist and title.
+        """
+        rel_path = self._relative(dest_file)
+        with self._lock:
+            entry = self._by_path.get(rel_path)
+            if entry:
+                if track_id and entry[2] == track_id:
+                    return UP_TO_DATE, dest_file
+                if entry[2]:
+                    return COLLISION, dest_file
+                if size is not None and entry[0] == size:
+                    # The same size is the best we can tell without reading the file
+                    return UP_TO_DATE, dest_file
+                if entry[1] is None or not (artist and title):
+                    # Reserved by another file of this run and not written yet, or no tags to compare
+                    return COLLISION, dest_file
+            elif track_id and track_id in self._by_track_id:
+                return ELSEWHERE, self.destination_dir / self._by_track_id[track_id]
+            else:
+                # Reserve the path so another file in this run can't take it too
+                self._add(rel_path, size, None, track_id)
+                return NEW, None
+
+        # Read the existing file's tags outside the lock
+        probe = probe_file(dest_file)
+        if not (_same_text(probe.artist, artist) and _same_text(probe.title, title)):
+            return COLLISION, dest_file
+        if track_id:
+            with self._lock:
+                # Known from now on, and in the saved index while the file stays unchanged
+                if self._by_path.get(rel_path) is entry and not entry[2]:
+                    entry[2] = track_id
+                    self._by_track_id.setdefault(track_id, rel_path)
+        return UP_TO_DATE, dest_file
+
+    def add(self, dest_file, track_id=None):
+        """Record a file written to the destination during this run."""
+        try:
+            stat = os.stat(dest_file)
+        except OSError:
+            return
+        with self._lock:
+            self._add(self._relative(dest_file), stat.st_size, stat.st_mtime_ns, track_id)
+
+    def release(self, dest_file):
+        """Drop the reservation of a destination that ended up not being written."""
+        rel_path = self._relative(dest_file)
+        with self._lock:
+            entry = self._by_path.get(rel_path)
+            if entry and entry[1] is None:
+                del self._by_path[rel_path]
+                if entry[2] and self._by_track_id.get(entry[2]) == rel_path:
+                    del self._by_track_id[entry[2]]
+
+    def save(self):
+        """Write the index sidecar so the next run only re-reads changed files."""
+        with self._lock:
+            # Reservations of files that were never written (e.g. in a dry run) are not kept
+            data = json.dumps({k: v for k, v in self._by_path.items() if v[1] is not None})
+        try:
+            tmp_path = self.index_path.with_suffix('.tmp')
+            tmp_path.write_text(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not save library index: {str(e)}")
@@ -0,0 +1,65 @@
+from pathlib import Path
+import logging
+import json
+import csv
+import os
+from .metadata import SPOTIFY_URL_PATTERN, SPOTIFY_ID_PATTERN
+
+logger = logging.getLogger(__name__)
+
+def manifest_key(file_path):
+    """Key files by absolute, normalized path."""
+    return os.path.normcase(os.path.abspath(file_path))
+
+def _parse_track_id(value):
+    """Accept a bare track ID, a spotify:track: URI or an open.spotify.com URL."""
+    value = str(value or '').strip()
+    match = SPOTIFY_URL_PATTERN.search(value)
+    if match:
+        return match.group(1)
+    if SPOTIFY_ID_PATTERN.match(value):
+        return value
+    return None
+
+def _rows(manifest_path):
+    """Yield (path, track_id) pairs from a CSV or JSON manifest."""
+    if manifest_path.suffix.lower() == '.json':
+        data = json.loads(manifest_path.read_text(encoding='utf-8'))
+        if isinstance(data, dict):
+            # {"path": "track ID", ...}
+            yield from data.items()
+        else:
+            # [{"path": ..., "track_id": ...}, ...]
+            for entry in data:
+                yield entry.get('path'), entry.get('track_id')
+        return
+
+    with open(manifest_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().lower() == 'path':
+                # Skip blank lines and the header
+                continue
+            yield row[0], row[1]
+
+def load_manifest(manifest_path, base_dir=None):
+    """Load a manifest mapping audio files to Spotify track IDs.
+
+    CSV manifests have path,track_id rows (an optional header is skipped),
+    JSON manifests are either a {path: track_id} object or a list of
+    {"path", "track_id"} objects. Relative paths are taken relative to
+    base_dir. Returns {manifest_key(path): track_id}.
+    """
+    manifest_path = Path(manifest_path)
+    base_dir = Path(base_dir) if base_dir else manifest_path.parent
+    manifest = {}
+    for path, value in _rows(manifest_path):
+        track_id = _parse_track_id(value)
+        if not path or not track_id:
+            logger.warning(f"Ignoring manifest entry {path!r}: no valid Spotify track ID")
+            continue
+        path = Path(path)
+        if not path.is_absolute():
+            path = base_dir / path
+        manifest[manifest_key(path)] = track_id
+    logger.info(f"Loaded {len(manifest)} track IDs from {manifest_path}")
+    return manifest
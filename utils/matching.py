@@ -0,0 +1,137 @@
+from collections import namedtuple
+from pathlib import Path
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+import re
+
+try:
+    # cdist needs numpy, without it the (small) matrices are scored pair by pair
+    import numpy
+except ImportError:
+    numpy = None
+
+# Leading track numbers (e.g., "01 ", "01_", "01-")
+TRACK_NUMBER_PATTERN = re.compile(r'^(\d{1,3}[\s_-]+)')
+
+# Featuring credits, anything in square brackets and everything after a pipe symbol
+CREDITS_PATTERN = re.compile(
+    r'\(feat\..*?\)|\(ft\..*?\)|\(featuring.*?\)|\(with.*?\)|\[.*?\]|\|.*$',
+    re.IGNORECASE
+)
+
+# Video/upload noise: anything in brackets, (Official Video), HD/HQ, resolutions like 720p
+NOISE_PATTERN = re.compile(r'\(.*?\)|\[.*?\]|Official.*?Video|HD|HQ|\d{3,4}p', re.IGNORECASE)
+
+ARTIST_TITLE_SEPARATOR = re.compile(r' - ')
+
+# "Artist - Title (Album)", as built by TagProbe.original_metadata
+ORIGINAL_METADATA_PATTERN = re.compile(r'^(.*?) - (.*) \((.*)\)$')
+
+# Weight of each field in the overall score; duration only counts when both lengths are known
+TITLE_WEIGHT = 0.5
+ARTIST_WEIGHT = 0.35
+DURATION_WEIGHT = 0.15
+
+# Lengths within this many seconds score 100, falling to 0 at DURATION_MAX_DIFF
+DURATION_TOLERANCE = 2
+DURATION_MAX_DIFF = 30
+
+def strip_noise(filename):
+    """Remove video/upload noise from a filename (without extension)."""
+    return strip_title_noise(Path(filename).stem)
+
+def strip_title_noise(title):
+    """Remove the noise strip_noise removes from a filename from a title, e.g. a candidate's."""
+    return NOISE_PATTERN.sub('', title).strip()
+
+def clean_track_name(filename):
+    """Strip the extension, track number and featuring credits from a filename."""
+    name = TRACK_NUMBER_PATTERN.sub('', Path(filename).stem)
+    return CREDITS_PATTERN.sub('', name).strip()
+
+class FileQuery(namedtuple('FileQuery', ['clean_name', 'artists', 'titles', 'duration'])):
+    """What we know about a file, normalized once and compared against every candidate.
+
+    artists and titles hold one guess per source (the filename, the
+    existing tags), preprocessed for rapidfuzz.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, filename, original_metadata=None, duration=None):
+        clean_name = clean_track_name(filename)
+        parts = ARTIST_TITLE_SEPARATOR.split(clean_name, maxsplit=1)
+        if len(parts) == 2:
+            artists, titles = [parts[0]], [parts[1]]
+        else:
+            # No separator, the whole name stands in for both
+            artists, titles = [clean_name], [clean_name]
+
+        match = ORIGINAL_METADATA_PATTERN.match(original_metadata or '')
+        if match and match.group(1) != 'Unknown':
+            artists.append(match.group(1))
+            titles.append(match.group(2))
+
+        return cls(
+            clean_name,
+            [default_process(a) for a in artists],
+            [default_process(t) for t in titles],
+            duration
+        )
+
+    @property
+    def search_terms(self):
+        """Space separated artist and title, for the search API."""
+        parts = ARTIST_TITLE_SEPARATOR.split(self.clean_name, maxsplit=1)
+        if len(parts) == 2:
+            return f"{parts[0]} {parts[1]}"
+        return TRACK_NUMBER_PATTERN.sub('', self.clean_name)
+
+    @property
+    def compact_name(self):
+        """Lowercased clean name without the artist/title separator."""
+        return self.clean_name.lower().replace(' - ', ' ')
+
+# A candidate to score: its artist, title and length in seconds (or None)
+Candidate = namedtuple('Candidate', ['artist', 'title', 'duration'])
+
+# Rank of a candidate: index into the candidate list, overall and per-field scores (0-100)
+ScoredCandidate = namedtuple('ScoredCandidate', ['index', 'score', 'title_score', 'artist_score', 'duration_score'])
+
+def _score_matrix(queries, choices, scorer):
+    """Best score of each choice against any of the queries."""
+    if numpy is not None:
+        return process.cdist(queries, choices, scorer=scorer, processor=None).max(axis=0).tolist()
+    return [max(scorer(q, c) for q in queries) for c in choices]
+
+def _duration_score(expected, actual):
+    if expected is None or actual is None:
+        return None
+    diff = max(0, abs(expected - actual) - DURATION_TOLERANCE)
+    return max(0.0, 100.0 * (1 - diff / (DURATION_MAX_DIFF - DURATION_TOLERANCE)))
+
+def rank_candidates(query, candidates, title_scorer=fuzz.token_set_ratio):
+    """Score candidates against a FileQuery, best first.
+
+    Titles and artists are compared as whole matrices (every guess from
+    the file against every candidate) and the best guess counts. Returns
+    ScoredCandidate tuples, highest score first.
+    """
+    if not candidates:
+        return []
+    titles = [default_process(c.title) for c in candidates]
+    artists = [default_process(c.artist) for c in candidates]
+    title_scores = _score_matrix(query.titles, titles, title_scorer)
+    artist_scores = _score_matrix(query.artists, artists, fuzz.token_set_ratio)
+
+    ranked = []
+    for i, candidate in enumerate(candidates):
+        duration_score = _duration_score(query.duration, candidate.duration)
+        if duration_score is None:
+            score = (TITLE_WEIGHT * title_scores[i] + ARTIST_WEIGHT * artist_scores[i]) / (TITLE_WEIGHT + ARTIST_WEIGHT)
+        else:
+            score = (TITLE_WEIGHT * title_scores[i] + ARTIST_WEIGHT * artist_scores[i] +
+                     DURATION_WEIGHT * duration_score)
+        ranked.append(ScoredCandidate(i, round(score, 1), title_scores[i], artist_scores[i], duration_score))
+    ranked.sort(key=lambda r: r.score, reverse=True)
+    return ranked
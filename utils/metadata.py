@@ -1,69 +1,134 @@
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, APIC
-from mutagen.mp4 import MP4, MP4Cover
+from mutagen.id3 import ID3, APIC, TIT2, TPE1, TPE2, TALB, TDRC, TRCK, TCON, TBPM, TKEY, TXXX, TSRC
+from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+from collections import namedtuple
+from io import BytesIO
 import mutagen.id3
 import mutagen
 import logging
-import requests
-import math
+import re
+import os
+import shutil
+from .transfer import copy_range, copy_file, replacing
+from .stats import stats
 
 logger = logging.getLogger(__name__)
 
-def get_audio_duration(file_path):
-    """Get the duration of an audio file in mm:ss format."""
-    try:
-        suffix = file_path.suffix.lower()
-        if suffix == '.mp3':
-            audio = mutagen.File(file_path)
-            if audio and hasattr(audio, 'info') and hasattr(audio.info, 'length'):
-                seconds = int(audio.info.length)
-                minutes = seconds // 60
-                remaining_seconds = seconds % 60
-                return f"{minutes}:{remaining_seconds:02d}"
-        elif suffix == '.m4a':
-            audio = MP4(file_path)
-            if hasattr(audio, 'info') and hasattr(audio.info, 'length'):
-                seconds = int(audio.info.length)
-                minutes = seconds // 60
-                remaining_seconds = seconds % 60
-                return f"{minutes}:{remaining_seconds:02d}"
-        elif suffix == '.wav':
-            audio = mutagen.File(file_path)
-            if audio and hasattr(audio, 'info') and hasattr(audio.info, 'length'):
-                seconds = int(audio.info.length)
-                minutes = seconds // 60
-                remaining_seconds = seconds % 60
-                return f"{minutes}:{remaining_seconds:02d}"
-        return "Unknown"
-    except Exception as e:
-        logger.error(f"Error getting duration for {file_path}: {str(e)}")
-        return "Unknown"
+# Spotify track IDs as found in URLs/URIs, and bare IDs as written in our own frames
+SPOTIFY_URL_PATTERN = re.compile(r'(?:open\.spotify\.com/track/|spotify:track:)([A-Za-z0-9]{22})')
+SPOTIFY_ID_PATTERN = re.compile(r'^[A-Za-z0-9]{22}$')
+
+# Description of the TXXX frame / name of the MP4 freeform atom holding the track ID
+SPOTIFY_ID_DESC = 'SPOTIFY_TRACK_ID'
+
+class TagProbe(namedtuple('TagProbe', ['artist', 'title', 'album', 'track_number', 'duration', 'isrc', 'spotify_id'])):
+    """Tags and length of an audio file, read in a single parse."""
+    __slots__ = ()
+
+    @property
+    def original_metadata(self):
+        """Display string in the "Artist - Title (Album)" form used for matching."""
+        return f"{self.artist} - {self.title} ({self.album})"
+
+    @property
+    def duration_display(self):
+        """Duration in mm:ss format, or "Unknown"."""
+        if self.duration is None:
+            return "Unknown"
+        seconds = int(self.duration)
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+def _find_spotify_id(values, bare=False):
+    """Return the first Spotify track ID in values, accepting bare IDs only if bare is set."""
+    for value in values:
+        value = str(value).strip()
+        match = SPOTIFY_URL_PATTERN.search(value)
+        if match:
+            return match.group(1)
+        if bare and SPOTIFY_ID_PATTERN.match(value):
+            return value
+    return None
+
+def _probe_id3(tags):
+    """Read (artist, title, album, track_number, isrc, spotify_id) from ID3 tags."""
+    def text(frame_id):
+        frame = tags.get(frame_id)
+        return str(frame.text[0]) if frame and frame.text else None
+    
+    # Spotify IDs may be in a TXXX frame we wrote, or pasted as a URL in a comment
+    own_ids = []
+    id_candidates = []
+    for key, frame in tags.items():
+        if key.startswith('TXXX:') and 'spotify' in frame.desc.lower():
+            own_ids.extend(frame.text)
+        elif key.startswith('COMM:'):
+            id_candidates.extend(frame.text)
+        elif key.startswith('WXXX:'):
+            id_candidates.append(frame.url)
+    
+    track_number = text('TRCK')
+    return (
+        text('TPE1'),
+        text('TIT2'),
+        text('TALB'),
+        track_number.split('/')[0] if track_number else None,
+        text('TSRC'),
+        _find_spotify_id(own_ids, bare=True) or _find_spotify_id(id_candidates)
+    )
+
+def _probe_mp4(tags):
+    """Read (artist, title, album, track_number, isrc, spotify_id) from MP4 tags."""
+    def text(key):
+        values = tags.get(key)
+        if not values:
+            return None
+        value = values[0]
+        return value.decode('utf-8', 'replace') if isinstance(value, bytes) else str(value)
+    
+    own_ids = [text(key) for key in tags.keys() if key.startswith('----:') and 'spotify' in key.lower()]
+    
+    track_number = tags.get('trkn')
+    return (
+        text('\xa9ART'),
+        text('\xa9nam'),
+        text('\xa9alb'),
+        str(track_number[0][0]) if track_number and track_number[0][0] else None,
+        text('----:com.apple.iTunes:ISRC'),
+        _find_spotify_id(own_ids, bare=True) or _find_spotify_id([text('\xa9cmt') or ''])
+    )
 
-def get_original_metadata(file_path):
-    """Get original metadata from file."""
+def probe_file(file_path):
+    """Read tags and duration of an audio file, opening and parsing it only once."""
+    artist = title = album = track_number = duration = isrc = spotify_id = None
     try:
-        suffix = file_path.suffix.lower()
-        if suffix == '.wav':
-            return f"Unknown - {file_path.stem} (Unknown Album)"
-        elif suffix == '.m4a':
-            audio = MP4(file_path)
-            artist = audio.get('\xa9ART', ['Unknown'])[0]
-            title = audio.get('\xa9nam', [file_path.stem])[0]
-            album = audio.get('\xa9alb', ['Unknown Album'])[0]
-            return f"{artist} - {title} ({album})"
-        else:  # mp3
-            audio = EasyID3(file_path)
-            artist = audio.get('artist', ['Unknown'])[0]
-            title = audio.get('title', [file_path.stem])[0]
-            album = audio.get('album', ['Unknown Album'])[0]
-            return f"{artist} - {title} ({album})"
+        audio = mutagen.File(file_path)
+        if audio is not None:
+            if hasattr(audio, 'info') and hasattr(audio.info, 'length'):
+                duration = audio.info.length
+            if isinstance(audio.tags, mutagen.id3.ID3):
+                # MP3, and WAV files with an ID3 chunk
+                artist, title, album, track_number, isrc, spotify_id = _probe_id3(audio.tags)
+            elif isinstance(audio, MP4) and audio.tags is not None:
+                artist, title, album, track_number, isrc, spotify_id = _probe_mp4(audio.tags)
     except Exception as e:
-        return f"Unknown - {file_path.stem} (Unknown Album)"
+        logger.error(f"Error reading {file_path}: {str(e)}")
+    
+    return TagProbe(
+        artist or 'Unknown',
+        title or file_path.stem,
+        album or 'Unknown Album',
+        track_number,
+        duration,
+        isrc,
+        spotify_id
+    )
 
-def update_metadata(file_path, track_info, api):
-    """Update the audio file's metadata."""
+def update_metadata(file_path, track_info, api, suffix=None):
+    """Update the audio file's metadata.
+    
+    suffix gives the format of a file whose name doesn't, e.g. a temporary file.
+    """
     try:
-        suffix = file_path.suffix.lower()
+        suffix = (suffix or file_path.suffix).lower()
         
         if suffix == '.wav':
             # WAV files don't support metadata
@@ -77,75 +142,161 @@ def update_metadata(file_path, track_info, api):
     except Exception as e:
         logger.error(f"Error updating metadata for {file_path}: {str(e)}")
 
-def _update_mp3_metadata(file_path, track_info, api):
-    """Update metadata for MP3 files."""
-    # First update basic ID3 tags using EasyID3
-    try:
-        audio = EasyID3(file_path)
-    except mutagen.id3.ID3NoHeaderError:
-        audio = mutagen.File(file_path, easy=True)
-        if audio is None:
-            audio = EasyID3()
-            audio.save(file_path)
-    
+# Padding reserved when a tag has to grow, so later edits fit without rewriting the file again
+ID3_PADDING = 16 * 1024
+
+def _id3_padding(info):
+    """Keep existing padding when the new tag fits, otherwise reserve ID3_PADDING."""
+    if info.padding >= 0:
+        return info.padding
+    return ID3_PADDING
+
+def _apply_id3_tags(audio, track_info, cover_art=None):
+    """Set all text frames, cover art and comment removal on an ID3 tag in memory."""
     # Basic tags
-    audio['title'] = track_info['title']
-    audio['artist'] = track_info['artist']
-    audio['album'] = track_info['album']
-    audio['date'] = track_info['year']
+    audio.setall('TIT2', [TIT2(encoding=3, text=track_info['title'])])
+    audio.setall('TPE1', [TPE1(encoding=3, text=track_info['artist'])])
+    audio.setall('TALB', [TALB(encoding=3, text=track_info['album'])])
+    audio.setall('TDRC', [TDRC(encoding=3, text=track_info['year'])])
     
     # Set album artist to first name only
     first_artist = track_info['artist'].split('&')[0].split('feat.')[0].split('ft.')[0].strip()
-    audio['albumartist'] = first_artist
+    audio.setall('TPE2', [TPE2(encoding=3, text=first_artist)])
     
     # Additional tags
     if 'track_number' in track_info:
-        audio['tracknumber'] = track_info['track_number']
+        audio.setall('TRCK', [TRCK(encoding=3, text=track_info['track_number'])])
     if 'genre' in track_info:
-        audio['genre'] = track_info['genre']
+        audio.setall('TCON', [TCON(encoding=3, text=track_info['genre'])])
     if 'bpm' in track_info and track_info['bpm']:
-        audio['bpm'] = track_info['bpm']
+        audio.setall('TBPM', [TBPM(encoding=3, text=str(track_info['bpm']))])
     if 'key' in track_info and track_info['key']:
-        audio['initialkey'] = track_info['key']
+        audio.setall('TKEY', [TKEY(encoding=3, text=track_info['key'])])
+    if track_info.get('isrc'):
+        audio.setall('TSRC', [TSRC(encoding=3, text=track_info['isrc'])])
+    if track_info.get('track_id'):
+        # Lets later runs recognize the file without searching again
+        audio.setall(f'TXXX:{SPOTIFY_ID_DESC}', [TXXX(encoding=3, desc=SPOTIFY_ID_DESC, text=track_info['track_id'])])
     
     # Remove composer and comments if they exist
-    if 'composer' in audio:
-        del audio['composer']
-    if 'comment' in audio:
-        del audio['comment']
+    audio.delall('TCOM')
+    audio.delall('COMM')
+    
+    # Replace existing art
+    if cover_art:
+        audio.delall('APIC')
+        audio.add(
+            APIC(
+                encoding=3,
+                mime='image/jpeg',
+                type=3,
+                desc='Cover',
+                data=cover_art
+            )
+        )
+
+def _update_mp3_metadata(file_path, track_info, api):
+    """Update metadata for MP3 files."""
+    # Fetch the cover first so every change goes out in a single save
+    cover_art = None
+    if 'release_id' in track_info:
+        cover_art = api.get_cover_art(track_info['release_id'])
     
-    audio.save()
+    try:
+        audio = ID3(file_path)
+    except mutagen.id3.ID3NoHeaderError:
+        audio = ID3()
     
-    # Handle album art
+    _apply_id3_tags(audio, track_info, cover_art)
+    audio.save(file_path, padding=_id3_padding)
+
+def _id3v2_size(header):
+    """Total size of an ID3v2 tag (header, frames and footer) from its first 10 bytes."""
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+def id3_tag_fits(file_path, track_info, api):
+    """Whether the ID3 tag update_metadata would write fits in the MP3's current tag and its padding.
+
+    Only then is the tag rewritten where it is; a tag that has to grow
+    moves every audio frame behind it.
+    """
+    cover_art = None
     if 'release_id' in track_info:
         cover_art = api.get_cover_art(track_info['release_id'])
-        if cover_art:
-            audio = ID3(file_path)
-            
-            # Remove existing art
-            for key in list(audio.keys()):
-                if key.startswith('APIC:'):
-                    del audio[key]
-            
-            # Add new art
-            audio.add(
-                APIC(
-                    encoding=3,
-                    mime='image/jpeg',
-                    type=3,
-                    desc='Cover',
-                    data=cover_art
-                )
-            )
-            
-            # Remove any comments in ID3 tags
-            if 'COMM::eng' in audio:
-                del audio['COMM::eng']
-            for key in list(audio.keys()):
-                if key.startswith('COMM:'):
-                    del audio[key]
-            
-            audio.save()
+    
+    with open(file_path, 'rb') as f:
+        available = _id3v2_size(f.read(10))
+    if not available:
+        return False
+    audio = ID3(file_path)
+    _apply_id3_tags(audio, track_info, cover_art)
+    rendered = BytesIO()
+    audio.save(rendered, padding=lambda info: 0)
+    return _id3v2_size(rendered.getvalue()[:10]) <= available
+
+def _write_tagged_mp3(source_path, dest_path, track_info, api):
+    """Write dest_path as a freshly built ID3 tag followed by the source's audio frames."""
+    cover_art = None
+    if 'release_id' in track_info:
+        cover_art = api.get_cover_art(track_info['release_id'])
+    
+    # Start from the source's tags so frames we don't manage are kept
+    try:
+        audio = ID3(source_path)
+    except mutagen.id3.ID3NoHeaderError:
+        audio = ID3()
+    _apply_id3_tags(audio, track_info, cover_art)
+    
+    with open(source_path, 'rb') as src:
+        audio_start = _id3v2_size(src.read(10))
+        src.seek(0, os.SEEK_END)
+        audio_end = src.tell()
+        has_v1 = False
+        if audio_end - audio_start >= 128:
+            src.seek(audio_end - 128)
+            has_v1 = src.read(3) == b'TAG'
+            if has_v1:
+                audio_end -= 128
+        
+        # Render the tag in memory; a placeholder ID3v1 block gets updated if the source had one
+        rendered = BytesIO(b'TAG' + b'\0' * 125 if has_v1 else b'')
+        audio.save(rendered, padding=_id3_padding, v1=1)
+        rendered = rendered.getvalue()
+        header_size = _id3v2_size(rendered[:10])
+        
+        with replacing(dest_path) as part_path:
+            with open(part_path, 'wb') as dst:
+                dst.write(rendered[:header_size])
+                src.seek(audio_start)
+                copy_range(src, dst, audio_end - audio_start)
+                dst.write(rendered[header_size:])
+            shutil.copystat(source_path, part_path)
+
+def write_tagged_copy(source_path, dest_path, track_info, api):
+    """Copy an audio file to dest_path with updated metadata.
+    
+    MP3s are written in one streaming pass: the new tag is built in memory and
+    the audio frames are copied behind it, so the destination is never
+    rewritten after the copy. Other formats are copied to a temporary file
+    and tagged there. Either way the destination appears in one step.
+    """
+    if source_path.suffix.lower() == '.mp3':
+        try:
+            _write_tagged_mp3(source_path, dest_path, track_info, api)
+            return
+        except Exception as e:
+            logger.error(f"Error writing tagged copy of {source_path}, falling back to copy and tag: {str(e)}")
+    with replacing(dest_path) as part_path:
+        with stats.timed('copy'):
+            copy_file(source_path, part_path)
+        with stats.timed('tag'):
+            update_metadata(part_path, track_info, api, source_path.suffix)
 
 def _update_m4a_metadata(file_path, track_info, api):
     """Update metadata for M4A files."""
@@ -168,6 +319,11 @@ def _update_m4a_metadata(file_path, track_info, api):
         audio['\xa9gen'] = track_info['genre']
     if 'bpm' in track_info and track_info['bpm']:
         audio['tmpo'] = [int(track_info['bpm'])]
+    if track_info.get('isrc'):
+        audio['----:com.apple.iTunes:ISRC'] = [MP4FreeForm(track_info['isrc'].encode('utf-8'))]
+    if track_info.get('track_id'):
+        # Lets later runs recognize the file without searching again
+        audio[f'----:com.apple.iTunes:{SPOTIFY_ID_DESC}'] = [MP4FreeForm(track_info['track_id'].encode('utf-8'))]
     
     # Remove composer and comments if they exist
     if '\xa9wrt' in audio:
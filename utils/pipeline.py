@@ -0,0 +1,257 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+import threading
+import queue
+import logging
+import time
+from .file_handling import lookup_file, match_lookup, resolve_track_ids, select_match, transfer_file
+from .manifest import manifest_key
+from .stats import stats
+from .transfer import DestinationLocks
+
+logger = logging.getLogger(__name__)
+
+# Event kinds posted by the workers to the orchestrating thread
+_RESULT = 'result'
+_PROMPT = 'prompt'
+_SCAN_DONE = 'scan_done'
+
+class _Pipeline:
+    """State shared by the feeder, the workers and the orchestrating thread."""
+
+    # Track IDs are resolved in batches of up to this many files...
+    ID_BATCH_SIZE = 50
+    # ...or after this many seconds, whichever comes first
+    ID_BATCH_WAIT = 0.2
+
+    def __init__(self, api, transfer, workers, manifest, tag_pool=None):
+        self.api = api
+        self.tag_pool = tag_pool
+        self.transfer = transfer
+        self.manifest = manifest
+        self.events = queue.Queue()
+        self.slots = threading.Semaphore(workers * 2)
+        self.stop = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.id_batch = []
+        self.id_batch_started = None
+        self.id_batch_ready = threading.Condition()
+
+    def feed(self, audio_files, start):
+        """Submit files to the worker pool, keeping a bounded number in flight."""
+        submitted = 0
+        try:
+            for current_file, file_path in enumerate(audio_files, start + 1):
+                # Wait for a free slot so enumeration never runs far ahead of the workers
+                while not self.slots.acquire(timeout=0.5):
+                    if self.stop.is_set():
+                        return
+                if self.stop.is_set():
+                    return
+                track_id = self.manifest.get(manifest_key(file_path)) if self.manifest else None
+                self.executor.submit(self.lookup_and_transfer, file_path, current_file, track_id)
+                submitted += 1
+        except Exception as e:
+            logger.error(f"Error listing files: {str(e)}")
+        finally:
+            self.events.put((_SCAN_DONE, submitted, None))
+
+    def lookup_and_transfer(self, file_path, current_file, track_id):
+        """Worker: look up a file and, if it was auto-matched, transfer it right away."""
+        try:
+            lookup = lookup_file(file_path, self.api, track_id, self.tag_pool)
+            if lookup['track_id'] and not lookup['track_info']:
+                # Known track ID, resolve it together with others
+                self.queue_track_id(current_file, lookup)
+                return
+            self.finish_lookup(current_file, lookup)
+        except Exception as e:
+            self.post_failure(current_file, file_path, e)
+        finally:
+            self.slots.release()
+
+    def finish_lookup(self, current_file, lookup):
+        """Transfer a looked-up file, or queue it for a prompt if it needs a human decision."""
+        if not lookup['track_info'] and lookup['choices']:
+            self.events.put((_PROMPT, current_file, lookup))
+            return
+        self.transfer_lookup(current_file, lookup, lookup['track_info'])
+
+    def transfer_lookup(self, current_file, lookup, track_info):
+        """Worker: copy/move and tag a file once its match is known."""
+        file_path = lookup['file_path']
+        try:
+            result = self.transfer(file_path, track_info, lookup['original_metadata'])
+        except Exception as e:
+            self.post_failure(current_file, file_path, e)
+            return
+        stats.file_done(file_path, time.perf_counter() - lookup['started'])
+        self.events.put((_RESULT, current_file, (file_path,) + result))
+
+    def match_and_transfer(self, current_file, lookup):
+        """Worker: search for a file whose track ID could not be resolved."""
+        try:
+            match_lookup(lookup, self.api)
+            self.finish_lookup(current_file, lookup)
+        except Exception as e:
+            self.post_failure(current_file, lookup['file_path'], e)
+
+    def post_failure(self, current_file, file_path, error):
+        logger.error(f"Error processing {file_path}: {str(error)}")
+        self.events.put((_RESULT, current_file, (file_path, False, (None, None))))
+
+    def queue_track_id(self, current_file, lookup):
+        with self.id_batch_ready:
+            if not self.id_batch:
+                self.id_batch_started = time.monotonic()
+            self.id_batch.append((current_file, lookup))
+            if len(self.id_batch) >= self.ID_BATCH_SIZE:
+                self.id_batch_ready.notify()
+
+    def resolve_track_ids(self):
+        """Batcher thread: resolve queued track IDs with multi-track requests."""
+        while not self.stop.is_set():
+            with self.id_batch_ready:
+                self.id_batch_ready.wait(self.ID_BATCH_WAIT)
+                if not self.id_batch:
+                    continue
+                if (len(self.id_batch) < self.ID_BATCH_SIZE and
+                        time.monotonic() - self.id_batch_started < self.ID_BATCH_WAIT):
+                    continue
+                batch = self.id_batch[:self.ID_BATCH_SIZE]
+                del self.id_batch[:self.ID_BATCH_SIZE]
+                self.id_batch_started = time.monotonic()
+
+            lookups = [lookup for _, lookup in batch]
+            try:
+                unresolved = resolve_track_ids(lookups, self.api)
+            except Exception as e:
+                logger.error(f"Error resolving track IDs: {str(e)}")
+                unresolved = lookups
+            unresolved = {id(lookup) for lookup in unresolved}
+            for current_file, lookup in batch:
+                if id(lookup) in unresolved:
+                    self.executor.submit(self.match_and_transfer, current_file, lookup)
+                else:
+                    self.executor.submit(self.finish_lookup, current_file, lookup)
+
+def run_pipeline(audio_files, destination_dir, dry_run, move, api, gather=False, workers=4, start=0, total_files=None,
+                 index=None, manifest=None, review=None, tag_pool=None, plan=None,
+                 link=None):
+    """Process files on a pool of workers, yielding (file_path, success, (original, new)) as they finish.
+
+    Lookups, copies and tag writes run concurrently on the workers. Files that
+    need a human decision are queued and prompted for one at a time, in file
+    order, on the calling thread while the workers keep going with the rest.
+    audio_files may be a lazy iterator; total_files may then be a callable
+    returning the number of files known so far. With a DestinationIndex,
+    files already in the library are skipped (see transfer_file).
+
+    Files with a Spotify track ID, embedded in their tags or given in the
+    manifest ({manifest_key(path): track_id}), skip the search and are
+    resolved in batches through get_tracks_by_ids.
+
+    For unattended runs, review is called with the lookup of every file
+    that would need a prompt (see ReviewQueue.add) and nothing is asked.
+
+    With a TagPool, the workers hand tag parsing and writing to its
+    processes and only wait for them. Dry runs record their decisions in
+    plan, a PlanWriter, if one is given. link is passed on to place_file.
+    """
+    workers = max(1, workers)
+    transfer = partial(transfer_file, destination_dir=destination_dir, dry_run=dry_run, move=move,
+                       api=api, gather=gather, index=index, tag_pool=tag_pool, plan=plan, link=link,
+                       locks=DestinationLocks())
+    pipeline = _Pipeline(api, transfer, workers, manifest, tag_pool)
+
+    for target, args in ((pipeline.feed, (audio_files, start)), (pipeline.resolve_track_ids, ())):
+        threading.Thread(target=target, args=args, daemon=True).start()
+    try:
+        yield from _orchestrate(
+            pipeline.events, api, total_files,
+            lambda current_file, lookup, track_info: pipeline.executor.submit(
+                pipeline.transfer_lookup, current_file, lookup, track_info),
+            review, dry_run
+        )
+    finally:
+        pipeline.stop.set()
+        pipeline.executor.shutdown(wait=True, cancel_futures=True)
+
+class _HeldLogs(logging.Handler):
+    """Root handler while a prompt is open: passes on the prompting thread's records, holds the rest."""
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+        self.thread = threading.get_ident()
+        self.held = queue.SimpleQueue()
+
+    def handle(self, record):
+        if record.thread == self.thread:
+            self.pass_on(record)
+        else:
+            self.held.put(record)
+        return True
+
+    def pass_on(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+@contextmanager
+def _worker_logs_held():
+    """Keep the workers' log lines off the terminal while a prompt is drawn on it, print them afterwards.
+
+    The prompt redraws itself by moving the cursor, lines logged in
+    between would garble it.
+    """
+    root = logging.getLogger()
+    handlers = root.handlers
+    held = _HeldLogs(handlers)
+    root.handlers = [held]
+    try:
+        yield
+    finally:
+        root.handlers = handlers
+        while not held.held.empty():
+            held.pass_on(held.held.get())
+
+def _orchestrate(events, api, total_files, transfer_selected, review=None, dry_run=False):
+    """Yield the results posted to events, answering prompts in file order in between.
+
+    transfer_selected(current_file, lookup, track_info) hands a prompted
+    file back to the workers. With review, files that would need a prompt
+    are passed to it instead and reported as queued for review, or in a
+    dry run as files that would be.
+    """
+    review_outcome = "Would queue for review" if dry_run else "Queued for review"
+    prompts = {}
+    submitted = None
+    finished = 0
+    while submitted is None or finished < submitted:
+        # Answer pending prompts in file order whenever the workers have nothing to report
+        if prompts and events.empty():
+            current_file = min(prompts)
+            lookup = prompts.pop(current_file)
+            total = total_files() if callable(total_files) else total_files
+            with stats.timed('prompt'), _worker_logs_held():
+                track_info = select_match(lookup, api, current_file, total)
+            # Time spent waiting for a human doesn't count towards the file
+            lookup['started'] += time.perf_counter() - lookup['prompted']
+            transfer_selected(current_file, lookup, track_info)
+            continue
+
+        kind, current_file, payload = events.get()
+        if kind == _SCAN_DONE:
+            submitted = current_file
+        elif kind == _PROMPT and review:
+            review(payload)
+            finished += 1
+            yield payload['file_path'], False, (payload['original_metadata'], review_outcome)
+        elif kind == _PROMPT:
+            payload['prompted'] = time.perf_counter()
+            prompts[current_file] = payload
+        else:
+            finished += 1
+            yield payload
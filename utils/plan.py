@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import threading
+import logging
+import json
+import os
+from .cache import CoverArtCache
+from .file_handling import place_file
+from .tag_pool import FetchedCover
+from .transfer import LINK_MODES, DestinationLocks
+
+logger = logging.getLogger(__name__)
+
+class PlanWriter:
+    """JSONL plan of the copies and moves a dry run decided on.
+
+    Each line holds a file's source and destination, the action (copy,
+    move, hardlink or reflink), the full track info (or "TRANSFER_ONLY")
+    and its cover, a path relative to the plan. Covers are stored next to the plan, in a
+    CoverArtCache under <plan>.assets, so apply_plan needs no API at all
+    and doesn't depend on what the API's own cache still holds.
+    """
+
+    def __init__(self, plan_path):
+        self.plan_path = Path(plan_path)
+        self.plan_path.parent.mkdir(parents=True, exist_ok=True)
+        self.covers = CoverArtCache(self.plan_path.with_name(self.plan_path.name + '.assets'),
+                                    max_disk_bytes=float('inf'))
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(self.plan_path, 'w', encoding='utf-8')
+
+    def _cover(self, dest_file, track_info, api):
+        """Store the cover a file would be tagged with, returns its path relative to the plan."""
+        if not isinstance(track_info, dict) or 'release_id' not in track_info or dest_file.suffix.lower() == '.wav':
+            return None
+        release_id = track_info['release_id']
+        path = self.covers.path_for(release_id)
+        if path is None:
+            cover_art = api.get_cover_art(release_id)
+            if not cover_art:
+                return None
+            self.covers.put(release_id, cover_art)
+            path = self.covers.path_for(release_id)
+        return os.path.relpath(path, self.plan_path.parent) if path else None
+
+    def add(self, file_path, dest_file, track_info, original_metadata, action, api):
+        """Write a planned operation to the plan, fetching its cover through api."""
+        entry = {
+            'source': str(Path(file_path).absolute()),
+            'destination': str(Path(dest_file).absolute()),
+            'action': action,
+            'track_info': track_info,
+            'original_metadata': original_metadata,
+            'cover': self._cover(dest_file, track_info, api)
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read_plan(plan_path):
+    """Yield the entries of a plan file."""
+    with open(plan_path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping unreadable line {line_number} of {plan_path}")
+
+def _apply_entry(entry, plan_dir, tag_pool, locks):
+    source = Path(entry['source'])
+    track_info = entry['track_info']
+    original_metadata = entry.get('original_metadata')
+    try:
+        cover_art = None
+        if entry.get('cover'):
+            try:
+                cover_art = (plan_dir / entry['cover']).read_bytes()
+            except OSError as e:
+                logger.warning(f"Cover {entry['cover']} missing, tagging {source} without it: {str(e)}")
+        action = entry['action']
+        destination = Path(entry['destination'])
+        with locks.hold(destination):
+            place_file(source, destination, track_info, action == 'move',
+                       FetchedCover(cover_art), tag_pool, action if action in LINK_MODES else None)
+    except Exception as e:
+        logger.error(f"Error applying plan to {source}: {str(e)}")
+        return source, False, (original_metadata, None)
+    if track_info == "TRANSFER_ONLY":
+        return source, True, (original_metadata, "No change")
+    return source, True, (original_metadata, f"{track_info['artist']} - {track_info['title']} ({track_info['album']})")
+
+def apply_plan(plan_path, workers=8, tag_pool=None):
+    """Carry out a plan on a pool of workers, yielding (file_path, success, (original, new)) as files finish.
+
+    Nothing is looked up: files are copied or moved and tagged exactly as
+    the plan says, with covers read from the plan's assets.
+    """
+    plan_dir = Path(plan_path).parent
+    workers = max(1, workers)
+    # Entries sharing a destination are written one at a time
+    locks = DestinationLocks()
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for entry in read_plan(plan_path):
+            # Keep a bounded number of entries in flight, plans can be huge
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_apply_entry, entry, plan_dir, tag_pool, locks))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,90 @@
+from collections import deque
+from pathlib import Path
+import logging
+import json
+import time
+import csv
+
+logger = logging.getLogger(__name__)
+
+REPORT_FIELDS = ('path', 'status', 'original', 'new')
+
+class RunReport:
+    """Running outcome counts of a run, optionally streamed to a CSV or JSONL report.
+
+    Each file's outcome is written to the report as soon as it is known
+    (CSV if the path ends in .csv, JSONL otherwise) and the report is
+    flushed every flush_every files or flush_interval seconds, so it can
+    be followed while the run goes on and a crash loses at most the last
+    few lines. Only the counts and the last SUMMARY_LINES changes stay in
+    memory, however many files the run processes.
+    """
+
+    SUMMARY_LINES = 100
+
+    def __init__(self, report_path=None, flush_every=100, flush_interval=2.0):
+        self.report_path = Path(report_path) if report_path else None
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.successful = 0
+        self.failed = 0
+        self.total = 0
+        self.recent = deque(maxlen=self.SUMMARY_LINES)
+        self._file = None
+        self._writer = None
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        if self.report_path:
+            self.report_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.report_path, 'w', encoding='utf-8', newline='')
+            if self.report_path.suffix.lower() == '.csv':
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(REPORT_FIELDS)
+
+    @staticmethod
+    def _status(success, original, new):
+        if success and original and new:
+            return 'success'
+        if original and new:
+            return 'failed'
+        if original:
+            return 'no_match'
+        return 'error'
+
+    def add(self, file_path, success, original, new):
+        """Count a file's outcome and write it to the report, returns its status."""
+        status = self._status(success, original, new)
+        self.total += 1
+        if status == 'success':
+            self.successful += 1
+        elif status != 'error':
+            self.failed += 1
+        if status != 'error':
+            self.recent.append((status, original, new))
+        if not self._file:
+            return status
+        row = (str(file_path), status, original, new)
+        if self._writer:
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(dict(zip(REPORT_FIELDS, row))) + '\n')
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+        return status
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    @property
+    def hidden(self):
+        """Number of changes counted but no longer kept for the summary."""
+        return self.successful + self.failed - len(self.recent)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,77 @@
+from pathlib import Path
+import threading
+import logging
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+REVIEW_NAME = '.music_organizer_review.jsonl'
+
+class ReviewQueue:
+    """JSONL file of files whose best match scored below the threshold.
+
+    An unattended run appends one line per file instead of prompting,
+    with the candidates it found and where the file was headed, so the
+    review command can ask about them later without searching again.
+    A file queued again replaces its earlier entry.
+    """
+
+    def __init__(self, review_path):
+        self.review_path = Path(review_path)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.review_path.exists():
+            return
+        with open(self.review_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry['path']] = entry
+                except (ValueError, KeyError, TypeError):
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """The queued entries, oldest first."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def add(self, lookup, destination_dir, move=False, gather=False):
+        """Queue a looked-up file with its candidates and flush it to disk."""
+        entry = {
+            'path': str(Path(lookup['file_path']).absolute()),
+            'clean_name': lookup['clean_name'],
+            'original_metadata': lookup['original_metadata'],
+            'duration': lookup['duration'],
+            # [label, Spotify track object, score], enough to prompt without searching again
+            'choices': [list(choice) for choice in lookup['choices']],
+            'destination': str(Path(destination_dir).absolute()),
+            'move': move,
+            'gather': gather,
+            'time': time.time()
+        }
+        with self._lock:
+            self._entries.pop(entry['path'], None)
+            self._entries[entry['path']] = entry
+            self.review_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.review_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def remove(self, path):
+        """Drop a reviewed file and rewrite the queue without it."""
+        with self._lock:
+            if self._entries.pop(str(path), None) is None:
+                return
+            tmp_path = self.review_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, self.review_path)
@@ -0,0 +1,74 @@
+from pathlib import Path
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Supported audio formats
+DEFAULT_EXTENSIONS = ('.mp3', '.wav', '.m4a')
+
+def parse_extensions(value):
+    """Turn a comma separated list like "mp3,.M4A" into a set of lowercase suffixes."""
+    extensions = set()
+    for ext in value.split(','):
+        ext = ext.strip().lower()
+        if ext:
+            extensions.add(ext if ext.startswith('.') else f".{ext}")
+    return extensions
+
+class AudioFileScanner:
+    """Lazily walk a directory tree with os.scandir, yielding audio files as they are found.
+
+    Files are yielded while enumeration is still running, so processing can
+    start right away. count holds the number of files found so far and done
+    turns True once the whole tree has been walked. Directories are tracked
+    by device and inode, so symlink loops are only entered once.
+    """
+
+    def __init__(self, root, extensions=DEFAULT_EXTENSIONS, follow_symlinks=True):
+        self.root = Path(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.follow_symlinks = follow_symlinks
+        self.count = 0
+        self.done = False
+
+    def __iter__(self):
+        visited = set()
+        stack = [str(self.root)]
+
+        while stack:
+            directory = stack.pop()
+            try:
+                stat = os.stat(directory)
+            except OSError as e:
+                logger.warning(f"Cannot access {directory}: {str(e)}")
+                continue
+            if (stat.st_dev, stat.st_ino) in visited:
+                logger.warning(f"Skipping {directory}: already scanned (symlink loop?)")
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+
+            try:
+                with os.scandir(directory) as it:
+                    # Sorted so runs over an unchanged tree see files in the same order
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.warning(f"Cannot list {directory}: {str(e)}")
+                continue
+
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        subdirs.append(entry.path)
+                    elif (os.path.splitext(entry.name)[1].lower() in self.extensions and
+                          entry.is_file(follow_symlinks=self.follow_symlinks)):
+                        self.count += 1
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+
+            # Depth first, in name order
+            stack.extend(reversed(subdirs))
+
+        self.done = True
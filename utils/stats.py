@@ -0,0 +1,172 @@
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+import threading
+import heapq
+import json
+import math
+import time
+
+# Histogram buckets: durations up to 1 ms, 2 ms, 4 ms, ... 2^HISTOGRAM_BUCKETS ms and above
+HISTOGRAM_BUCKETS = 18
+
+# Slowest files kept for the report
+SLOWEST_FILES = 10
+
+class _Stage:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (HISTOGRAM_BUCKETS + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        ms = seconds * 1000
+        self.buckets[min(HISTOGRAM_BUCKETS, max(0, math.ceil(math.log2(ms))) if ms > 1 else 0)] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 4),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3),
+            # {"<=N ms": count}, empty buckets left out
+            'histogram': {f"<={2 ** i}ms" if i < HISTOGRAM_BUCKETS else f">{2 ** (i - 1)}ms": n
+                          for i, n in enumerate(self.buckets) if n}
+        }
+
+class RunStats:
+    """Counters and timers for one run, shared by every thread.
+
+    Cheap enough to leave on: each event is a perf_counter call and a few
+    additions under a lock. Stage timings nest (e.g. a match
+    includes its HTTP requests), so they are not meant to add up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self._stages = {}
+            self.api_calls = Counter()
+            self.api_bytes = Counter()
+            self.cache_hits = Counter()
+            self.cache_misses = Counter()
+            self.bytes_written = 0
+            self._slowest = []
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            timer = self._stages.get(stage)
+            if timer is None:
+                timer = self._stages[stage] = _Stage()
+            timer.add(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the body of a with statement as one occurrence of stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started)
+
+    def api_call(self, url, nbytes, seconds):
+        """Count a request and its response size by endpoint."""
+        endpoint = endpoint_name(url)
+        with self._lock:
+            self.api_calls[endpoint] += 1
+            self.api_bytes[endpoint] += nbytes
+        self.add_time(f"http:{endpoint}", seconds)
+
+    def cache(self, name, hit, count=1):
+        with self._lock:
+            if hit:
+                self.cache_hits[name] += count
+            else:
+                self.cache_misses[name] += count
+
+    def wrote(self, nbytes):
+        with self._lock:
+            self.bytes_written += nbytes
+
+    def file_done(self, file_path, seconds):
+        """Remember how long a file took, keeping only the slowest ones."""
+        with self._lock:
+            entry = (seconds, str(file_path))
+            if len(self._slowest) < SLOWEST_FILES:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def to_dict(self):
+        with self._lock:
+            caches = sorted(set(self.cache_hits) | set(self.cache_misses))
+            return {
+                'elapsed_seconds': round(time.perf_counter() - self.started, 3),
+                'stages': {name: stage.to_dict() for name, stage in sorted(self._stages.items())},
+                'api_calls': dict(self.api_calls),
+                'api_bytes': dict(self.api_bytes),
+                'caches': {
+                    name: {
+                        'hits': self.cache_hits[name],
+                        'misses': self.cache_misses[name],
+                        'hit_rate': round(self.cache_hits[name] / ((self.cache_hits[name] + self.cache_misses[name]) or 1), 3)
+                    }
+                    for name in caches
+                },
+                'bytes_written': self.bytes_written,
+                'slowest_files': [{'path': path, 'seconds': round(seconds, 3)}
+                                  for seconds, path in sorted(self._slowest, reverse=True)]
+            }
+
+    def save(self, stats_path):
+        Path(stats_path).write_text(json.dumps(self.to_dict(), indent=2))
+
+    def table(self):
+        """The report as lines of text for the end of a run."""
+        data = self.to_dict()
+        lines = [f"{'Stage':<20}{'Count':>8}{'Total s':>10}{'Mean ms':>10}{'Max ms':>10}"]
+        for name, stage in data['stages'].items():
+            lines.append(f"{name:<20}{stage['count']:>8}{stage['total_seconds']:>10.2f}"
+                         f"{stage['mean_ms']:>10.1f}{stage['max_ms']:>10.1f}")
+        if data['api_calls']:
+            lines.append("")
+            lines.append(f"{'Endpoint':<20}{'Calls':>8}{'KiB':>10}")
+            for endpoint, calls in sorted(data['api_calls'].items()):
+                lines.append(f"{endpoint:<20}{calls:>8}{data['api_bytes'][endpoint] / 1024:>10.1f}")
+        if data['caches']:
+            lines.append("")
+            lines.append(f"{'Cache':<20}{'Hits':>8}{'Misses':>10}{'Hit rate':>10}")
+            for name, cache in data['caches'].items():
+                lines.append(f"{name:<20}{cache['hits']:>8}{cache['misses']:>10}{cache['hit_rate']:>10.0%}")
+        lines.append("")
+        lines.append(f"Written: {data['bytes_written'] / 1024 / 1024:.1f} MiB in {data['elapsed_seconds']:.1f}s")
+        if data['slowest_files']:
+            lines.append("Slowest files:")
+            for entry in data['slowest_files']:
+                lines.append(f"  {entry['seconds']:>8.2f}s  {entry['path']}")
+        return lines
+
+def endpoint_name(url):
+    """Short endpoint name for a request URL: search, artists, albums, ... or the host."""
+    parsed = urlparse(url)
+    parts = [p for p in parsed.path.split('/') if p]
+    if 'v1' in parts and parts.index('v1') + 1 < len(parts):
+        return parts[parts.index('v1') + 1]
+    if parts and parts[-1] == 'token':
+        return 'token'
+    # Cover images and anything else off the API
+    return parsed.hostname or 'other'
+
+# Statistics of the current run, reset by the command that starts one
+stats = RunStats()
@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import logging
+from .metadata import probe_file, update_metadata, write_tagged_copy
+
+logger = logging.getLogger(__name__)
+
+class FetchedCover:
+    """Stands in for the api in the metadata functions, handing out a cover fetched beforehand."""
+
+    def __init__(self, cover):
+        self.cover = cover
+
+    def get_cover_art(self, album_id):
+        return self.cover
+
+def _fetch_cover(file_path, track_info, api, suffix=None):
+    """The cover the metadata functions would ask the api for, if any."""
+    if (suffix or file_path.suffix).lower() == '.wav' or 'release_id' not in track_info:
+        return None
+    return api.get_cover_art(track_info['release_id'])
+
+class TagPool:
+    """Runs tag parsing and writing in worker processes.
+
+    Parsing and serializing tags is CPU-bound Python, so on threads it is
+    limited to one core by the GIL. The methods mirror probe_file,
+    update_metadata and write_tagged_copy and block the calling thread
+    until a worker process is done, so many threads can keep the pool
+    busy. Covers are fetched on the calling thread (the api stays in
+    this process) and sent to the worker as bytes.
+    """
+
+    def __init__(self, processes):
+        # Workers are started from a process that already runs threads, don't fork it
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+
+    def probe_file(self, file_path):
+        return self.executor.submit(probe_file, file_path).result()
+
+    def update_metadata(self, file_path, track_info, api, suffix=None):
+        cover = _fetch_cover(file_path, track_info, api, suffix)
+        return self.executor.submit(update_metadata, file_path, track_info, FetchedCover(cover), suffix).result()
+
+    def write_tagged_copy(self, source_path, dest_path, track_info, api):
+        cover = _fetch_cover(dest_path, track_info, api)
+        return self.executor.submit(write_tagged_copy, source_path, dest_path, track_info, FetchedCover(cover)).result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
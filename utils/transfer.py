@@ -0,0 +1,210 @@
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import logging
+import errno
+import shutil
+import uuid
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, reflinks are then never attempted
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+LINK_MODES = (HARDLINK, REFLINK)
+
+# ioctl cloning a whole file (btrfs, XFS, ...), from linux/fs.h
+FICLONE = 0x40049409
+
+# Largest count handed to copy_file_range/sendfile in one call
+MAX_KERNEL_CHUNK = 1 << 30
+
+# Errors meaning "not supported here", as opposed to real I/O errors
+_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EBADF}
+
+# (source device, destination device) pairs that refused a reflink, not tried again
+_no_reflink = set()
+_no_reflink_lock = threading.Lock()
+
+def _kernel_copy(src_fd, dst_fd, src_offset, dst_offset, length):
+    """Copy up to length bytes between file descriptors without passing them through Python.
+
+    Tries copy_file_range (which some filesystems turn into a reflink or a
+    server-side copy), then sendfile. Returns the number of bytes copied,
+    less than length if the platform supports neither.
+    """
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                n = os.copy_file_range(src_fd, dst_fd, min(length - copied, MAX_KERNEL_CHUNK),
+                                       src_offset + copied, dst_offset + copied)
+                if not n:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < length:
+                n = os.sendfile(dst_fd, src_fd, src_offset + copied, min(length - copied, MAX_KERNEL_CHUNK))
+                if not n:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    return copied
+
+def copy_range(src, dst, length, chunk_size=1024 * 1024):
+    """Copy length bytes from the current position of src to dst (binary file objects).
+
+    The kernel does the copy where it can; whatever it couldn't copy is
+    streamed through Python. Both files are left positioned after the
+    copied range.
+    """
+    dst.flush()
+    src_offset, dst_offset = src.tell(), dst.tell()
+    copied = _kernel_copy(src.fileno(), dst.fileno(), src_offset, dst_offset, length)
+    src.seek(src_offset + copied)
+    dst.seek(dst_offset + copied)
+    length -= copied
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
+def copy_file(source_path, dest_path):
+    """Copy a file with its permissions and times like shutil.copy2, letting the kernel move the data.
+
+    Writes dest_path directly, see replacing for putting it in place in one step.
+    """
+    with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+        copy_range(src, dst, os.fstat(src.fileno()).st_size)
+    shutil.copystat(source_path, dest_path)
+
+def temp_path(dest_path):
+    """Temporary path next to dest_path, unique per writer so two writers of one destination never share it."""
+    return dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex[:12]}.part")
+
+@contextmanager
+def replacing(dest_path):
+    """Yield a temporary path next to dest_path, moved over dest_path once the block succeeds.
+
+    Readers never see a half-written destination and concurrent writers
+    don't mix their data: the last one to finish wins. The temporary file
+    is removed if the block fails.
+    """
+    part_path = temp_path(Path(dest_path))
+    try:
+        yield part_path
+        os.replace(part_path, dest_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+def move_file(source_path, dest_path):
+    """Move a file like shutil.move, copying through a temporary file across filesystems."""
+    try:
+        os.replace(source_path, dest_path)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    with replacing(dest_path) as part_path:
+        copy_file(source_path, part_path)
+    os.unlink(source_path)
+
+class DestinationLocks:
+    """One lock per destination path, so files that resolve to the same path are written one at a time."""
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, dest_path):
+        key = os.path.abspath(dest_path)
+        with self._lock:
+            # [lock, number of holders and waiters], dropped once nobody needs it
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+def _devices(source_path, dest_path):
+    try:
+        return os.stat(source_path).st_dev, os.stat(dest_path.parent).st_dev
+    except OSError:
+        return None
+
+def reflink_file(source_path, dest_path):
+    """Clone source_path to dest_path sharing its data blocks, returns False if the filesystem can't.
+
+    Blocks are only copied once either file changes them, so tagging the
+    clone afterwards leaves the audio data shared.
+    """
+    if fcntl is None:
+        return False
+    devices = _devices(source_path, dest_path)
+    if devices in _no_reflink:
+        return False
+    part_path = temp_path(dest_path)
+    try:
+        with open(source_path, 'rb') as src, open(part_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source_path, part_path)
+        os.replace(part_path, dest_path)
+        return True
+    except OSError as e:
+        part_path.unlink(missing_ok=True)
+        if e.errno not in _UNSUPPORTED:
+            raise
+        with _no_reflink_lock:
+            if devices not in _no_reflink:
+                _no_reflink.add(devices)
+                logger.warning(f"Reflinks are not supported from {Path(source_path).parent} to {dest_path.parent}, copying instead")
+        return False
+
+def hardlink_file(source_path, dest_path):
+    """Give source_path a second name, dest_path; returns False if that isn't possible (e.g. across filesystems)."""
+    part_path = temp_path(dest_path)
+    try:
+        part_path.unlink(missing_ok=True)
+        os.link(source_path, part_path)
+        os.replace(part_path, dest_path)
+        return True
+    except OSError as e:
+        part_path.unlink(missing_ok=True)
+        if e.errno not in _UNSUPPORTED and e.errno != errno.EMLINK:
+            raise
+        logger.debug(f"Could not hardlink {source_path} to {dest_path} ({str(e)})")
+        return False
+
+def link_file(source_path, dest_path, mode, changes=False):
+    """Place source_path at dest_path by hardlink or reflink, returns False if neither worked.
+
+    A file whose content changes afterwards (changes=True, e.g. it is
+    about to be tagged) is never hardlinked, since the change would show
+    up in the source too; it is reflinked instead.
+    """
+    if mode == HARDLINK and not changes and hardlink_file(source_path, dest_path):
+        return True
+    return reflink_file(source_path, dest_path)
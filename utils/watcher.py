@@ -0,0 +1,232 @@
+from pathlib import Path
+import ctypes.util
+import threading
+import logging
+import select
+import struct
+import ctypes
+import errno
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+# inotify constants, from linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len, then len bytes of name
+_EVENT = struct.Struct('iIII')
+
+def _load_inotify():
+    """Return libc if it has inotify, else None."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    return libc
+
+def _excluded(path, exclude):
+    return any(path == excluded or excluded in path.parents for excluded in exclude)
+
+def _walk(directory, exclude):
+    """Yield (directory, file paths) for a tree, skipping excluded directories."""
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirpath = Path(dirpath)
+        dirnames[:] = [name for name in dirnames if not _excluded(dirpath / name, exclude)]
+        yield dirpath, [dirpath / name for name in filenames]
+
+class _Inotify:
+    """Recursive inotify watch on a tree, reporting created, written and moved-in files."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, libc, root, exclude):
+        self.libc = libc
+        self.exclude = exclude
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.add_tree(root)
+
+    def add_tree(self, directory):
+        """Watch a directory and everything below it, returns the files already in it."""
+        files = []
+        for dirpath, filenames in _walk(directory, self.exclude):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                hint = " (raise fs.inotify.max_user_watches)" if error == errno.ENOSPC else ""
+                logger.warning(f"Cannot watch {dirpath}: {os.strerror(error)}{hint}")
+                continue
+            self.directories[wd] = dirpath
+            files.extend(filenames)
+        return files
+
+    def read(self, timeout):
+        """Wait up to timeout seconds for events, returns the paths of files that changed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Too many changes at once, some new files may have been missed")
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # A new or moved-in directory may already hold files, e.g. a whole album
+                if not _excluded(path, self.exclude):
+                    paths.extend(self.add_tree(path))
+            else:
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class _Poller:
+    """Finds new files by listing the directories whose modification time changed."""
+
+    def __init__(self, root, exclude, stop):
+        self.exclude = exclude
+        self.stop = stop
+        self.directories = {}
+        self.add_tree(root)
+
+    def add_tree(self, directory):
+        files = []
+        for dirpath, filenames in _walk(directory, self.exclude):
+            try:
+                self.directories[dirpath] = (os.stat(dirpath).st_mtime_ns, set(os.listdir(dirpath)))
+            except OSError:
+                continue
+            files.extend(filenames)
+        return files
+
+    def read(self, timeout):
+        if self.stop.wait(timeout):
+            return []
+        paths = []
+        for directory, (mtime, names) in list(self.directories.items()):
+            try:
+                stat = os.stat(directory)
+                if stat.st_mtime_ns == mtime:
+                    continue
+                current = set(os.listdir(directory))
+            except OSError:
+                # Gone, or not readable anymore
+                self.directories.pop(directory, None)
+                continue
+            self.directories[directory] = (stat.st_mtime_ns, current)
+            for name in current - names:
+                path = directory / name
+                if path.is_dir():
+                    if path not in self.directories and not _excluded(path, self.exclude):
+                        paths.extend(self.add_tree(path))
+                else:
+                    paths.append(path)
+        return paths
+
+    def close(self):
+        pass
+
+class FolderWatcher:
+    """Iterate over the audio files that arrive in a directory tree, for as long as it is watched.
+
+    Files already there are left alone. New ones are noticed through
+    inotify where the platform has it, otherwise by checking directory
+    modification times every poll_interval seconds, and are only yielded
+    once their size and modification time have not changed for settle
+    seconds, so files that are still being written or downloaded aren't
+    picked up half-finished. Iteration blocks waiting for files and ends
+    once close() is called. count is the number of files yielded so far.
+    """
+
+    def __init__(self, root, extensions, settle=2.0, poll_interval=None, exclude=()):
+        self.root = Path(root).absolute()
+        self.extensions = {ext.lower() for ext in extensions}
+        self.settle = settle
+        self.exclude = [Path(path).absolute() for path in exclude]
+        self.stop = threading.Event()
+        self.count = 0
+        self._pending = {}
+        libc = _load_inotify() if poll_interval is None else None
+        self._source = None
+        if libc:
+            try:
+                self._source = _Inotify(libc, self.root, self.exclude)
+                self.poll_interval = 1.0
+                logger.info(f"Watching {self.root} for new files")
+            except OSError as e:
+                logger.warning(f"inotify unavailable, polling instead: {str(e)}")
+        if self._source is None:
+            self.poll_interval = poll_interval or 2.0
+            self._source = _Poller(self.root, self.exclude, self.stop)
+            logger.info(f"Checking {self.root} for new files every {self.poll_interval:g}s")
+
+    def _ready(self):
+        """Pop the pending files that have settled."""
+        now = time.monotonic()
+        ready = []
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Renamed or deleted before it settled
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif stat.st_size and now - since >= self.settle:
+                del self._pending[path]
+                ready.append(path)
+        return sorted(ready)
+
+    def __iter__(self):
+        try:
+            while not self.stop.is_set():
+                timeout = min(self.poll_interval, self.settle / 2) if self._pending else self.poll_interval
+                for path in self._source.read(timeout):
+                    if path.suffix.lower() in self.extensions and not _excluded(path, self.exclude):
+                        # Any new activity restarts the file's quiet period
+                        self._pending[path] = (None, time.monotonic())
+                for path in self._ready():
+                    if self.stop.is_set():
+                        return
+                    self.count += 1
+                    yield path
+        finally:
+            self._source.close()
+
+    def close(self):
+        """Stop watching; a blocked iteration returns within poll_interval seconds."""
+        self.stop.set()